@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Body cleaning throughput, the previous _clean_body_for_llm against
+mcp_email/create_draft_reply/body_normalizer.py:
+
+    python -m benchmarks.body_normalizer [MESSAGE.eml ...] [--repeat 3]
+
+The corpus is the text/plain and text/html body of each .eml file given, or
+by default every body of the full threads in the synthetic fixtures.
+Reported: messages per second for the previous implementation,
+normalize_body, and normalize_body_cached (every body seen once before), and
+how many bodies come out different from the previous implementation.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import email
+import json
+import os
+import quopri
+import re
+import sys
+import time
+from email import policy
+from typing import Callable
+
+from cleantext import clean
+
+from mcp_email.create_draft_reply import body_normalizer
+from mcp_email.create_draft_reply.body_normalizer import normalize_body, normalize_body_cached
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(BENCH_DIR, "fixtures", "synthetic.json")
+
+
+def previous_clean_body(text: str) -> str:
+    # _clean_body_for_llm as it was before body_normalizer existed
+    try:
+        text = quopri.decodestring(text).decode("utf-8", errors="replace")
+    except ValueError:
+        pass
+    clean_text = clean(
+        text,
+        fix_unicode=True,
+        to_ascii=True,
+        lower=False,
+        no_line_breaks=True,
+        no_urls=True,
+        no_emails=True,
+    ).strip()
+    link_re = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+    clean_text = link_re.sub(r"\1", clean_text)
+    return re.sub(r"\s+", " ", clean_text).strip()
+
+
+def _fixture_bodies(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    bodies = []
+
+    def walk(part: dict) -> None:
+        data = part.get("body", {}).get("data")
+        if data and part.get("mimeType", "").startswith("text/"):
+            bodies.append(base64.urlsafe_b64decode(data).decode("utf-8"))
+        for child in part.get("parts", []):
+            walk(child)
+
+    for entry in fixtures["entries"]:
+        if "format=full" in entry["request"]:
+            for message in entry["body"].get("messages", []):
+                walk(message.get("payload", {}))
+    return bodies
+
+
+def _eml_bodies(paths: list[str]) -> list[str]:
+    bodies = []
+    for path in paths:
+        with open(path, "rb") as f:
+            msg = email.message_from_binary_file(f, policy=policy.default)
+        for preference in ("plain", "html"):
+            part = msg.get_body(preferencelist=(preference,))
+            if part is not None:
+                bodies.append(part.get_content())
+    return bodies
+
+
+def _messages_per_second(fn: Callable[[str], str], bodies: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            fn(body)
+    return repeat * len(bodies) / (time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("eml", nargs="*", help="messages to take bodies from (default: the synthetic fixtures)")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bodies = _eml_bodies(args.eml) if args.eml else _fixture_bodies(args.fixtures)
+    if not bodies:
+        raise SystemExit("no text bodies found")
+
+    differing = sum(previous_clean_body(b) != normalize_body(b) for b in bodies)
+
+    # keyed per body, as create_draft_reply keys them by message ID
+    body_normalizer.BODY_CACHE_SIZE = max(body_normalizer.BODY_CACHE_SIZE, len(bodies))
+    body_normalizer._cache = body_normalizer._BodyCache(body_normalizer.BODY_CACHE_SIZE)
+    ids = {id(b): str(n) for n, b in enumerate(bodies)}
+    for body in bodies:
+        normalize_body_cached(body, ids[id(body)])
+
+    print(f"{len(bodies)} bodies, {sum(map(len, bodies))} characters")
+    for name, fn in (
+        ("previous", previous_clean_body),
+        ("normalize_body", normalize_body),
+        ("normalize_body_cached", lambda b: normalize_body_cached(b, ids[id(b)])),
+    ):
+        print(f"{name:<22}{_messages_per_second(fn, bodies, args.repeat):12.1f} messages/s")
+    print(f"{differing} of {len(bodies)} bodies differ from the previous output")
+    return 1 if differing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Body decoding and cleaning of one large HTML-heavy thread, inline versus in
+the worker process pool (mcp_email/create_draft_reply/body_pool.py):
+
+    python -m benchmarks.body_pool [--messages 100] [--workers 4] [--repeat 3]
+
+Every message is HTML only (so decoding goes through html_to_text) and quotes
+the message before it. Each run starts with no cleaned bodies cached, so all
+messages are decoded, stripped and cleaned. The pool is timed warm; its
+start-up (spawning and importing in the workers) is reported separately.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# measure the work itself, not the in-memory body cache
+os.environ["BODY_CACHE_SIZE"] = "0"
+
+from benchmarks.make_fixtures import _SENDERS, _sentence  # noqa: E402
+from mcp_email.create_draft_reply import body_pool  # noqa: E402
+from mcp_email.create_draft_reply.create_draft_reply import _fetch_thread_context  # noqa: E402
+from mcp_email.mailbox_store import MailboxStore  # noqa: E402
+
+_ME = "Me <me@example.com>"
+
+
+def _html_thread(count: int) -> dict:
+    rng = random.Random(0)
+    messages = []
+    previous = ""
+    for n in range(count):
+        sender = _SENDERS[n % len(_SENDERS)] if n % 2 == 0 else _ME
+        paragraphs = "".join(
+            f'<p style="margin:0 0 8px 0;font-family:Arial">{_sentence(rng)} '
+            f'<a href="https://example.com/{n}/{i}">details</a> &amp; more&nbsp;text.</p>'
+            for i in range(rng.randint(20, 40))
+        )
+        table = "<table>" + "".join(
+            f"<tr><td>{_sentence(rng)}</td><td>{rng.randint(1, 999)}</td></tr>" for _ in range(15)
+        ) + "</table>"
+        html = (
+            "<html><head><style>p{margin:0} td{padding:2px}</style></head><body>"
+            f"<div>{paragraphs}{table}</div>"
+            f"<div>On Mon, 2 Jun 2025 at 10:{n % 60:02d}, someone wrote:</div>"
+            f"<blockquote>{previous}</blockquote>"
+            "</body></html>"
+        )
+        previous = f"<div>{paragraphs}</div>"
+        messages.append(
+            {
+                "id": f"big{n:04x}",
+                "payload": {
+                    "headers": [
+                        {"name": "From", "value": sender},
+                        {"name": "To", "value": _ME if sender != _ME else _SENDERS[0]},
+                        {"name": "Subject", "value": "Re: large thread"},
+                    ],
+                    "parts": [
+                        {"mimeType": "text/html", "body": {"data": base64.urlsafe_b64encode(html.encode()).decode()}},
+                    ],
+                },
+            }
+        )
+    return {"id": "big", "messages": messages}
+
+
+def _run(thread: dict, tmp_dir: str) -> tuple[float, list]:
+    # a fresh store: no cleaned bodies cached
+    path = os.path.join(tmp_dir, f"store-{time.monotonic_ns()}.sqlite3")
+    store = MailboxStore(path)
+    start = time.perf_counter()
+    result = _fetch_thread_context(None, "big", thread, store=store)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    thread = _html_thread(args.messages)
+    tmp_dir = tempfile.mkdtemp(prefix="mcp-email-body-pool-")
+
+    body_pool.BODY_POOL_WORKERS = 0
+    inline = [_run(thread, tmp_dir) for _ in range(args.repeat)]
+
+    body_pool.BODY_POOL_WORKERS = args.workers
+    body_pool.BODY_POOL_MIN_MESSAGES = 1
+    cold_ms, _ = _run(thread, tmp_dir)
+    pooled = [_run(thread, tmp_dir) for _ in range(args.repeat)]
+    body_pool.shutdown_body_pool()
+
+    if pooled[0][1] != inline[0][1]:
+        raise SystemExit("the pool produced different messages than inline processing")
+
+    inline_ms = statistics.median(ms for ms, _ in inline)
+    pooled_ms = statistics.median(ms for ms, _ in pooled)
+    print(f"{args.messages} HTML messages, {os.cpu_count()} CPUs, {args.workers} workers")
+    print(f"inline            {inline_ms:10.1f} ms")
+    print(f"pool (warm)       {pooled_ms:10.1f} ms   speedup x{inline_ms / pooled_ms:.2f}")
+    print(f"pool (first use)  {cold_ms:10.1f} ms   (includes starting the workers)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
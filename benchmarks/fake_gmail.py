@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import threading
+import time
+import urllib.parse
+import uuid
+from email.parser import Parser
+from http.client import responses
+
+import httplib2
+from googleapiclient.discovery import build
+
+# query parameters that do not change the response body
+_IGNORED_PARAMS = {"alt"}
+# matched only when no fixture has the exact query, e.g. the dated `q` of
+# the unread listing
+_WILDCARD_PARAMS = ("q",)
+
+
+def _request_key(method: str, uri: str, drop: tuple[str, ...] = ()) -> str:
+    parsed = urllib.parse.urlsplit(uri)
+    params = sorted(
+        (k, v)
+        for k, v in urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+        if k not in _IGNORED_PARAMS and k not in drop
+    )
+    query = urllib.parse.urlencode(params)
+    return f"{method.upper()} {parsed.path}" + (f"?{query}" if query else "")
+
+
+def _encode_body(body) -> bytes:
+    if isinstance(body, (bytes, bytearray)):
+        return bytes(body)
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    return json.dumps(body, separators=(",", ":")).encode("utf-8")
+
+
+def _shift_dates(body, shift_ms: int):
+    # keeps a recorded mailbox as recent as it was when recorded, so it stays
+    # inside the unread window
+    if isinstance(body, dict):
+        return {
+            k: str(int(v) + shift_ms) if k == "internalDate" else _shift_dates(v, shift_ms)
+            for k, v in body.items()
+        }
+    if isinstance(body, list):
+        return [_shift_dates(v, shift_ms) for v in body]
+    return body
+
+
+def _is_batch(uri: str) -> bool:
+    path = urllib.parse.urlsplit(uri).path
+    return path == "/batch" or path.startswith("/batch/")
+
+
+def _split_batch(content_type: str, body: bytes | str) -> list:
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    return Parser().parsestr(f"content-type: {content_type}\r\n\r\n{body}").get_payload()
+
+
+def _parse_sub_request(payload: str) -> tuple[str, str]:
+    request_line = payload.lstrip().split("\n", 1)[0]
+    method, target, _ = request_line.split(" ", 2)
+    return method, target
+
+
+def _parse_sub_response(payload: str) -> tuple[int, str]:
+    status_line, rest = payload.split("\n", 1)
+    body = rest.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in rest else rest.split("\n\n", 1)[-1]
+    return int(status_line.split(" ", 2)[1]), body
+
+
+def _parse_fields(fields: str) -> dict:
+    # "a,b/c,d(e,f/g)" -> {"a": None, "b": {"c": None}, "d": {"e": None, "f": {"g": None}}};
+    # None keeps the whole value
+    pos = 0
+
+    def item(target: dict) -> None:
+        nonlocal pos
+        start = pos
+        while pos < len(fields) and fields[pos] not in ",/()":
+            pos += 1
+        key = fields[start:pos].strip()
+        if pos == len(fields) or fields[pos] not in "/(":
+            target[key] = None
+            return
+        if key not in target:
+            target[key] = {}
+        # an earlier mention may already keep the whole value
+        sub = target[key] if target[key] is not None else {}
+        pos += 1
+        if fields[pos - 1] == "/":
+            item(sub)
+        else:
+            selection(sub)
+            pos += 1  # ")"
+
+    def selection(target: dict) -> None:
+        nonlocal pos
+        item(target)
+        while pos < len(fields) and fields[pos] == ",":
+            pos += 1
+            item(target)
+
+    tree: dict = {}
+    selection(tree)
+    return tree
+
+
+def _select(value, tree: dict | None):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {k: _select(v, tree[k]) for k, v in value.items() if k in tree}
+    return value
+
+
+def apply_fields(body, fields: str | None):
+    """The partial response Gmail returns for `body` under a `fields=` mask."""
+    return body if not fields else _select(body, _parse_fields(fields))
+
+
+class Traffic:
+    """Round trips, API calls and body bytes seen by a fake transport."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.round_trips = 0
+        self.api_calls = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # request bodies of messages.send calls
+        self.sent: list[dict] = []
+
+    def add(self, api_calls: int, sent: int, received: int) -> None:
+        with self._lock:
+            self.round_trips += 1
+            self.api_calls += api_calls
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "round_trips": self.round_trips,
+                "api_calls": self.api_calls,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+            }
+
+
+class ReplayHttp:
+    """
+    httplib2.Http stand-in answering Gmail API requests from fixtures.
+
+    Fixture entries are {"request": "GET /gmail/v1/users/me/...?...",
+    "status": 200, "body": ...}; several entries for one request are served
+    in order, the last one repeating. Batch requests are split and each
+    part is answered on its own, so batching works as against Gmail.
+    Unknown requests get a 404. internalDates are moved forward by the time
+    since `recorded_at`.
+    """
+
+    def __init__(self, fixtures: dict) -> None:
+        self._lock = threading.Lock()
+        self._responses: dict[str, list[tuple[int, bytes]]] = {}
+        shift_ms = int(time.time() * 1000) - fixtures.get("recorded_at", int(time.time() * 1000))
+        for entry in fixtures["entries"]:
+            method, uri = entry["request"].split(" ", 1)
+            body = _shift_dates(entry.get("body", ""), shift_ms)
+            self._responses.setdefault(_request_key(method, uri), []).append(
+                (entry.get("status", 200), _encode_body(body))
+            )
+        self.traffic = Traffic()
+
+    def _answer(self, method: str, uri: str) -> tuple[int, bytes]:
+        with self._lock:
+            queue = self._responses.get(_request_key(method, uri))
+            if queue is None:
+                queue = self._responses.get(_request_key(method, uri, _WILDCARD_PARAMS))
+            if queue is None:
+                return 404, b'{"error": {"code": 404, "message": "no fixture"}}'
+            return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    def _answer_batch(self, content_type: str, body: str) -> tuple[bytes, str, int]:
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = _split_batch(content_type, body)
+        out = []
+        for part in parts:
+            method, target = _parse_sub_request(part.get_payload())
+            status, content = self._answer(method, target)
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:]}\r\n\r\n"
+                f"HTTP/1.1 {status} {responses.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{content.decode('utf-8')}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return "".join(out).encode("utf-8"), boundary, len(parts)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        sent = len(body or b"")
+        if _is_batch(uri):
+            content, boundary, calls = self._answer_batch(headers["content-type"], body)
+            self.traffic.add(calls, sent, len(content))
+            resp = httplib2.Response(
+                {"status": 200, "content-type": f'multipart/mixed; boundary="{boundary}"'}
+            )
+            return resp, content
+
+        status, content = self._answer(method, uri)
+        self.traffic.add(1, sent, len(content))
+        if uri.split("?", 1)[0].endswith("/messages/send"):
+            self.traffic.sent.append(json.loads(body))
+        return httplib2.Response({"status": status, "content-type": "application/json"}), content
+
+
+class RecordingHttp:
+    """
+    Wraps a real authorized Http and records every exchange, batch parts
+    included, as ReplayHttp fixture entries.
+    """
+
+    def __init__(self, http) -> None:
+        self._http = http
+        self._lock = threading.Lock()
+        self.entries: list[dict] = []
+
+    @property
+    def credentials(self):
+        return getattr(self._http, "credentials", None)
+
+    def _record(self, method: str, uri: str, status: int, content: bytes | str) -> None:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        try:
+            body = json.loads(content)
+        except ValueError:
+            body = content
+        with self._lock:
+            self.entries.append(
+                {"request": _request_key(method, uri), "status": status, "body": body}
+            )
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        resp, content = self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        if not _is_batch(uri):
+            self._record(method, uri, resp.status, content)
+            return resp, content
+
+        targets = {
+            part["Content-ID"][1:]: _parse_sub_request(part.get_payload())
+            for part in _split_batch(headers["content-type"], body)
+        }
+        for part in _split_batch(resp["content-type"], content):
+            # "<response-" + the request's Content-ID without its "<"
+            method_, target = targets[part["Content-ID"][len("<response-"):]]
+            status, sub_body = _parse_sub_response(part.get_payload())
+            self._record(method_, target, status, sub_body)
+        return resp, content
+
+    def fixtures(self, workload: dict) -> dict:
+        with self._lock:
+            return {
+                "recorded_at": int(time.time() * 1000),
+                "entries": list(self.entries),
+                "workload": workload,
+            }
+
+
+def build_replay_service(fixtures: dict):
+    """A real Gmail client (request building, batching, errors) over ReplayHttp."""
+    http = ReplayHttp(fixtures)
+    service = build("gmail", "v1", http=http, static_discovery=True, cache_discovery=False)
+    return service, http.traffic
+
+
+def load_fixtures(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Concurrent messages.get calls against a local stand-in for the Gmail API,
+with a new Http object per request versus PooledHttp
+(mcp_email/gmail_transport.py):
+
+    python -m benchmarks.gmail_transport [--threads 32] [--calls 50] [--pool-size 8]
+
+Reports calls per second and the number of TCP connections the stand-in
+accepted; a pool reuses its keep-alive connections, so it opens at most
+--pool-size of them.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+
+from mcp_email.gmail_transport import GMAIL_HTTP_POOL_SIZE, PooledHttp, default_http_factory
+
+STAND_IN_TOKEN = "stand-in"
+
+
+class _GmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # headers and body go out as separate writes; with Nagle on, every
+    # reused connection would wait out the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    server: "GmailStandIn"
+
+    def do_GET(self):
+        if self.headers.get("Authorization") != f"Bearer {STAND_IN_TOKEN}":
+            self.send_response(401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with self.server.in_flight():
+            time.sleep(self.server.delay)  # a little server time, so calls overlap
+        message_id = self.path.split("?")[0].rsplit("/", 1)[-1]
+        body = json.dumps({"id": message_id, "threadId": "t" + message_id}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class GmailStandIn(ThreadingHTTPServer):
+    """
+    Answers users.messages.get on 127.0.0.1 and counts the connections it
+    accepted and the most requests it was answering at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.002) -> None:
+        super().__init__(("127.0.0.1", 0), _GmailHandler)
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._active = 0
+        self.reset()
+        threading.Thread(target=self.serve_forever, name="gmail-stand-in", daemon=True).start()
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connections = 0
+            self.requests = 0
+            self.max_in_flight = 0
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    @contextmanager
+    def in_flight(self) -> Iterator[None]:
+        with self._lock:
+            self.requests += 1
+            self._active += 1
+            self.max_in_flight = max(self.max_in_flight, self._active)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def stand_in_credentials() -> Credentials:
+    return Credentials(token=STAND_IN_TOKEN)
+
+
+def run_calls(http, endpoint: str, threads: int, calls: int) -> float:
+    """Gets `calls` messages from each of `threads` threads; returns seconds."""
+    service = build(
+        "gmail", "v1", http=http, static_discovery=True, cache_discovery=False,
+        client_options={"api_endpoint": endpoint},
+    )
+    messages = service.users().messages()
+
+    def worker(n: int) -> None:
+        for i in range(calls):
+            message_id = f"{n}x{i}"
+            response = messages.get(userId="me", id=message_id).execute()
+            if response["id"] != message_id:
+                raise AssertionError(response)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return time.perf_counter() - start
+
+
+class _FreshHttpPerRequest:
+    # what the client did before PooledHttp: a new connection for every request
+    def __init__(self, credentials):
+        self.credentials = credentials
+
+    def request(self, *args, **kwargs):
+        return AuthorizedHttp(self.credentials, http=default_http_factory()).request(*args, **kwargs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=GMAIL_HTTP_POOL_SIZE)
+    args = parser.parse_args()
+
+    stand_in = GmailStandIn()
+    credentials = stand_in_credentials()
+    total = args.threads * args.calls
+    for name, http in (
+        ("new Http per request", _FreshHttpPerRequest(credentials)),
+        (f"PooledHttp(size={args.pool_size})", PooledHttp(credentials, size=args.pool_size)),
+    ):
+        stand_in.reset()
+        elapsed = run_calls(http, stand_in.endpoint, args.threads, args.calls)
+        print(
+            f"{name:<24} {total} calls from {args.threads} threads: {elapsed:.2f} s, "
+            f"{total / elapsed:.0f} calls/s, {stand_in.connections} connections"
+        )
+    stand_in.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+HTML-to-text conversion time and peak memory, mcp_email/html_to_text.py
+against the regex stripping get_unread_emails/utils.py used before it:
+
+    python -m benchmarks.html_to_text [page.html ...]
+
+Without arguments the document is ~500 KB of newsletter-style markup
+(tables, images, links, entities and hidden tracking blocks).
+"""
+from __future__ import annotations
+
+import argparse
+import html as _html
+import re
+import sys
+import time
+import tracemalloc
+
+from mcp_email.html_to_text import html_to_text
+
+
+def previous_regex_html_to_text(html: str) -> str:
+    # get_unread_emails/utils._html_to_text before it used html_to_text
+    txt = re.sub(r"(?is)<(script|style).*?>.*?</\1>", "", html)
+    txt = re.sub(r"(?is)<br\s*/?>", "\n", txt)
+    txt = re.sub(r"(?is)</p\s*>", "\n\n", txt)
+    txt = re.sub(r"(?is)<.*?>", "", txt)
+    return _html.unescape(txt)
+
+
+def _newsletter(blocks: int = 1800) -> str:
+    block = (
+        '<table><tr><td style="padding:8px"><a href="https://example.com/p?id={i}">'
+        '<img src="https://example.com/{i}.png" alt=""></a></td>'
+        "<td><h2>Offer {i}</h2><p>Save big on item {i} &amp; more &mdash; today only."
+        '<br>Limited stock.</p><div style="display:none">tracking {i}</div></td></tr></table>'
+    )
+    return (
+        "<html><head><style>td{color:red}</style></head><body>"
+        + "".join(block.format(i=i) for i in range(blocks))
+        + "</body></html>"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("html", nargs="*", help="documents to convert (default: a synthetic newsletter)")
+    args = parser.parse_args()
+
+    documents = [open(path, encoding="utf-8", errors="replace").read() for path in args.html] or [_newsletter()]
+
+    converters = [
+        ("html_to_text", html_to_text),
+        ("html_to_text(max_chars=4000)", lambda html: html_to_text(html, max_chars=4000)),
+        ("previous regex", previous_regex_html_to_text),
+    ]
+
+    print(f"{len(documents)} document(s), {sum(map(len, documents)) / 1024:.0f} KB")
+    for name, convert in converters:
+        start = time.perf_counter()
+        for html in documents:
+            convert(html)
+        elapsed = time.perf_counter() - start
+
+        # separate run: tracemalloc slows everything down
+        tracemalloc.start()
+        for html in documents:
+            convert(html)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<30}{elapsed * 1000:10.1f} ms   peak {peak / 1024:8.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
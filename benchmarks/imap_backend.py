@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Unread listing over IMAP against the in-process stand-in server
+(tests/imap_standin.py), pooled versus per message:
+
+    python -m benchmarks.imap_backend [--messages 200] [--limit 50] [--latency-ms 2] [--repeat 5]
+
+  pooled       ImapBackend.list_unread on a warm ImapConnectionPool: one UID
+               SEARCH, one X-GM-THRID UID FETCH and one header UID FETCH for
+               the whole page
+  per_message  what the tools did before: a new login, SEARCH UNSEEN, then
+               one BODY.PEEK[] FETCH per message (_fetch_and_parse_email)
+
+--latency-ms is added by the stand-in to every command, as a network round
+trip would be. Reported per path: median time and IMAP commands per listing.
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from mcp_email.get_unread_emails.imap_backend import ImapBackend, ImapConnectionPool
+from mcp_email.get_unread_emails.utils import _fetch_and_parse_email
+from tests.imap_standin import ImapStandIn, make_message
+
+_SINCE = datetime.now(timezone.utc) - timedelta(days=7)
+
+
+def fill(server: ImapStandIn, count: int) -> None:
+    """`count` unread messages with 1 KB bodies, three per thread."""
+    for n in range(count):
+        server.deliver(
+            make_message(f"Sender {n % 7} <s{n % 7}@example.com>", f"Thread {n // 3}", "x" * 1024),
+            thread_id=100 + n // 3,
+        )
+
+
+def list_pooled(backend: ImapBackend, limit: int) -> int:
+    summaries, _ = backend.list_unread(_SINCE, None, limit)
+    return len(summaries)
+
+
+def list_per_message(server: ImapStandIn, limit: int) -> int:
+    imap = server.connect()
+    try:
+        _, data = imap.search(None, "UNSEEN")
+        results = [_fetch_and_parse_email(imap, msg_id) for msg_id in list(reversed(data[0].split()))[:limit]]
+    finally:
+        imap.logout()
+    return len(results)
+
+
+def measure(server: ImapStandIn, run, repeat: int) -> tuple[float, int]:
+    """(median ms, IMAP commands per run)."""
+    timings = []
+    for _ in range(repeat):
+        commands = len(server.commands)
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+        commands = len(server.commands) - commands
+    return statistics.median(timings), commands
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server = ImapStandIn(latency=args.latency_ms / 1000)
+    fill(server, args.messages)
+    pool = ImapConnectionPool(server.connect)
+    backend = ImapBackend(pool, gmail_extensions=True)
+    list_pooled(backend, args.limit)  # log in once, as a running server would have
+
+    print(f"{args.messages} unread messages, page of {args.limit}, {args.latency_ms} ms per command")
+    for name, run in (
+        ("pooled", lambda: list_pooled(backend, args.limit)),
+        ("per_message", lambda: list_per_message(server, args.limit)),
+    ):
+        ms, commands = measure(server, run, args.repeat)
+        print(f"{name:<12} {ms:10.1f} ms {commands:6d} commands")
+
+    pool.close()
+    server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
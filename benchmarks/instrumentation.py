@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Overhead of one span() (mcp_email/instrumentation.py) around an empty block:
+
+    python -m benchmarks.instrumentation [--iterations 1000000]
+
+Reported per iteration: a bare `with` block, span() with EMAIL_STATS=0 and
+span() recording into its histogram.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+from mcp_email import instrumentation
+from mcp_email.instrumentation import _NOOP_SPAN, reset_stats, span
+
+
+def _ns_per_iteration(make, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with make():
+            pass
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    enabled = instrumentation.STATS_ENABLED
+    baseline = _ns_per_iteration(lambda: _NOOP_SPAN, args.iterations)
+    instrumentation.STATS_ENABLED = False
+    disabled = _ns_per_iteration(lambda: span("bench"), args.iterations)
+    instrumentation.STATS_ENABLED = True
+    recording = _ns_per_iteration(lambda: span("bench"), args.iterations)
+    instrumentation.STATS_ENABLED = enabled
+    reset_stats()
+
+    print(f"bare with-block     {baseline:8.1f} ns")
+    print(f"span(), disabled    {disabled:8.1f} ns   (+{disabled - baseline:.1f} ns)")
+    print(f"span(), enabled     {recording:8.1f} ns   (+{recording - baseline:.1f} ns)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Load test: N concurrent MCP clients against one streamable-HTTP server
+process, versus one stdio server process per client (what desktop clients
+do today). Both serve the replayed mailbox from benchmarks/serve_replay.py.
+
+    python -m benchmarks.load [--clients 1 4 16] [--rounds 5]
+
+Each client initializes, then runs `rounds` of get_unread_emails followed
+by create_draft_reply for one of the workload threads. Reported per mode:
+time until every client is initialized, wall time and throughput of the
+tool calls, p90 call latency, Gmail API calls made by the server(s)
+(from server_stats) and total server resident memory.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamable_http_client
+
+from benchmarks.fake_gmail import load_fixtures
+from benchmarks.serve_replay import DEFAULT_FIXTURES
+
+_SERVER = [sys.executable, "-m", "benchmarks.serve_replay"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _child_pids() -> list[int]:
+    # server processes started by this process (and by stdio_client)
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == os.getpid():
+                    pids.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return pids
+
+
+def _rss_mb(pids: list[int]) -> float:
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            continue
+    return round(total_kb / 1024, 1)
+
+
+def _gmail_calls(stats: dict) -> int:
+    # one span per single call; a batch span counts its round trip only
+    return sum(
+        summary["count"]
+        for name, summary in stats.get("spans_ms", {}).items()
+        if name.startswith("gmail.users.") or name == "gmail.batch"
+    )
+
+
+async def _client_workload(session: ClientSession, thread_ids: list[str], rounds: int, offset: int) -> list[float]:
+    latencies = []
+    for n in range(rounds):
+        for name, arguments in (
+            ("get_unread_emails", {"limit": 5}),
+            ("create_draft_reply", {"threadId": thread_ids[(offset + n) % len(thread_ids)]}),
+        ):
+            start = time.perf_counter()
+            result = await session.call_tool(name, arguments)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if result.isError:
+                raise RuntimeError(f"{name} failed: {result.content[0].text}")
+    return latencies
+
+
+async def _client(
+    mode: str,
+    url: str,
+    index: int,
+    rounds: int,
+    thread_ids: list[str],
+    ready: asyncio.Barrier,
+    done: asyncio.Barrier,
+    finish: asyncio.Event,
+) -> tuple[list[float], int]:
+    # anyio contexts must be left by the task that entered them, so every
+    # client lives in its own task from connect to close
+    async with AsyncExitStack() as stack:
+        if mode == "http":
+            read, write, _ = await stack.enter_async_context(streamable_http_client(url))
+        else:
+            params = StdioServerParameters(command=_SERVER[0], args=_SERVER[1:], env=dict(os.environ))
+            read, write = await stack.enter_async_context(stdio_client(params))
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+
+        await ready.wait()
+        latencies = await _client_workload(session, thread_ids, rounds, index)
+        await done.wait()
+
+        # one stats call per server process
+        gmail_calls = 0
+        if mode == "stdio" or index == 0:
+            result = await session.call_tool("server_stats", {})
+            gmail_calls = _gmail_calls(json.loads(result.content[0].text))
+        await finish.wait()
+        return latencies, gmail_calls
+
+
+async def _run_mode(mode: str, clients: int, rounds: int, thread_ids: list[str]) -> dict:
+    server = None
+    url = ""
+    start = time.perf_counter()
+    if mode == "http":
+        port = _free_port()
+        server = subprocess.Popen(_SERVER + ["--transport", "http", "--port", str(port)])
+        url = f"http://127.0.0.1:{port}/mcp/"
+        for _ in range(200):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                await asyncio.sleep(0.05)
+
+    try:
+        ready = asyncio.Barrier(clients + 1)
+        done = asyncio.Barrier(clients + 1)
+        finish = asyncio.Event()
+        tasks = [
+            asyncio.create_task(_client(mode, url, i, rounds, thread_ids, ready, done, finish))
+            for i in range(clients)
+        ]
+
+        await ready.wait()
+        ready_s = time.perf_counter() - start
+        start = time.perf_counter()
+        await done.wait()
+        elapsed = time.perf_counter() - start
+
+        # the stats calls are quick; measure memory while the servers are up
+        await asyncio.sleep(0.2)
+        rss = _rss_mb(_child_pids())
+        finish.set()
+        results = await asyncio.gather(*tasks)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    all_latencies = sorted(ms for latencies, _ in results for ms in latencies)
+    return {
+        "ready_s": round(ready_s, 2),
+        "calls": len(all_latencies),
+        "wall_s": round(elapsed, 2),
+        "calls_per_s": round(len(all_latencies) / elapsed, 1),
+        "p90_ms": round(statistics.quantiles(all_latencies, n=10)[-1], 1),
+        "gmail_calls": sum(calls for _, calls in results),
+        "server_rss_mb": rss,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    args = parser.parse_args()
+
+    thread_ids = load_fixtures(args.fixtures)["workload"]["thread_ids"]
+    columns = ("ready_s", "calls", "wall_s", "calls_per_s", "p90_ms", "gmail_calls", "server_rss_mb")
+    print(f"{'mode':<8}{'clients':>8}" + "".join(f"{c:>15}" for c in columns))
+    for clients in args.clients:
+        for mode in ("stdio", "http"):
+            result = asyncio.run(_run_mode(mode, clients, args.rounds, thread_ids))
+            print(f"{mode:<8}{clients:>8}" + "".join(f"{result[c]:>15}" for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Writes a deterministic synthetic mailbox as ReplayHttp fixtures:
+
+    python -m benchmarks.make_fixtures [benchmarks/fixtures/synthetic.json]
+
+Requests are built with the same gmail_requests builders the tools use, so
+fixture keys match what the tools send. Real mailboxes can be recorded
+instead with `python -m benchmarks.run --record`.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from email.message import EmailMessage
+
+from benchmarks.fake_gmail import _request_key, build_replay_service
+from mcp_email.get_unread_emails.unread_index import _HISTORY_TYPES, unread_query
+from mcp_email.gmail_requests import (
+    history_request,
+    list_messages_request,
+    message_summary_request,
+    profile_request,
+    raw_message_requests,
+    thread_request,
+)
+
+DEFAULT_PATH = "benchmarks/fixtures/synthetic.json"
+
+UNREAD_THREADS = 40
+UNREAD_MESSAGES = 60
+CONTEXT_THREADS = 5
+MESSAGES_PER_THREAD = 8
+HISTORY_ID = "1000"
+
+_ME = "Me <me@example.com>"
+_SENDERS = [
+    "Alice Martin <alice@example.com>",
+    "Bob Chen <bob@example.org>",
+    "Carol Diaz <carol@example.net>",
+    "Dan Smith <dan@example.co.uk>",
+]
+_WORDS = (
+    "contract invoice schedule review meeting budget draft proposal timeline "
+    "deliverable update question approval quarter report launch customer"
+).split()
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def _raw_source(message: dict) -> str:
+    # the same message as RFC 822 source, as format="raw" returns it
+    msg = EmailMessage()
+    for header in message["payload"]["headers"]:
+        msg[header["name"]] = header["value"]
+    plain, html = (
+        base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8")
+        for part in message["payload"]["parts"]
+    )
+    msg.set_content(plain)
+    msg.add_alternative(html, subtype="html")
+    return base64.urlsafe_b64encode(msg.as_bytes()).decode("ascii")
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 16))]
+    return " ".join(words).capitalize() + "."
+
+
+def _thread_messages(rng: random.Random, thread_id: str, now_ms: int) -> list[dict]:
+    # every reply quotes the whole thread so far, like most mail clients
+    messages = []
+    history = ""
+    references: list[str] = []
+    other = rng.choice(_SENDERS)
+    for n in range(MESSAGES_PER_THREAD):
+        sender, recipient = (other, _ME) if n % 2 == 0 else (_ME, other)
+        new = "\n".join(_sentence(rng) for _ in range(rng.randint(3, 8)))
+        text = f"{new}\n\nThanks,\n{sender.split()[0]}\n-- \n{sender}\n"
+        if history:
+            text += f"\nOn Mon, 2 Jun 2025 at 10:{n:02d}, {recipient} wrote:\n"
+            text += "\n".join(f"> {line}" for line in history.splitlines())
+        html = (
+            "<html><head><style>p{margin:0}</style></head><body>"
+            + "".join(f"<p>{line}</p>" for line in text.splitlines())
+            + "</body></html>"
+        )
+        message_id = f"<{thread_id}{n:02x}@example.com>"
+        headers = [
+            {"name": "From", "value": sender},
+            {"name": "To", "value": recipient},
+            {"name": "Subject", "value": f"Re: thread {thread_id}"},
+            {"name": "Message-ID", "value": message_id},
+        ]
+        if references:
+            headers.append({"name": "References", "value": " ".join(references)})
+        references.append(message_id)
+        messages.append(
+            {
+                "id": f"{thread_id}{n:02x}",
+                "threadId": thread_id,
+                "internalDate": str(now_ms - (MESSAGES_PER_THREAD - n) * 3_600_000),
+                "payload": {
+                    "headers": headers,
+                    "parts": [
+                        {"mimeType": "text/plain", "body": {"data": _b64(text)}},
+                        {"mimeType": "text/html", "body": {"data": _b64(html)}},
+                    ],
+                },
+            }
+        )
+        history = text
+    return messages
+
+
+def synthetic_fixtures(seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    service, _ = build_replay_service({"entries": []})
+    now_ms = int(time.time() * 1000)
+    entries: list[dict] = []
+
+    def add(request, body, drop: tuple[str, ...] = ()) -> None:
+        entries.append(
+            {"request": _request_key(request.method, request.uri, drop), "status": 200, "body": body}
+        )
+
+    thread_ids = [f"19c{n:013x}" for n in range(UNREAD_THREADS, 0, -1)]
+    refs = []
+    for n in range(UNREAD_MESSAGES):
+        thread_id = thread_ids[n % UNREAD_THREADS]
+        refs.append({"id": f"{thread_id}m{n:03x}", "threadId": thread_id})
+
+    add(profile_request(service), {"historyId": HISTORY_ID})
+    # the query embeds today's date, so it is left out of the key
+    add(
+        list_messages_request(service, unread_query(datetime.now(timezone.utc)), max_results=500),
+        {"messages": refs},
+        drop=("q",),
+    )
+    add(history_request(service, HISTORY_ID, history_types=_HISTORY_TYPES), {"historyId": HISTORY_ID})
+    add(history_request(service, HISTORY_ID), {"historyId": HISTORY_ID})
+
+    for n, ref in enumerate(refs):
+        add(
+            message_summary_request(service, ref["id"]),
+            {
+                "id": ref["id"],
+                "threadId": ref["threadId"],
+                "internalDate": str(now_ms - n * 600_000),
+                "payload": {
+                    "headers": [
+                        {"name": "From", "value": rng.choice(_SENDERS)},
+                        {"name": "Subject", "value": _sentence(rng)[:60]},
+                    ]
+                },
+            },
+        )
+
+    context_threads = thread_ids[:CONTEXT_THREADS]
+    for thread_id in context_threads:
+        messages = _thread_messages(rng, thread_id, now_ms)
+        add(
+            thread_request(service, thread_id, "full"),
+            {"id": thread_id, "historyId": HISTORY_ID, "messages": messages},
+        )
+        add(
+            thread_request(service, thread_id, "metadata"),
+            {
+                "id": thread_id,
+                "historyId": HISTORY_ID,
+                "messages": [
+                    {"id": m["id"], "payload": {"headers": m["payload"]["headers"]}}
+                    for m in messages
+                ],
+            },
+        )
+        for message, request in zip(messages, raw_message_requests(service, [m["id"] for m in messages])):
+            add(request, {"id": message["id"], "raw": _raw_source(message)})
+
+    entries.append(
+        {
+            "request": "POST /gmail/v1/users/me/messages/send",
+            "status": 200,
+            "body": {"id": "sent000000000001", "threadId": context_threads[0], "labelIds": ["SENT"]},
+        }
+    )
+
+    return {
+        "recorded_at": now_ms,
+        "entries": entries,
+        "workload": {"thread_ids": context_threads, "send_thread_id": context_threads[0]},
+    }
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_fixtures(), f, indent=1)
+    print(f"wrote {path}")
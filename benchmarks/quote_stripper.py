@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Output size and CPU time of cleaning a long reply chain, with and without
+quote stripping (mcp_email/create_draft_reply/quote_stripper.py):
+
+    python -m benchmarks.quote_stripper [--messages 40]
+
+Every reply quotes the whole thread so far below an "On ... wrote:" line
+and ends with a "-- " signature, so unstripped output grows quadratically
+with the thread.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+# measure the work itself, not the in-memory body cache
+os.environ["BODY_CACHE_SIZE"] = "0"
+
+from mcp_email.create_draft_reply.body_normalizer import normalize_body  # noqa: E402
+from mcp_email.create_draft_reply.quote_stripper import QuoteStripper  # noqa: E402
+
+
+def reply_chain(count: int) -> list[str]:
+    bodies: list[str] = []
+    history = ""
+    for n in range(count):
+        new = "\n".join(
+            f"Reply {n} line {j}: checking in about the contract, item {n * 7 + j}."
+            for j in range(6)
+        )
+        body = f"{new}\n\nBest,\nSender {n}\n-- \nSender {n} | Example Corp\n"
+        if history:
+            body += f"\nOn Mon, 1 Jan 2024 at 10:{n % 60:02d}, Sender {n - 1} <s@example.com> wrote:\n"
+            body += "\n".join(f"> {line}" for line in history.splitlines())
+        bodies.append(body)
+        history = body
+    return bodies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=40)
+    args = parser.parse_args()
+
+    bodies = reply_chain(args.messages)
+    print(f"{args.messages} messages, {sum(map(len, bodies))} input chars")
+    for name, strip in (
+        ("unstripped", lambda: (lambda text: text)),
+        ("stripped", lambda: QuoteStripper().strip),
+    ):
+        strip_body = strip()
+        start = time.perf_counter()
+        cleaned = [normalize_body(strip_body(body)) for body in bodies]
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12}{sum(map(len, cleaned)):10d} output chars{elapsed * 1000:10.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Compares the ways create_draft_reply can get a message body, on messages
+with large attachments:
+
+    python -m benchmarks.raw_mime [--messages 20] [--attachment-kb 2048]
+
+Every message is multipart/mixed: a multipart/alternative body (text and
+HTML) followed by a PDF attachment. Paths:
+
+  json_parts       format="full" thread response under THREAD_CONTEXT_FIELDS
+                   (nested parts and their data), read by _decode_message_text
+  raw_whole        format="raw", decoded in one piece, parsed by BytesParser
+                   and read by _extract_body_from_mime
+  raw_incremental  format="raw", fed to BytesFeedParser chunk by chunk with
+                   an early exit (_text_from_raw, DRAFT_REPLY_FORMAT=raw)
+
+Reported per path: response bytes received, bytes base64-decoded, bodies
+found, time, and peak traced memory (response JSON parsing included).
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import sys
+import time
+import tracemalloc
+from email import message_from_bytes
+from email.message import EmailMessage
+from typing import Callable
+
+from benchmarks.fake_gmail import apply_fields
+from mcp_email.create_draft_reply.create_draft_reply import (
+    _decode_message_text,
+    _extract_body_from_mime,
+    _text_from_raw,
+)
+from mcp_email.gmail_requests import THREAD_CONTEXT_FIELDS
+from mcp_email.instrumentation import reset_stats, stats_snapshot
+
+
+def _message(n: int, attachment_kb: int) -> EmailMessage:
+    text = "\n".join(f"Line {i} of the reply to message {n}, with some words in it." for i in range(40))
+    msg = EmailMessage()
+    msg["From"] = "Alice Martin <alice@example.com>"
+    msg["To"] = "Me <me@example.com>"
+    msg["Subject"] = f"Report {n}"
+    msg.set_content(text)
+    msg.add_alternative("<html><body>" + "".join(f"<p>{line}</p>" for line in text.splitlines()) + "</body></html>", subtype="html")
+    msg.add_attachment(
+        bytes(range(256)) * (attachment_kb * 4),
+        maintype="application",
+        subtype="pdf",
+        filename=f"report-{n}.pdf",
+    )
+    return msg
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def _full_part(part) -> dict:
+    # Gmail's format="full" payload: nested parts, data inline for text only
+    entry: dict = {"mimeType": part.get_content_type(), "body": {}}
+    if part.is_multipart():
+        entry["parts"] = [_full_part(p) for p in part.get_payload()]
+    elif part.get_content_maintype() == "text":
+        entry["body"]["data"] = _b64(part.get_payload(decode=True))
+    else:
+        # attachments are fetched separately by ID
+        data = part.get_payload(decode=True)
+        entry["body"] = {"attachmentId": "a" * 64, "size": len(data)}
+    return entry
+
+
+def _json_parts_response(msg: EmailMessage) -> str:
+    # the thread read as the tools request it: the mask keeps the nested
+    # parts' MIME types and data, not attachment IDs or sizes
+    thread = {
+        "id": "t",
+        "historyId": "1",
+        "messages": [{"id": "m", "threadId": "t", "labelIds": ["INBOX"], "payload": _full_part(msg)}],
+    }
+    return json.dumps(apply_fields(thread, THREAD_CONTEXT_FIELDS))
+
+
+def _raw_response(msg: EmailMessage) -> str:
+    return json.dumps({"id": "m", "raw": _b64(msg.as_bytes())})
+
+
+def _decoded_size(part: dict) -> int:
+    data = part.get("body", {}).get("data")
+    own = len(base64.urlsafe_b64decode(data)) if data else 0
+    return own + sum(_decoded_size(p) for p in part.get("parts", []))
+
+
+def _json_parts(response: str) -> tuple[str, int]:
+    payload = json.loads(response)["messages"][0]["payload"]
+    return _decode_message_text(payload), _decoded_size(payload)
+
+
+def _raw_whole(response: str) -> tuple[str, int]:
+    data = base64.urlsafe_b64decode(json.loads(response)["raw"])
+    return _extract_body_from_mime(message_from_bytes(data)), len(data)
+
+
+def _raw_incremental(response: str) -> tuple[str, int]:
+    reset_stats()
+    text = _text_from_raw(json.loads(response)["raw"])
+    decoded = stats_snapshot()["values"]["parse.raw_bytes_decoded"]
+    return text, int(decoded["count"] * decoded["mean"])
+
+
+def _measure(read: Callable[[str], tuple[str, int]], responses: list[str]) -> dict:
+    found = decoded = 0
+    start = time.perf_counter()
+    for response in responses:
+        text, n = read(response)
+        found += bool(text.strip())
+        decoded += n
+    elapsed = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    for response in responses:
+        read(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "bytes_received": sum(len(r) for r in responses),
+        "bytes_decoded": decoded,
+        "bodies_found": f"{found}/{len(responses)}",
+        "ms": round(elapsed, 1),
+        "peak_kb": round(peak / 1024),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--attachment-kb", type=int, default=2048)
+    args = parser.parse_args()
+
+    messages = [_message(n, args.attachment_kb) for n in range(args.messages)]
+    json_responses = [_json_parts_response(m) for m in messages]
+    raw_responses = [_raw_response(m) for m in messages]
+
+    # the raw paths must agree on every body, and with the JSON path up to
+    # the trailing newline _extract_body_from_mime strips
+    for json_response, raw_response in zip(json_responses, raw_responses):
+        whole = _raw_whole(raw_response)[0]
+        if _raw_incremental(raw_response)[0] != whole:
+            raise SystemExit("raw_incremental read a different body than raw_whole")
+        if _json_parts(json_response)[0].strip() != whole.strip():
+            raise SystemExit("json_parts read a different body than raw_whole")
+
+    columns = ("bytes_received", "bytes_decoded", "bodies_found", "ms", "peak_kb")
+    print(f"{'path':<18}" + "".join(f"{c:>16}" for c in columns))
+    for name, read, responses in (
+        ("json_parts", _json_parts, json_responses),
+        ("raw_whole", _raw_whole, raw_responses),
+        ("raw_incremental", _raw_incremental, raw_responses),
+    ):
+        result = _measure(read, responses)
+        print(f"{name:<18}" + "".join(f"{result[c]:>16}" for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
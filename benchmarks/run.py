@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the tools against a replayed Gmail mailbox:
+
+    python -m benchmarks.run                      # compare with baselines.json
+    python -m benchmarks.run --update-baselines   # accept the current numbers
+    python -m benchmarks.run --fixtures recorded.json
+    python -m benchmarks.run --record recorded.json   # needs TOKEN_FILE etc.
+
+Each benchmark reports median latency, Gmail round trips and API calls,
+request/response body bytes and peak traced memory. A run fails (exit code
+1) when a benchmark is worse than its stored baseline: any extra call,
+more than BYTES_TOLERANCE extra bytes, or latency / memory above their
+tolerances.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from email.message import EmailMessage
+from email.parser import Parser
+from typing import Callable
+
+# caches would hide the work being measured, and the real mailbox database
+# must never see fixture data; this has to happen before mcp_email is imported
+_TMP_DIR = tempfile.mkdtemp(prefix="mcp-email-bench-")
+_DB_FILE = os.path.join(_TMP_DIR, "mailbox.sqlite3")
+_OUTBOX_FILE = os.path.join(_TMP_DIR, "outbox.sqlite3")
+os.environ["MAILBOX_DB_FILE"] = _DB_FILE
+os.environ["OUTBOX_DB_FILE"] = _OUTBOX_FILE
+os.environ["BODY_CACHE_SIZE"] = "0"
+os.environ.setdefault("GMAIL_QUOTA_UNITS_PER_SECOND", "1000000")
+# concurrent outbox sends interleave differently every run, and so does
+# their peak memory; one worker keeps send_thread_reply.replies comparable
+os.environ.setdefault("OUTBOX_WORKERS", "1")
+
+from benchmarks import imap_backend  # noqa: E402
+from benchmarks.fake_gmail import RecordingHttp, Traffic, build_replay_service, load_fixtures  # noqa: E402
+from mcp_email import mailbox_store  # noqa: E402
+from mcp_email.create_draft_reply.create_draft_reply import (  # noqa: E402
+    _clean_body_for_llm,
+    _create_draft_reply,
+    _extract_body_from_mime,
+    _fetch_thread_context,
+)
+from mcp_email.get_unread_emails import unread_index  # noqa: E402
+from mcp_email.get_unread_emails.get_unread_emails import MAX_LIMIT, get_unread_emails  # noqa: E402
+from mcp_email.send_thread_reply import outbox  # noqa: E402
+from mcp_email.reply_target import reply_target  # noqa: E402
+from mcp_email.send_thread_reply.send_thread_reply import (  # noqa: E402
+    _get_latest_reply_target,
+    send_thread_reply,
+)
+from mcp_email.utils import GMAIL_BATCH_SIZE, get_gmail_service, set_gmail_service  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(BENCH_DIR, "fixtures", "synthetic.json")
+BASELINES_FILE = os.path.join(BENCH_DIR, "baselines.json")
+
+LATENCY_TOLERANCE = float(os.getenv("BENCH_LATENCY_TOLERANCE", "1.0"))
+# millisecond-scale timings jitter by more than any ratio tolerance
+LATENCY_SLACK_MS = float(os.getenv("BENCH_LATENCY_SLACK_MS", "2"))
+MEMORY_TOLERANCE = float(os.getenv("BENCH_MEMORY_TOLERANCE", "0.25"))
+BYTES_TOLERANCE = 0.02
+
+_METRICS = ("latency_ms", "round_trips", "api_calls", "bytes_sent", "bytes_received", "peak_kb")
+
+
+def _remove_db(path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _reset_caches() -> None:
+    # a cold start: new mailbox database and outbox, empty unread index
+    if mailbox_store._store is not None:
+        mailbox_store._store._db.close()
+    _remove_db(_DB_FILE)
+    mailbox_store._store = mailbox_store.MailboxStore(_DB_FILE)
+    unread_index._index = None
+    if outbox._outbox is not None:
+        outbox._outbox._db.close()
+    _remove_db(_OUTBOX_FILE)
+    outbox._outbox = outbox.Outbox(_OUTBOX_FILE)
+
+
+def _thread_texts(fixtures: dict) -> list[tuple[str | None, str | None]]:
+    # (text/plain, text/html) of every message of every full thread fixture
+    texts = []
+    for entry in fixtures["entries"]:
+        if "format=full" not in entry["request"]:
+            continue
+        for message in entry["body"].get("messages", []):
+            parts = {
+                part.get("mimeType"): base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8")
+                for part in message.get("payload", {}).get("parts", [])
+                if part.get("body", {}).get("data")
+            }
+            texts.append((parts.get("text/plain"), parts.get("text/html")))
+    return texts
+
+
+def _mime_messages(texts: list[tuple[str | None, str | None]]) -> list[EmailMessage]:
+    # multipart/alternative with an attachment, and HTML-only, for each message
+    messages = []
+    for plain, html in texts:
+        if plain and html:
+            msg = EmailMessage()
+            msg.set_content(plain)
+            msg.add_alternative(html, subtype="html")
+            msg.add_attachment(b"%PDF-1.4" + b"\0" * 20_000, maintype="application", subtype="pdf", filename="a.pdf")
+            messages.append(msg)
+        if html:
+            msg = EmailMessage()
+            msg.set_content(html, subtype="html")
+            messages.append(msg)
+    return messages
+
+
+class Benchmark:
+    def __init__(self, name: str, run: Callable[[], object], setup: Callable[[], None] = lambda: None) -> None:
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+
+def _check_threading(sent: dict, thread_id: str, thread: dict) -> None:
+    # the reply must answer the thread's latest external message
+    target = reply_target(thread)
+    headers = Parser().parsestr(base64.urlsafe_b64decode(sent["raw"]).decode("utf-8"), headersonly=True)
+    if sent.get("threadId") != thread_id or headers["In-Reply-To"] != target["message_id"]:
+        raise AssertionError(f"reply not threaded: threadId={sent.get('threadId')} In-Reply-To={headers['In-Reply-To']}")
+    if not headers["References"].endswith(target["message_id"]):
+        raise AssertionError(f"References does not end with {target['message_id']}: {headers['References']}")
+
+
+def _benchmarks(fixtures: dict, traffic: Traffic) -> list[Benchmark]:
+    workload = fixtures["workload"]
+    texts = _thread_texts(fixtures)
+    plain_texts = [plain for plain, _ in texts if plain]
+    mime_messages = _mime_messages(texts)
+
+    def fetch_contexts(body_format: str = "full"):
+        service = get_gmail_service()
+        for thread_id in workload["thread_ids"]:
+            _fetch_thread_context(service, thread_id, body_format=body_format)
+
+    def warm_contexts():
+        _reset_caches()
+        fetch_contexts()
+
+    # 100 replies spread over the workload threads
+    replies = [
+        {
+            "threadId": workload["thread_ids"][n % len(workload["thread_ids"])],
+            "replyText": f"Reply {n}",
+            "idempotencyKey": f"bench-{n}",
+        }
+        for n in range(100)
+    ]
+
+    def sent_replies():
+        _reset_caches()
+        send_thread_reply({"replies": replies})
+
+    send_thread = next(
+        entry["body"]
+        for entry in fixtures["entries"]
+        if f"/threads/{workload['send_thread_id']}?" in entry["request"] and "format=full" in entry["request"]
+    )
+
+    def drafted():
+        _reset_caches()
+        _create_draft_reply({"threadId": workload["send_thread_id"]})
+
+    def reply_after_draft():
+        send_thread_reply({"threadId": workload["send_thread_id"], "replyText": "Thanks, that works for me."})
+        _check_threading(traffic.sent[-1], workload["send_thread_id"], send_thread)
+
+    def warm_unread():
+        _reset_caches()
+        get_unread_emails({"limit": 20})
+
+    def unread_batched(batch_size: int = GMAIL_BATCH_SIZE):
+        # the listing costs a profile and a list call; the metadata of every
+        # listed thread must then arrive in at most two batches
+        before = traffic.snapshot()
+        text = get_unread_emails({"limit": MAX_LIMIT}, batch_size=batch_size)[0].text
+        threads = sum(line.startswith("thread_id=") for line in text.splitlines())
+        round_trips = traffic.round_trips - before["round_trips"] - 2
+        calls = traffic.api_calls - before["api_calls"] - 2
+        if calls != threads:
+            raise AssertionError(f"{calls} metadata calls for {threads} threads")
+        if batch_size == GMAIL_BATCH_SIZE and not 1 <= round_trips <= 2:
+            raise AssertionError(f"metadata for {threads} threads took {round_trips} round trips")
+
+    # the IMAP backend against the in-process stand-in, 2 ms per command
+    imap_server = imap_backend.ImapStandIn(latency=0.002)
+    imap_backend.fill(imap_server, 200)
+    imap = imap_backend.ImapBackend(imap_backend.ImapConnectionPool(imap_server.connect), gmail_extensions=True)
+
+    def imap_listing(list_page: Callable[[], object]) -> Callable[[], None]:
+        # every IMAP command is one round trip and one call
+        def run():
+            commands = len(imap_server.commands)
+            list_page()
+            for _ in range(len(imap_server.commands) - commands):
+                traffic.add(1, 0, 0)
+
+        return run
+
+    return [
+        Benchmark("get_unread_emails.cold", lambda: get_unread_emails({"limit": 20}), _reset_caches),
+        Benchmark("get_unread_emails.warm", lambda: get_unread_emails({"limit": 20}), warm_unread),
+        # one metadata round trip per thread, for comparison with .batched
+        Benchmark("get_unread_emails.unbatched", lambda: unread_batched(batch_size=1), _reset_caches),
+        Benchmark("get_unread_emails.batched", unread_batched, _reset_caches),
+        Benchmark("fetch_thread_context.cold", fetch_contexts, _reset_caches),
+        Benchmark("fetch_thread_context.warm", fetch_contexts, warm_contexts),
+        Benchmark("fetch_thread_context.raw", lambda: fetch_contexts("raw"), _reset_caches),
+        Benchmark(
+            "create_draft_reply.threadIds",
+            lambda: _create_draft_reply({"threadIds": workload["thread_ids"]}),
+            _reset_caches,
+        ),
+        Benchmark("clean_body_for_llm", lambda: [_clean_body_for_llm(t) for t in plain_texts]),
+        Benchmark("extract_body_from_mime", lambda: [_extract_body_from_mime(m) for m in mime_messages]),
+        Benchmark(
+            "send_thread_reply",
+            lambda: send_thread_reply(
+                {"threadId": workload["send_thread_id"], "replyText": "Thanks, that works for me."}
+            ),
+            _reset_caches,
+        ),
+        # the reply target comes from the draft's read of the thread
+        Benchmark("send_thread_reply.after_draft", reply_after_draft, drafted),
+        # every key sent exactly once: 100 sends, then none when resubmitted
+        Benchmark("send_thread_reply.replies", lambda: send_thread_reply({"replies": replies}), _reset_caches),
+        Benchmark(
+            "send_thread_reply.replies.resubmit",
+            lambda: send_thread_reply({"replies": replies}),
+            sent_replies,
+        ),
+        # a 50-thread page on a warm pooled connection...
+        Benchmark("imap.list_unread.pooled", imap_listing(lambda: imap_backend.list_pooled(imap, 50))),
+        # ...and 50 messages fetched one by one on a new connection
+        Benchmark(
+            "imap.list_unread.per_message",
+            imap_listing(lambda: imap_backend.list_per_message(imap_server, 50)),
+        ),
+    ]
+
+
+def _measure(bench: Benchmark, traffic: Traffic, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        bench.setup()
+        traffic.reset()
+        start = time.perf_counter()
+        bench.run()
+        timings.append((time.perf_counter() - start) * 1000)
+    counters = traffic.snapshot()
+
+    # separate run: tracemalloc slows everything down
+    bench.setup()
+    tracemalloc.start()
+    bench.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"latency_ms": round(statistics.median(timings), 2), **counters, "peak_kb": round(peak / 1024)}
+
+
+def _regressions(result: dict, baseline: dict) -> list[str]:
+    # metric -> (factor, slack)
+    limits = {
+        "latency_ms": (1 + LATENCY_TOLERANCE, LATENCY_SLACK_MS),
+        "round_trips": (1, 0),
+        "api_calls": (1, 0),
+        "bytes_sent": (1 + BYTES_TOLERANCE, 0),
+        "bytes_received": (1 + BYTES_TOLERANCE, 0),
+        "peak_kb": (1 + MEMORY_TOLERANCE, 0),
+    }
+    return [
+        f"{metric} {result[metric]} > {baseline[metric]}"
+        for metric, (factor, slack) in limits.items()
+        if metric in baseline and result[metric] > baseline[metric] * factor + slack
+    ]
+
+
+def _record(path: str) -> None:
+    # runs the read-only part of the workload against the real account
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build
+
+    from mcp_email.utils import _load_credentials
+
+    http = RecordingHttp(AuthorizedHttp(_load_credentials()))
+    set_gmail_service(build("gmail", "v1", http=http, static_discovery=True, cache_discovery=False))
+
+    _reset_caches()
+    listing = get_unread_emails({"limit": 20})[0].text
+    # again, for the history-only warm path
+    get_unread_emails({"limit": 20})
+
+    thread_ids = [
+        line.split("thread_id=", 1)[1].split(" | ", 1)[0]
+        for line in listing.splitlines()
+        if line.startswith("thread_id=")
+    ][:5]
+    if not thread_ids:
+        raise SystemExit("no unread threads to record")
+    send_target = thread_ids[0]
+
+    for thread_id in thread_ids:
+        _fetch_thread_context(get_gmail_service(), thread_id)
+    # again from the raw source; cached bodies would skip it
+    _reset_caches()
+    for thread_id in thread_ids:
+        _fetch_thread_context(get_gmail_service(), thread_id, body_format="raw")
+    _get_latest_reply_target(get_gmail_service(), send_target)
+
+    fixtures = http.fixtures({"thread_ids": thread_ids, "send_thread_id": send_target})
+    # nothing is sent while recording; the send response is made up
+    fixtures["entries"].append(
+        {
+            "request": "POST /gmail/v1/users/me/messages/send",
+            "status": 200,
+            "body": {"id": "recorded-send", "threadId": send_target, "labelIds": ["SENT"]},
+        }
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, indent=1)
+    print(f"recorded {len(fixtures['entries'])} responses to {path}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--baselines", default=BASELINES_FILE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--record", metavar="PATH", help="record fixtures from the real account")
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose name starts with one of these")
+    args = parser.parse_args()
+
+    if args.record:
+        _record(args.record)
+        return 0
+
+    fixtures = load_fixtures(args.fixtures)
+    service, traffic = build_replay_service(fixtures)
+    set_gmail_service(service)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    results = {}
+    failed = False
+    print(f"{'benchmark':<28}" + "".join(f"{m:>16}" for m in _METRICS))
+    for bench in _benchmarks(fixtures, traffic):
+        if args.names and not bench.name.startswith(tuple(args.names)):
+            continue
+        result = _measure(bench, traffic, args.repeat)
+        results[bench.name] = result
+        problems = [] if args.update_baselines else _regressions(result, baselines.get(bench.name, {}))
+        failed |= bool(problems)
+        print(f"{bench.name:<28}" + "".join(f"{result[m]:>16}" for m in _METRICS))
+        for problem in problems:
+            print(f"    REGRESSION: {problem}")
+
+    if args.update_baselines:
+        baselines.update(results)
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baselines written to {args.baselines}")
+        return 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
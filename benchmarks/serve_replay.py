@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Runs the MCP server over a replayed mailbox instead of the real account:
+
+    python -m benchmarks.serve_replay [--transport stdio|http] [--port N] [--fixtures PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+
+# the real mailbox database and outbox must never see fixture data
+_TMP_DIR = tempfile.mkdtemp(prefix="mcp-email-replay-")
+os.environ["MAILBOX_DB_FILE"] = os.path.join(_TMP_DIR, "mailbox.sqlite3")
+os.environ["OUTBOX_DB_FILE"] = os.path.join(_TMP_DIR, "outbox.sqlite3")
+os.environ.setdefault("GMAIL_QUOTA_UNITS_PER_SECOND", "1000000")
+os.environ.setdefault("IMAP_IDLE", "0")
+
+from benchmarks.fake_gmail import build_replay_service, load_fixtures  # noqa: E402
+from mcp_email import email_server  # noqa: E402
+from mcp_email.utils import set_gmail_service  # noqa: E402
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "synthetic.json")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=("stdio", "http"), default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=email_server.MCP_HTTP_PORT)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    args = parser.parse_args()
+
+    service, _ = build_replay_service(load_fixtures(args.fixtures))
+    set_gmail_service(service)
+    asyncio.run(email_server.main(args.transport, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Measures server cold start:
+
+    python -m benchmarks.startup                     # compare with baselines.json
+    python -m benchmarks.startup --update-baselines
+
+initialize_ms is the wall time from spawning `python -m
+mcp_email.email_server` to reading its `initialize` response on stdout.
+import_ms is the cumulative `-X importtime` cost of importing
+mcp_email.email_server. A run also fails if any of EAGER_FORBIDDEN is
+imported before the server can answer `initialize`.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.run import BASELINES_FILE, LATENCY_SLACK_MS, LATENCY_TOLERANCE
+
+BENCHMARK = "server_startup"
+
+# loaded on first use of the tool that needs them (or after the handshake)
+EAGER_FORBIDDEN = (
+    "googleapiclient.discovery",
+    "google_auth_oauthlib",
+    "cleantext",
+    "mcp_email.create_draft_reply.create_draft_reply",
+    "mcp_email.get_unread_emails.get_unread_emails",
+    "mcp_email.send_thread_reply.send_thread_reply",
+)
+
+_INITIALIZE = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2025-06-18",
+        "capabilities": {},
+        "clientInfo": {"name": "startup-benchmark", "version": "0"},
+    },
+}
+
+# no background work, no credentials needed
+_ENV = {**os.environ, "EMAIL_PREWARM": "0", "IMAP_IDLE": "0"}
+
+
+def _time_to_initialize() -> float:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "mcp_email.email_server"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=_ENV,
+    )
+    try:
+        proc.stdin.write((json.dumps(_INITIALIZE) + "\n").encode())
+        proc.stdin.flush()
+        response = json.loads(proc.stdout.readline())
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        proc.kill()
+        proc.wait()
+    if "result" not in response:
+        raise SystemExit(f"initialize failed: {response}")
+    return elapsed
+
+
+def _import_times() -> dict[str, int]:
+    # module -> cumulative microseconds
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import mcp_email.email_server"],
+        capture_output=True,
+        text=True,
+        env=_ENV,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name] = int(cumulative)
+    return times
+
+
+def measure(repeat: int) -> dict:
+    initialize = [_time_to_initialize() for _ in range(repeat)]
+    imports = [_import_times() for _ in range(repeat)]
+    eager = sorted(
+        name for name in imports[0]
+        if any(name == m or name.startswith(m + ".") for m in EAGER_FORBIDDEN)
+    )
+    return {
+        "initialize_ms": round(statistics.median(initialize), 1),
+        "import_ms": round(statistics.median(t["mcp_email.email_server"] for t in imports) / 1000, 1),
+        "eager_heavy_imports": len(eager),
+        "_eager": eager,
+        "_slowest": sorted(imports[0].items(), key=lambda item: -item[1])[:8],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baselines", default=BASELINES_FILE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update-baselines", action="store_true")
+    args = parser.parse_args()
+
+    result = measure(args.repeat)
+    eager = result.pop("_eager")
+    slowest = result.pop("_slowest")
+
+    print(f"{'benchmark':<28}" + "".join(f"{m:>22}" for m in result))
+    print(f"{BENCHMARK:<28}" + "".join(f"{v:>22}" for v in result.values()))
+    print("slowest imports (cumulative ms): " + ", ".join(f"{n} {us / 1000:.0f}" for n, us in slowest))
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.update_baselines:
+        baselines[BENCHMARK] = result
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baselines written to {args.baselines}")
+        return 0
+
+    baseline = baselines.get(BENCHMARK, {})
+    problems = [
+        f"{metric} {result[metric]} > {baseline[metric]}"
+        for metric in ("initialize_ms", "import_ms")
+        if metric in baseline and result[metric] > baseline[metric] * (1 + LATENCY_TOLERANCE) + LATENCY_SLACK_MS
+    ]
+    if eager:
+        problems.append("imported before initialize: " + ", ".join(eager))
+    for problem in problems:
+        print(f"    REGRESSION: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -119,13 +119,12 @@ def main():
     
     # print(recv(proc))
 
-    # ---- get_unread_emails ----
+    # ---- create_draft_reply ----
     send(proc, mcp_tool_call(
         id=3,
         name="create_draft_reply",
         arguments={
-            "email_id": "12345",
-            "email_content": "This is a test email content.",
+            "threadId": os.environ["DEBUG_THREAD_ID"],
         },
     ))
     print(recv(proc))
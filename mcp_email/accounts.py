@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from mcp_email.get_unread_emails.unread_index import UnreadIndex, get_unread_index
+from mcp_email.mailbox_store import MAILBOX_DB_FILE, MailboxStore, get_mailbox_store
+from mcp_email.utils import (
+    CLIENT_SECRET_FILE,
+    MAIL_BACKEND,
+    TOKEN_FILE,
+    _GmailServiceHolder,
+    get_gmail_service,
+)
+
+# name of the account in TOKEN_FILE / CLIENT_SECRET_FILE
+DEFAULT_ACCOUNT = os.getenv("EMAIL_DEFAULT_ACCOUNT", "default")
+# more Gmail accounts served by this process, as
+# "work=/path/to/work-token.json,home=/path/to/home-token.json"; they sign in
+# through the same OAuth client (CLIENT_SECRET_FILE). Ignored by the IMAP backend.
+EMAIL_ACCOUNTS = os.getenv("EMAIL_ACCOUNTS", "")
+# accounts queried at once by a fan-out call
+ACCOUNT_WORKERS = int(os.getenv("ACCOUNT_WORKERS", "8"))
+
+# "work:18c2a14da5315963" is thread 18c2a14da5315963 of account "work"
+ACCOUNT_SEPARATOR = ":"
+
+T = TypeVar("T")
+
+
+class Account:
+    """
+    One Gmail mailbox served by this process. Its client, mailbox database
+    and unread index are built on first use, so an account that is never
+    queried never signs in.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        token_file: str,
+        client_secret_file: str = CLIENT_SECRET_FILE,
+        db_file: str | None = None,
+    ) -> None:
+        self.name = name
+        self._service_holder = _GmailServiceHolder(token_file, client_secret_file)
+        # next to the default account's database unless given
+        self._db_file = db_file or os.path.join(
+            os.path.dirname(os.path.abspath(MAILBOX_DB_FILE)), f"mailbox-{name}.sqlite3"
+        )
+        self._lock = threading.Lock()
+        self._store: MailboxStore | None = None
+        self._index: UnreadIndex | None = None
+
+    def service(self):
+        return self._service_holder.get()
+
+    def store(self) -> MailboxStore:
+        with self._lock:
+            if self._store is None:
+                self._store = MailboxStore(self._db_file)
+            return self._store
+
+    def unread_index(self) -> UnreadIndex:
+        with self._lock:
+            if self._index is None:
+                self._index = UnreadIndex()
+            return self._index
+
+
+class _DefaultAccount(Account):
+    # the process-wide client, store and index used before there were accounts
+    def __init__(self, name: str) -> None:
+        super().__init__(name, TOKEN_FILE, db_file=MAILBOX_DB_FILE)
+
+    def service(self):
+        return get_gmail_service()
+
+    def store(self) -> MailboxStore:
+        return get_mailbox_store()
+
+    def unread_index(self) -> UnreadIndex:
+        return get_unread_index()
+
+
+def _parse_accounts(value: str) -> dict[str, str]:
+    # name -> token file
+    accounts: dict[str, str] = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, token_file = (part.strip() for part in item.partition("="))
+        if not sep or not name or not token_file or ACCOUNT_SEPARATOR in name:
+            raise ValueError(f"Invalid EMAIL_ACCOUNTS entry (expected name=/path/to/token.json): {item}")
+        if name == DEFAULT_ACCOUNT or name in accounts:
+            raise ValueError(f"Duplicate account name in EMAIL_ACCOUNTS: {name}")
+        accounts[name] = token_file
+    return accounts
+
+
+_accounts: dict[str, Account] | None = None
+_accounts_lock = threading.Lock()
+
+
+def get_accounts() -> dict[str, Account]:
+    """All accounts by name, the default account first."""
+    global _accounts
+    with _accounts_lock:
+        if _accounts is None:
+            accounts: dict[str, Account] = {DEFAULT_ACCOUNT: _DefaultAccount(DEFAULT_ACCOUNT)}
+            if MAIL_BACKEND != "imap":
+                for name, token_file in _parse_accounts(EMAIL_ACCOUNTS).items():
+                    accounts[name] = Account(name, token_file)
+            _accounts = accounts
+        return _accounts
+
+
+def is_multi_account() -> bool:
+    return len(get_accounts()) > 1
+
+
+def get_account(name: str | None = None) -> Account:
+    accounts = get_accounts()
+    if name is None:
+        return accounts[DEFAULT_ACCOUNT]
+    try:
+        return accounts[name]
+    except KeyError:
+        raise ValueError(f"Unknown account: {name} (configured: {', '.join(accounts)})") from None
+
+
+def select_accounts(names: list[str] | None = None) -> list[Account]:
+    """The named accounts, in the given order; all of them if `names` is empty."""
+    if not names:
+        return list(get_accounts().values())
+    return [get_account(name) for name in dict.fromkeys(names)]
+
+
+def qualify_thread_id(account_name: str, thread_id: str | None) -> str | None:
+    """
+    The thread ID the tools show: "account:threadId" once more than one
+    account is configured, the bare Gmail thread ID otherwise.
+    """
+    if thread_id is None or not is_multi_account():
+        return thread_id
+    return f"{account_name}{ACCOUNT_SEPARATOR}{thread_id}"
+
+
+def route_thread_id(thread_id: str) -> tuple[Account, str]:
+    """
+    Splits a thread ID shown by the tools into its account and Gmail thread
+    ID. Unqualified IDs belong to the default account.
+    """
+    name, sep, gmail_thread_id = thread_id.partition(ACCOUNT_SEPARATOR)
+    if not sep or MAIL_BACKEND == "imap":
+        return get_account(), thread_id
+    return get_account(name), gmail_thread_id
+
+
+def for_each_account(
+    accounts: list[Account],
+    fn: Callable[[Account], T],
+) -> dict[str, tuple[T | None, Exception | None]]:
+    """
+    Calls `fn` for every account, concurrently, and returns one (result,
+    error) pair per account name, in the given order. An account that fails
+    (e.g. it cannot sign in) only sets its own error.
+    """
+    def run(account: Account) -> tuple[T | None, Exception | None]:
+        try:
+            return fn(account), None
+        except Exception as e:
+            return None, e
+
+    if len(accounts) == 1:
+        return {accounts[0].name: run(accounts[0])}
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(ACCOUNT_WORKERS, len(accounts))),
+        thread_name_prefix="accounts",
+    ) as pool:
+        return dict(zip((account.name for account in accounts), pool.map(run, accounts)))
+
+
+def get_threads(thread_ids: list[str], format: str) -> list[tuple[dict | None, Exception | None]]:
+    """
+    MailboxStore.get_threads for thread IDs shown by the tools, which may
+    span accounts: each account's threads are fetched as its own batch
+    requests, the accounts concurrently. Returns one (thread, error) pair
+    per ID, in order.
+    """
+    results: list[tuple[dict | None, Exception | None]] = [(None, None)] * len(thread_ids)
+    # account name -> [(position, Gmail thread ID)]
+    routed: dict[str, list[tuple[int, str]]] = {}
+    for position, thread_id in enumerate(thread_ids):
+        try:
+            account, gmail_thread_id = route_thread_id(thread_id)
+        except ValueError as e:
+            results[position] = (None, e)
+            continue
+        routed.setdefault(account.name, []).append((position, gmail_thread_id))
+
+    fetched = for_each_account(
+        [get_account(name) for name in routed],
+        lambda account: account.store().get_threads(
+            account.service(),
+            [gmail_thread_id for _, gmail_thread_id in routed[account.name]],
+            format=format,
+        ),
+    )
+    for name, (threads, error) in fetched.items():
+        for n, (position, _) in enumerate(routed[name]):
+            results[position] = threads[n] if error is None else (None, error)
+    return results
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import hashlib
+import os
+import quopri
+import re
+import threading
+from collections import OrderedDict
+
+from cleantext import clean
+
+# cleaned bodies kept in memory; 0 disables the cache
+BODY_CACHE_SIZE = int(os.getenv("BODY_CACHE_SIZE", "2048"))
+
+# Markdown-style links like [link text](.../example.com)
+_LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_CLEAN_OPTIONS = dict(
+    fix_unicode=True,
+    to_ascii=True,
+    lower=False,
+    no_line_breaks=True,
+    no_urls=True,
+    no_emails=True,
+)
+
+
+def _decode_quoted_printable(text: str) -> str:
+    # quopri only accepts ASCII str (it raises ValueError otherwise), and
+    # text without "=" has nothing to decode, so both cases skip the work
+    if "=" not in text or not text.isascii():
+        return text
+    return quopri.decodestring(text).decode("utf-8", errors="replace")
+
+
+def normalize_body(text: str) -> str:
+    """
+    Turns a decoded email body into single-line plain ASCII for the LLM:
+    quoted-printable decoding, clean-text (unicode fixes, ASCII
+    transliteration, URL/email masking, whitespace collapse), then
+    `[label](url)` links reduced to their label.
+    """
+    text = _decode_quoted_printable(text)
+    text = clean(text, **_CLEAN_OPTIONS).strip()
+
+    # clean-text already collapsed whitespace; only a replaced link can
+    # leave runs of spaces behind, so the extra pass runs only then
+    if "](" in text:
+        text, replaced = _LINK_RE.subn(r"\1", text)
+        if replaced:
+            text = _WHITESPACE_RE.sub(" ", text).strip()
+
+    return text
+
+
+class _BodyCache:
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str | None, str], str] = OrderedDict()
+
+    def get(self, key: tuple[str | None, str]) -> str | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple[str | None, str], value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+
+_cache = _BodyCache(BODY_CACHE_SIZE)
+
+
+def normalize_body_cached(text: str, message_id: str | None = None) -> str:
+    """normalize_body, memoized by message ID and a hash of the raw text."""
+    if BODY_CACHE_SIZE <= 0:
+        return normalize_body(text)
+
+    digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+    key = (message_id, digest)
+
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = normalize_body(text)
+    _cache.put(key, result)
+    return result
+
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, TypeVar
+
+# worker processes that decode and clean the bodies of large threads; 0
+# keeps all body work in the server process. One core is left to the server.
+# Spawning them and importing the body code takes seconds; the server does it
+# after the handshake (warm_up_body_pool), otherwise the first large thread
+# waits for it.
+BODY_POOL_WORKERS = int(os.getenv("BODY_POOL_WORKERS", str(min(4, (os.cpu_count() or 1) - 1))))
+# threads with fewer bodies to work on than this are processed inline: the
+# pickling and IPC would cost more than the parallel work saves
+BODY_POOL_MIN_MESSAGES = int(os.getenv("BODY_POOL_MIN_MESSAGES", "24"))
+
+R = TypeVar("R")
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server has threads (and their locks)
+            # that a forked child would inherit in an unknown state
+            _pool = ProcessPoolExecutor(
+                max_workers=BODY_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _drop_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def use_body_pool(bodies: int) -> bool:
+    return BODY_POOL_WORKERS > 0 and bodies >= BODY_POOL_MIN_MESSAGES
+
+
+def map_in_body_pool(fn: Callable[..., R], *iterables: Iterable) -> list[R]:
+    """
+    `list(map(fn, *iterables))`, run in the worker processes; results are
+    in input order. `fn` and the items must be picklable (module-level
+    functions, functools.partial of them). If a worker dies, the pool is
+    replaced and this call runs inline.
+    """
+    items = [list(iterable) for iterable in iterables]
+    pool = _get_pool()
+    count = min(len(i) for i in items) if items else 0
+    # a few chunks per worker: fewer round trips, still balanced
+    chunksize = max(1, count // (BODY_POOL_WORKERS * 4))
+    try:
+        return list(pool.map(fn, *items, chunksize=chunksize))
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        return list(map(fn, *items))
+
+
+def call_in_body_pool(fns: list[Callable[[], R]]) -> list[R]:
+    """Calls each zero-argument callable in the worker processes, in order."""
+    return map_in_body_pool(_call, fns)
+
+
+def _call(fn: Callable[[], R]) -> R:
+    return fn()
+
+
+def warm_up_body_pool() -> None:
+    """
+    Starts the worker processes and has each import the body code, so the
+    first large thread does not wait seconds for spawning and imports.
+    """
+    if BODY_POOL_WORKERS <= 0:
+        return
+    pool = _get_pool()
+    for future in [pool.submit(_warm_up) for _ in range(BODY_POOL_WORKERS)]:
+        future.result()
+
+
+def _warm_up() -> None:
+    import mcp_email.create_draft_reply.create_draft_reply  # noqa: F401
+
+
+def shutdown_body_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
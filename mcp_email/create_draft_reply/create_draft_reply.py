@@ -1,48 +1,59 @@
-from typing import TypedDict, List
-from cleantext import clean
-import quopri
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterator, NotRequired, TypedDict, List
 
 import json
 import mcp.types as types
 
-import re
-import json
+import os
 import base64
-import email
-from email import policy
 from email.message import Message
-
-from mcp_email.utils import get_gmail_service
+from email.parser import BytesFeedParser
+
+from mcp_email.accounts import get_threads, route_thread_id
+from mcp_email.create_draft_reply.body_pool import call_in_body_pool, map_in_body_pool, use_body_pool
+from mcp_email.create_draft_reply.body_normalizer import normalize_body_cached
+from mcp_email.create_draft_reply.quote_stripper import QuoteStripper
+from mcp_email.gmail_requests import raw_message_requests
+from mcp_email.html_to_text import html_to_text
+from mcp_email.instrumentation import record_value, span
+from mcp_email.mailbox_store import MailboxStore, get_mailbox_store
+from mcp_email.reply_target import reply_target
+from mcp_email.utils import MAIL_BACKEND, execute_batched
+
+# budget for the message bodies returned to the client
+DRAFT_CONTEXT_MAX_CHARS = int(os.getenv("DRAFT_CONTEXT_MAX_CHARS", "20000"))
+# a partly kept message shorter than this is dropped instead
+_MIN_TRUNCATED_CHARS = 200
+# threads built at once for a `threadIds` call
+DRAFT_REPLY_WORKERS = int(os.getenv("DRAFT_REPLY_WORKERS", "8"))
+MAX_THREADS_PER_CALL = 50
+# "full" reads bodies from the JSON parts of the thread; "raw" fetches the
+# RFC 822 source of the messages that still need decoding and parses it as
+# real MIME (nested multiparts, charsets), stopping at the first text part
+DRAFT_REPLY_FORMAT = os.getenv("DRAFT_REPLY_FORMAT", "full").lower()
+# thread format fetched for each body format; "raw" only needs the headers
+_THREAD_FORMATS = {"full": "full", "raw": "metadata"}
+# base64 characters decoded and fed to the parser at a time (a multiple of 4)
+_RAW_CHUNK_CHARS = 64 * 1024
 
 
 # used to clean email body text before sending back to LLM
-def _clean_body_for_llm(text: str) -> str:
-    try:
-        text = quopri.decodestring(text).decode("utf-8", errors="replace")
-    except ValueError:
-        pass
+def _clean_body_for_llm(text: str, message_id: str | None = None) -> str:
+    return normalize_body_cached(text, message_id)
 
-    clean_text = clean(
-        text,
-        fix_unicode=True,
-        to_ascii=True,
-        lower=False,
-        no_line_breaks=True,
-        no_urls=True,
-        no_emails=True,
-    ).strip()
 
-    # Match Markdown-style links like [link text](.../example.com)
-    _LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+def _decode_part(part: Message) -> str | None:
+    # bytes -> str using the part charset (or utf-8 fallback)
+    payload = part.get_payload(decode=True)
+    if payload is None:
+        return None
 
-    # 3) Replace `[label](url)` with just `label`
-    clean_text = _LINK_RE.sub(r"\1", clean_text)
-
-    # 4) Collapse multiple spaces
-    clean_text = re.sub(r"\s+", " ", clean_text).strip()
-
-    return clean_text
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
 
 
 def _extract_body_from_mime(mime_msg: Message) -> str:
@@ -53,31 +64,18 @@ def _extract_body_from_mime(mime_msg: Message) -> str:
         for part in mime_msg.walk():
             ctype = part.get_content_type()
 
-            # bytes -> str using the part charset (or utf-8 fallback)
-            payload = part.get_payload(decode=True)
-            if payload is None:
+            text = _decode_part(part)
+            if text is None:
                 continue
 
-            charset = part.get_content_charset() or "utf-8"
-            try:
-                text = payload.decode(charset, errors="replace")
-            except LookupError:
-                text = payload.decode("utf-8", errors="replace")
-
             if ctype == "text/plain" and text_plain is None:
                 text_plain = text
             elif ctype == "text/html" and text_html is None:
                 text_html = text
     else:
         ctype = mime_msg.get_content_type()
-        payload = mime_msg.get_payload(decode=True)
-        if payload is not None:
-            charset = mime_msg.get_content_charset() or "utf-8"
-            try:
-                text = payload.decode(charset, errors="replace")
-            except LookupError:
-                text = payload.decode("utf-8", errors="replace")
-
+        text = _decode_part(mime_msg)
+        if text is not None:
             if ctype == "text/plain":
                 text_plain = text
             elif ctype == "text/html":
@@ -87,12 +85,64 @@ def _extract_body_from_mime(mime_msg: Message) -> str:
         return text_plain.strip()
 
     if text_html:
-        soup = BeautifulSoup(text_html, "html.parser")
-        return soup.get_text(separator="\n").strip()
+        return html_to_text(text_html)
 
     return "(empty body)"
 
 
+def _iter_raw_chunks(raw: str) -> Iterator[bytes]:
+    for start in range(0, len(raw), _RAW_CHUNK_CHARS):
+        chunk = raw[start:start + _RAW_CHUNK_CHARS]
+        yield base64.urlsafe_b64decode(chunk + "=" * (-len(chunk) % 4))
+
+
+def _text_from_raw(raw: str) -> str:
+    """
+    Body text of a format="raw" message, as _extract_body_from_mime would
+    find it.
+
+    The base64url source is decoded and fed to the parser one chunk at a
+    time, so the decoded message is never held as a whole. Parsing stops
+    once the first text/plain part is complete: attachments after it are
+    neither decoded nor parsed.
+    """
+    parts: list[Message] = []
+
+    def new_part(**kwargs) -> Message:
+        part = Message(**kwargs)
+        parts.append(part)
+        return part
+
+    parser = BytesFeedParser(_factory=new_part)
+    # the parser calls the factory once to probe its signature
+    parts.clear()
+
+    chunks = _iter_raw_chunks(raw)
+    decoded = 0
+    for data in chunks:
+        decoded += len(data)
+        parser.feed(data)
+
+        # parts are created in walk order, and a part is complete once the
+        # parser has moved on to the next one
+        plain = next((i for i, part in enumerate(parts) if part.get_content_type() == "text/plain"), None)
+        if plain is not None and plain + 1 < len(parts):
+            text = _decode_part(parts[plain])
+            if text:
+                record_value("parse.raw_bytes_decoded", decoded)
+                return text.strip()
+            break
+
+    # no text/plain part, or an empty one (which falls back to text/html,
+    # as in _extract_body_from_mime): parse the rest
+    for data in chunks:
+        decoded += len(data)
+        parser.feed(data)
+
+    record_value("parse.raw_bytes_decoded", decoded)
+    return _extract_body_from_mime(parser.close())
+
+
 def _headers_to_dict(headers: list[dict]) -> dict[str, str]:
     return {h["name"]: h["value"] for h in headers}
 
@@ -109,53 +159,180 @@ class DraftReplyContext(TypedDict):
     instructions: str
     threadId: str
     messages: List[ThreadMessage]
+    omittedMessages: List[int]  # indexes of messages left out for the budget
+
+
+class ThreadContext(TypedDict):
+    threadId: str
+    messages: NotRequired[List[ThreadMessage]]
+    omittedMessages: NotRequired[List[int]]
+    error: NotRequired[str]  # set instead of messages when the thread failed
+
+
+class MultiDraftReplyContext(TypedDict):
+    instructions: str
+    threads: List[ThreadContext]
+
+
+def _iter_text_bodies(part: dict) -> Iterator[tuple[str, str]]:
+    # the payload and its parts, depth first: a single-part message has its
+    # body on the payload, and the text parts of a message with attachments
+    # are nested inside multipart/alternative
+    mime_type = part.get("mimeType")
+    body_data = part.get("body", {}).get("data")
+    if body_data and mime_type in ("text/plain", "text/html"):
+        yield mime_type, body_data
+    for child in part.get("parts", []):
+        yield from _iter_text_bodies(child)
+
+
+# decode the first text/plain (or text/html) part
+def _decode_message_text(payload: dict) -> str:
+    text_plain = None
+    text_html = None
+
+    for mime_type, body_data in _iter_text_bodies(payload):
+        try:
+            decoded = base64.urlsafe_b64decode(body_data).decode(
+                "utf-8", errors="replace"
+            )
+        except Exception:
+            continue
+
+        if mime_type == "text/plain":
+            text_plain = decoded
+            break
+        if text_html is None:
+            text_html = decoded
+
+    if text_plain:
+        return text_plain
+    return html_to_text(text_html) if text_html else ""
+
+
+def _thread_entries_gmail(thread: dict) -> list[tuple[str | None, dict, Callable[[], str]]]:
+    return [
+        (
+            msg.get("id"),
+            _headers_to_dict(msg.get("payload", {}).get("headers", [])),
+            partial(_decode_message_text, msg.get("payload", {})),
+        )
+        for msg in thread.get("messages", [])
+    ]
+
+
+def _with_raw_loaders(
+    service,
+    entries: list[tuple[str | None, dict, Callable[[], str]]],
+    count: int,
+) -> list[tuple[str | None, dict, Callable[[], str]]]:
+    # the first `count` entries read their body from the raw source instead;
+    # those messages are fetched as one batch request
+    requests = raw_message_requests(service, [msg_id for msg_id, _, _ in entries[:count]])
+    swapped = []
+    for (msg_id, headers, _), (message, error) in zip(entries, execute_batched(service, requests)):
+        if error is not None:
+            raise error
+        swapped.append((msg_id, headers, partial(_text_from_raw, (message or {}).get("raw", ""))))
+    return swapped + entries[count:]
+
+
+def _thread_entries_imap(thread_id: str) -> list[tuple[str | None, dict, Callable[[], str]]]:
+    from mcp_email.get_unread_emails.imap_backend import get_imap_backend
+
+    return [
+        (
+            msg_id,
+            dict(message.items()),
+            partial(_extract_body_from_mime, message),
+        )
+        for msg_id, message in get_imap_backend().fetch_thread(thread_id)
+    ]
 
 
 # NEW: fetch full thread, clean bodies, preserve sender + order
-def _fetch_thread_context(service, thread_id: str) -> List[ThreadMessage]:
-    thread = service.users().threads().get(
-        userId="me",
-        id=thread_id,
-        format="full",
-    ).execute()
-
-    messages = thread.get("messages", [])
+def _fetch_thread_context(
+    service,
+    thread_id: str,
+    thread: dict | None = None,
+    store: MailboxStore | None = None,
+    body_format: str = DRAFT_REPLY_FORMAT,
+) -> List[ThreadMessage]:
+    store = store or get_mailbox_store()
+    # (message ID, headers, body decoder) per message, oldest first
+    if MAIL_BACKEND == "imap":
+        entries = _thread_entries_imap(thread_id)
+    else:
+        if thread is None:
+            thread = store.get_thread(service, thread_id, format=_THREAD_FORMATS[body_format])
+        entries = _thread_entries_gmail(thread)
+        # a reply sent soon after needs no second read of the thread
+        if thread.get("messages"):
+            store.reply_targets.put(thread_id, reply_target(thread))
+
     result: List[ThreadMessage] = []
 
-    for idx, msg in enumerate(messages):
-        payload = msg.get("payload", {})
-        headers = _headers_to_dict(payload.get("headers", []))
+    # cleaned bodies are cached per message ID; Gmail messages never change
+    cached_bodies = store.get_bodies([msg_id for msg_id, _, _ in entries if msg_id])
+    new_bodies: dict[str, str] = {}
+
+    # quote stripping compares each message with the ones before it, so every
+    # message up to the last uncached one is decoded (cheap) and fed to the
+    # stripper; only uncached ones are cleaned
+    last_uncached = max(
+        (i for i, (msg_id, _, _) in enumerate(entries) if msg_id not in cached_bodies),
+        default=-1,
+    )
+    if body_format == "raw" and MAIL_BACKEND != "imap" and last_uncached >= 0:
+        entries = _with_raw_loaders(service, entries, last_uncached + 1)
+    stripper = QuoteStripper()
+    decoders = [load_text for _, _, load_text in entries[:last_uncached + 1]]
+    uncached = [i for i, (msg_id, _, _) in enumerate(entries) if msg_id not in cached_bodies]
+
+    # decoding and cleaning are done message by message, so large threads
+    # spread them over worker processes; quote stripping depends on the
+    # messages before and stays in order here
+    if use_body_pool(len(decoders)):
+        with span("parse.pool.decode_bodies"):
+            texts = call_in_body_pool(decoders)
+    else:
+        texts = []
+        for load_text in decoders:
+            with span("parse.decode_body"):
+                texts.append(load_text())
+
+    stripped: list[str] = []
+    for text in texts:
+        with span("parse.strip_quotes"):
+            stripped.append(stripper.strip(text))
+
+    if use_body_pool(len(uncached)):
+        with span("parse.pool.clean_bodies"):
+            cleaned = map_in_body_pool(
+                _clean_body_for_llm,
+                [stripped[i] for i in uncached],
+                [entries[i][0] for i in uncached],
+            )
+    else:
+        cleaned = []
+        for i in uncached:
+            with span("parse.clean_body"):
+                cleaned.append(_clean_body_for_llm(stripped[i], entries[i][0]))
+    cleaned_bodies = dict(zip(uncached, cleaned))
 
+    for idx, (msg_id, headers, _) in enumerate(entries):
         from_ = headers.get("From", "unknown")
         to_ = headers.get("To", "")
 
         # crude but sufficient initial heuristic
         is_me = "me" in (from_ + to_).lower()
 
-        parts = payload.get("parts", [])
-        text_plain = None
-        text_html = None
-
-        for part in parts:
-            mime_type = part.get("mimeType")
-            body_data = part.get("body", {}).get("data")
-            if not body_data:
-                continue
-
-            try:
-                decoded = base64.urlsafe_b64decode(body_data).decode(
-                    "utf-8", errors="replace"
-                )
-            except Exception:
-                continue
-
-            if mime_type == "text/plain" and text_plain is None:
-                text_plain = decoded
-            elif mime_type == "text/html" and text_html is None:
-                text_html = decoded
-
-        messy_text = text_plain or text_html or ""
-        clean_text = _clean_body_for_llm(messy_text)
+        if msg_id in cached_bodies:
+            clean_text = cached_bodies[msg_id]
+        else:
+            clean_text = cleaned_bodies[idx]
+            if msg_id:
+                new_bodies[msg_id] = clean_text
 
         if not clean_text:
             continue
@@ -166,39 +343,175 @@ def _fetch_thread_context(service, thread_id: str) -> List[ThreadMessage]:
                 "from_": from_,
                 "role": "me" if is_me else "external",
                 "body": clean_text,
-                "is_latest": idx == len(messages) - 1,
+                "is_latest": idx == len(entries) - 1,
             }
         )
 
+    if new_bodies:
+        store.put_bodies(new_bodies)
+
     return result
 
 
+def _apply_char_budget(
+    messages: List[ThreadMessage],
+    max_chars: int,
+) -> tuple[List[ThreadMessage], List[int]]:
+    """
+    Fits the message bodies into `max_chars`.
+
+    The latest external message (or the latest message, if none is
+    external) is always kept in full. The budget left over goes to the other
+    messages newest first; the first one that does not fit is truncated
+    from its start, and everything older is omitted.
+    Returns the kept messages in thread order and the omitted indexes.
+    """
+    if not messages:
+        return messages, []
+
+    external = [i for i, m in enumerate(messages) if m["role"] == "external"]
+    anchor = external[-1] if external else len(messages) - 1
+
+    remaining = max_chars - len(messages[anchor]["body"])
+    kept: dict[int, ThreadMessage] = {anchor: messages[anchor]}
+    omitted: List[int] = []
+
+    for i in reversed(range(len(messages))):
+        if i == anchor:
+            continue
+
+        msg = messages[i]
+        body = msg["body"]
+
+        if len(body) <= remaining:
+            kept[i] = msg
+            remaining -= len(body)
+        elif remaining >= _MIN_TRUNCATED_CHARS:
+            cut = len(body) - remaining
+            kept[i] = {
+                **msg,
+                "body": f"[... {cut} earlier chars omitted] " + body[cut:],
+            }
+            remaining = 0
+        else:
+            remaining = 0
+            omitted.append(msg["index"])
+
+    return [kept[i] for i in sorted(kept)], sorted(omitted)
+
+
+def _thread_contexts(thread_ids: list[str], max_chars: int) -> List[ThreadContext]:
+    """
+    Builds the context of each thread, in order. With the Gmail API the
+    threads of each account are fetched together as batch requests; with
+    IMAP each worker fetches its own. A thread that fails only sets its own
+    `error`.
+    """
+    if MAIL_BACKEND != "imap":
+        threads = get_threads(thread_ids, format=_THREAD_FORMATS[DRAFT_REPLY_FORMAT])
+    else:
+        threads = [(None, None)] * len(thread_ids)
+
+    def build(index: int) -> ThreadContext:
+        thread_id = thread_ids[index]
+        thread, error = threads[index]
+        try:
+            if error is not None:
+                raise error
+            account, gmail_thread_id = route_thread_id(thread_id)
+            service = account.service() if MAIL_BACKEND != "imap" else None
+            messages, omitted = _apply_char_budget(
+                _fetch_thread_context(service, gmail_thread_id, thread, store=account.store()),
+                max_chars,
+            )
+        except Exception as e:
+            return {"threadId": thread_id, "error": f"{type(e).__name__}: {e}"}
+        return {"threadId": thread_id, "messages": messages, "omittedMessages": omitted}
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(DRAFT_REPLY_WORKERS, len(thread_ids))),
+        thread_name_prefix="draft-context",
+    ) as pool:
+        return list(pool.map(build, range(len(thread_ids))))
+
+
+_INSTRUCTIONS = (
+    "You are drafting an email reply.\n"
+    "Use ONLY the thread messages provided below.\n"
+    "Reply as the user (role == 'me').\n"
+    "Respond ONLY to the latest external message.\n"
+    "Do NOT quote or restate previous emails.\n"
+    "Write a clear, concise, professional reply.\n"
+)
+
+_OMITTED_INSTRUCTIONS = (
+    "Older messages were shortened or left out to fit the size budget "
+    "(see omittedMessages).\n"
+)
+
+
+def _create_draft_replies(thread_ids: list[str], max_chars: int) -> list[types.TextContent]:
+    if not thread_ids or len(thread_ids) > MAX_THREADS_PER_CALL:
+        raise ValueError(f"threadIds must hold 1 to {MAX_THREADS_PER_CALL} thread IDs")
+
+    threads = _thread_contexts(thread_ids, max_chars)
+
+    instructions = _INSTRUCTIONS + (
+        "Draft a separate reply for each entry in threads, using only that "
+        "entry's messages. Entries with an error could not be loaded; say so "
+        "instead of drafting them.\n"
+    )
+    if any(t.get("omittedMessages") for t in threads):
+        instructions += _OMITTED_INSTRUCTIONS
+
+    payload: MultiDraftReplyContext = {
+        "instructions": instructions,
+        "threads": threads,
+    }
+
+    return [
+        types.TextContent(
+            type="text",
+            text=json.dumps(payload, separators=(",", ":")),
+        )
+    ]
+
+
 # TOOL HANDLER
 def _create_draft_reply(arguments: dict) -> list[types.TextContent]:
-    thread_id = arguments["threadId"]
-    service = get_gmail_service()
+    max_chars = int(arguments.get("maxChars", DRAFT_CONTEXT_MAX_CHARS))
+    if "threadIds" in arguments:
+        if "threadId" in arguments:
+            raise ValueError("Pass either threadId or threadIds, not both")
+        return _create_draft_replies(list(arguments["threadIds"]), max_chars)
+    if "threadId" not in arguments:
+        raise ValueError("Pass either threadId or threadIds")
 
-    messages = _fetch_thread_context(service, thread_id)
+    thread_id = arguments["threadId"]
+    account, gmail_thread_id = route_thread_id(thread_id)
+    service = account.service() if MAIL_BACKEND != "imap" else None
 
-    instructions = (
-        "You are drafting an email reply.\n"
-        "Use ONLY the thread messages provided below.\n"
-        "Reply as the user (role == 'me').\n"
-        "Respond ONLY to the latest external message.\n"
-        "Do NOT quote or restate previous emails.\n"
-        "Write a clear, concise, professional reply.\n"
+    messages, omitted = _apply_char_budget(
+        _fetch_thread_context(service, gmail_thread_id, store=account.store()),
+        max_chars,
     )
 
-    payload = {
+    instructions = _INSTRUCTIONS
+
+    if omitted:
+        instructions += _OMITTED_INSTRUCTIONS
+
+    payload: DraftReplyContext = {
         "instructions": instructions,
         "threadId": thread_id,
         "messages": messages,
+        "omittedMessages": omitted,
     }
 
     return [
         types.TextContent(
             type="text",
-            text=json.dumps(payload, indent=2),
+            text=json.dumps(payload, separators=(",", ":")),
         )
     ]
 
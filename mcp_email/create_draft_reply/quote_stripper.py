@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import re
+
+# lines per shingle: runs of this many lines already seen earlier in the
+# thread are treated as quoted history
+SHINGLE_LINES = 3
+# ...when they hold at least this many characters; shorter repeats (a
+# sign-off, a "Thanks!" or a recurring status line) are kept
+QUOTE_MIN_CHARS = 200
+
+_HASH_BASE = 1_000_003
+_HASH_MOD = (1 << 61) - 1
+
+# everything from one of these lines on is quoted history
+_QUOTE_HEADER_RES = [
+    # Gmail / Apple Mail: "On Mon, 1 Jan 2024 at 10:00, Name <a@b.c> wrote:"
+    re.compile(r"^\s*On\b.{0,300}\bwrote:\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*Forwarded message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^\s*_{10,}\s*$"),
+]
+# Gmail wraps long "On ... wrote:" lines; the second half ends the header
+_WROTE_TAIL_RE = re.compile(r"^.{0,200}\bwrote:\s*$", re.IGNORECASE)
+_WROTE_HEAD_RE = re.compile(r"^\s*On\b", re.IGNORECASE)
+# Outlook: "From: ..." directly followed by "Sent: ..." / "Date: ..."
+_OUTLOOK_FROM_RE = re.compile(r"^\s*\*?From:\*?\s", re.IGNORECASE)
+_OUTLOOK_SENT_RE = re.compile(r"^\s*\*?(Sent|Date):\*?\s", re.IGNORECASE)
+
+# everything from one of these lines on is a signature
+_SIGNATURE_RES = [
+    re.compile(r"^-- ?$"),  # RFC 3676 signature separator
+    re.compile(r"^\s*Sent from my \w+", re.IGNORECASE),
+    re.compile(r"^\s*Get Outlook for \w+", re.IGNORECASE),
+]
+
+_NORMALIZE_RE = re.compile(r"[\s>]+")
+
+
+def _find_quote_header(lines: list[str]) -> int | None:
+    for i, line in enumerate(lines):
+        if any(r.match(line) for r in _QUOTE_HEADER_RES):
+            return i
+        if (
+            i + 1 < len(lines)
+            and _WROTE_HEAD_RE.match(line)
+            and _WROTE_TAIL_RE.match(lines[i + 1])
+        ):
+            return i
+        if (
+            i + 1 < len(lines)
+            and _OUTLOOK_FROM_RE.match(line)
+            and _OUTLOOK_SENT_RE.match(lines[i + 1])
+        ):
+            return i
+    return None
+
+
+def _find_signature(lines: list[str]) -> int | None:
+    for i, line in enumerate(lines):
+        if any(r.match(line) for r in _SIGNATURE_RES):
+            return i
+    return None
+
+
+def _normalize_line(line: str) -> str:
+    # ignore quote markers, indentation and re-spacing between copies
+    return _NORMALIZE_RE.sub(" ", line).strip().lower()
+
+
+def _shingle_hashes(line_hashes: list[int]) -> list[int]:
+    # polynomial rolling hash over each window of SHINGLE_LINES line hashes
+    k = SHINGLE_LINES
+    if len(line_hashes) < k:
+        return []
+
+    top = pow(_HASH_BASE, k - 1, _HASH_MOD)
+    h = 0
+    for value in line_hashes[:k]:
+        h = (h * _HASH_BASE + value) % _HASH_MOD
+
+    hashes = [h]
+    for i in range(k, len(line_hashes)):
+        h = (h - line_hashes[i - k] * top) % _HASH_MOD
+        h = (h * _HASH_BASE + line_hashes[i]) % _HASH_MOD
+        hashes.append(h)
+    return hashes
+
+
+class QuoteStripper:
+    """
+    Strips quoted history and signatures from the messages of one thread.
+
+    Feed the messages oldest first. Besides the usual markers ("On ...
+    wrote:", Outlook "From:/Sent:" headers, "> " lines, "-- " signatures),
+    any run of at least SHINGLE_LINES lines and QUOTE_MIN_CHARS characters
+    that already appeared in an earlier message of the thread is dropped,
+    which catches quotes without markers. Text repeated within one message
+    is never compared with itself.
+    """
+
+    def __init__(self) -> None:
+        self._seen: set[int] = set()
+
+    def strip(self, text: str) -> str:
+        lines = text.splitlines()
+
+        # remember the full message, quotes included, for later messages
+        normalized = [(i, _normalize_line(line)) for i, line in enumerate(lines)]
+        normalized = [(i, norm) for i, norm in normalized if norm]
+        line_hashes = [hash(norm) % _HASH_MOD for _, norm in normalized]
+        shingles = _shingle_hashes(line_hashes)
+
+        cut = _find_quote_header(lines)
+        if cut is not None:
+            lines = lines[:cut]
+        cut = _find_signature(lines)
+        if cut is not None:
+            lines = lines[:cut]
+
+        drop = {i for i, line in enumerate(lines) if line.lstrip().startswith(">")}
+        # overlapping seen shingles make one run of repeated lines
+        run: list[int] = []
+        for start, shingle in enumerate(shingles + [None]):
+            if shingle is not None and shingle in self._seen:
+                end = start + SHINGLE_LINES
+                run.extend(range(max(start, run[-1] + 1 if run else start), end))
+                continue
+            if run and sum(len(normalized[k][1]) for k in run) >= QUOTE_MIN_CHARS:
+                drop.update(normalized[k][0] for k in run)
+            run = []
+
+        self._seen.update(shingles)
+
+        return "\n".join(
+            line for i, line in enumerate(lines) if i not in drop
+        ).strip()
+
@@ -1,37 +1,154 @@
 #!/usr/bin/env python3
 import asyncio
+import importlib
+import json
+import logging
 import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
 from mcp.server import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 import mcp.server.stdio
 import mcp.types as types
 
-from mcp_email.get_unread_emails.get_unread_emails import get_unread_emails
-from mcp_email.create_draft_reply.create_draft_reply import _create_draft_reply
-from mcp_email.send_thread_reply.send_thread_reply import send_thread_reply
+from mcp_email.instrumentation import span, stats_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Tool handlers are blocking (Gmail HTTP calls), so they run on a bounded
+# thread pool instead of the event loop.
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "60"))
+
+# max in-flight calls per tool, e.g. TOOL_CONCURRENCY="create_draft_reply=4,send_thread_reply=2"
+_DEFAULT_TOOL_CONCURRENCY = {
+    "get_unread_emails": 1,
+    "create_draft_reply": 4,
+    "send_thread_reply": 2,
+}
+
+
+def _parse_tool_concurrency(spec: str) -> dict[str, int]:
+    limits = dict(_DEFAULT_TOOL_CONCURRENCY)
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, limit = item.partition("=")
+        limits[name.strip()] = max(1, int(limit))
+    return limits
+
+
+TOOL_CONCURRENCY = _parse_tool_concurrency(os.getenv("TOOL_CONCURRENCY", ""))
+
+# after the handshake, import the tool modules and build the Gmail client in
+# the background so the first tool call does not pay for them
+EMAIL_PREWARM = os.getenv("EMAIL_PREWARM", "1") != "0"
+
+# tool modules pull in googleapiclient, the OAuth flow and cleantext, so they
+# are imported on first use; `initialize` is answered without them
+_TOOL_HANDLERS = {
+    "get_unread_emails": ("mcp_email.get_unread_emails.get_unread_emails", "get_unread_emails"),
+    "create_draft_reply": ("mcp_email.create_draft_reply.create_draft_reply", "_create_draft_reply"),
+    "send_thread_reply": ("mcp_email.send_thread_reply.send_thread_reply", "send_thread_reply"),
+}
+
+
+def _tool_handler(name: str):
+    module, attr = _TOOL_HANDLERS[name]
+    return getattr(importlib.import_module(module), attr)
+
+_executor = ThreadPoolExecutor(
+    max_workers=TOOL_WORKERS,
+    thread_name_prefix="email-tool",
+)
+_tool_semaphores = {
+    name: asyncio.Semaphore(limit) for name, limit in TOOL_CONCURRENCY.items()
+}
+
+# "stdio" (one client per process) or "http" (streamable HTTP: many clients
+# share one process, its Gmail client and its caches)
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+MCP_HTTP_HOST = os.getenv("MCP_HTTP_HOST", "127.0.0.1")
+MCP_HTTP_PORT = int(os.getenv("MCP_HTTP_PORT", "8765"))
+MCP_HTTP_MAX_SESSIONS = int(os.getenv("MCP_HTTP_MAX_SESSIONS", "100"))
+MCP_HTTP_SESSION_IDLE_SECONDS = float(os.getenv("MCP_HTTP_SESSION_IDLE_SECONDS", "1800"))
+# in-flight tool calls per session, so one client cannot take every worker
+SESSION_MAX_CONCURRENT_CALLS = int(os.getenv("SESSION_MAX_CONCURRENT_CALLS", "4"))
+
+_session_slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
 server = Server("email-server")
 
+
+def _initialization_options():
+    options = Server.create_initialization_options(server)
+    # the low-level server never advertises subscribe support on its own
+    options.capabilities.resources.subscribe = True
+    return options
+
+
+# the HTTP session manager builds each session's options itself
+server.create_initialization_options = _initialization_options
+
+UNREAD_RESOURCE_URI = "email://unread"
+STATS_RESOURCE_URI = "email://stats"
+
+# sessions subscribed to UNREAD_RESOURCE_URI; weak, so sessions that expire
+# without unsubscribing are not kept alive
+_unread_subscribers: weakref.WeakSet = weakref.WeakSet()
+
 @server.list_tools()
 async def list_tools() -> list[types.Tool]:
     return [
         types.Tool(
             name="get_unread_emails",
             description=(
-                "Fetch unread Gmail messages from the last 24 hours. "
-                "Returns a text block containing one line per email, formatted as "
+                "Fetch unread Gmail messages from the primary inbox, newest first. "
+                "Returns a text block containing one line per email thread, formatted as "
                 "`key=value` pairs separated by ` | `. "
                 "Each email includes: "
-                "`id` (message ID), "
                 "`thread_id` (conversation thread ID shared by related messages), "
                 "`from_` (sender), and "
                 "`subject`. "
+                "If more threads are available, the response ends with a "
+                "`next_cursor=...` line; pass that value as `cursor` to get the next page. "
                 "If no unread emails are found, returns a human-readable message. "
-                "If some messages fail to load, the response includes a summary count of skipped emails."
+                "If some messages fail to load, the response includes a summary count of skipped emails. "
+                "When the server has several Gmail accounts, all of them (or those in "
+                "`accounts`) are listed together, newest first, thread IDs take the "
+                "form `account:threadId`, and an account that cannot be listed is "
+                "reported on its own line."
             ),
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {
+                    "limit": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "maximum": 50,
+                        "description": "Maximum number of threads to return (default 5)",
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "Opaque `next_cursor` value from a previous call",
+                    },
+                    "since": {
+                        "type": "string",
+                        "format": "date",
+                        "description": (
+                            "Only include emails received on or after this date "
+                            "(YYYY-MM-DD, default 5 days ago). Ignored when `cursor` is set."
+                        ),
+                    },
+                    "accounts": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "minItems": 1,
+                        "description": (
+                            "Names of the accounts to list (default all). "
+                            "Ignored when `cursor` is set."
+                        ),
+                    },
+                },
                 "required": [],
             },
         ),
@@ -41,17 +158,38 @@ async def list_tools() -> list[types.Tool]:
                 "Fetches a full Gmail thread and returns cleaned, structured "
                 "context for drafting a reply. The response includes explicit "
                 "instructions describing how the client should generate the "
-                "reply text using the provided thread messages."
+                "reply text using the provided thread messages. "
+                "Pass `threadIds` instead of `threadId` to get the context of "
+                "several threads in one call; the response then holds a "
+                "`threads` array with one entry per ID, in order, and an entry "
+                "that could not be loaded has an `error` instead of `messages`."
             ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "threadId": {
                         "type": "string",
-                        "description": "Gmail thread ID to reply to",
+                        "description": "Thread ID to reply to, as returned by get_unread_emails",
+                    },
+                    "threadIds": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "minItems": 1,
+                        "maxItems": 50,
+                        "description": "Several thread IDs to reply to, possibly from different accounts",
+                    },
+                    "maxChars": {
+                        "type": "integer",
+                        "minimum": 500,
+                        "description": (
+                            "Character budget for the returned message bodies "
+                            "(default 20000). The latest external message is always "
+                            "kept in full; older messages are shortened or omitted first. "
+                            "Applies to each thread separately."
+                        ),
                     },
                 },
-                "required": ["threadId"],
+                "required": [],
             },
         ),
         types.Tool(
@@ -63,41 +201,238 @@ async def list_tools() -> list[types.Tool]:
                 "If the thread contains an external sender, the reply "
                 "is addressed to them. "
                 "If the thread is self-only (e.g. test or notes), "
-                "the reply is sent to the user's own address."
+                "the reply is sent to the user's own address. "
+                "With an `idempotencyKey`, a reply is sent at most once per key, "
+                "so a call retried after a timeout does not send it twice. "
+                "Pass `replies` instead of `threadId`/`replyText` to send many "
+                "replies in one call; the response is JSON with `counts` and one "
+                "`results` entry per reply, in order, with `status` sent, failed, "
+                "pending (still sending; call again with the same keys to check) "
+                "or rejected (key reused for a different reply), and "
+                "`duplicate: true` for keys sent by an earlier call."
             ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "threadId": {
                         "type": "string",
-                        "description": "Gmail thread ID being replied to",
+                        "description": "Thread ID being replied to, as returned by get_unread_emails",
                     },
                     "replyText": {
                         "type": "string",
                         "description": "Final reply body text to send",
                     },
+                    "idempotencyKey": {
+                        "type": "string",
+                        "description": "Client-chosen unique key for this reply",
+                    },
+                    "replies": {
+                        "type": "array",
+                        "minItems": 1,
+                        "maxItems": 100,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "threadId": {"type": "string"},
+                                "replyText": {"type": "string"},
+                                "idempotencyKey": {"type": "string"},
+                            },
+                            "required": ["threadId", "replyText", "idempotencyKey"],
+                        },
+                        "description": "Several replies to send, each with its own idempotency key",
+                    },
                 },
-                "required": ["threadId", "replyText"],
+                "required": [],
             },
         ),
+        types.Tool(
+            name="server_stats",
+            description=(
+                "Returns this server's performance counters as JSON: latency "
+                "histograms (count, mean, p50/p90/p99, max in ms, errors) per "
+                "tool, per Gmail API method and per parsing stage, plus value "
+                "histograms such as Gmail response bytes per method."
+            ),
+            inputSchema={"type": "object", "properties": {}, "required": []},
+        ),
     ]
 
 
+def _call_handler(name: str, *args):
+    # runs on the worker thread, so a first-use import does not block the loop
+    with span(f"tool.{name}"):
+        return _tool_handler(name)(*args)
+
+
+def _session_slots_for_request() -> asyncio.Semaphore:
+    session = server.request_context.session
+    slots = _session_slots.get(session)
+    if slots is None:
+        slots = _session_slots[session] = asyncio.Semaphore(SESSION_MAX_CONCURRENT_CALLS)
+    return slots
+
+
+def _release(*slots: asyncio.Semaphore) -> None:
+    for slot in slots:
+        slot.release()
+
+
+async def _run_tool(name: str, *args) -> list[types.TextContent]:
+    slots = (_session_slots_for_request(), _tool_semaphores[name])
+    acquired: list[asyncio.Semaphore] = []
+    try:
+        for slot in slots:
+            await slot.acquire()
+            acquired.append(slot)
+        future = asyncio.get_running_loop().run_in_executor(
+            _executor, _call_handler, name, *args
+        )
+    except BaseException:
+        _release(*acquired)
+        raise
+    # the slots are held until the worker thread finishes, not until we
+    # stop waiting for it, so the limits hold even for calls that time out
+    future.add_done_callback(lambda _: _release(*slots))
+
+    try:
+        # shielded: a timeout must not cancel the future (and release the
+        # slots) while the thread is still running
+        return await asyncio.wait_for(asyncio.shield(future), TOOL_TIMEOUT_SECONDS)
+    except TimeoutError:
+        # the worker thread cannot be interrupted; it finishes in the
+        # background and its result is dropped
+        raise TimeoutError(
+            f"{name} did not finish within {TOOL_TIMEOUT_SECONDS:g} seconds"
+        ) from None
+
+
+@server.list_resources()
+async def list_resources() -> list[types.Resource]:
+    return [
+        types.Resource(
+            uri=UNREAD_RESOURCE_URI,
+            name="unread",
+            description=(
+                "Unread threads in the primary inbox, in the same format as "
+                "`get_unread_emails` with default arguments. Subscribe to get "
+                "`resources/updated` notifications when the unread set changes."
+            ),
+            mimeType="text/plain",
+        ),
+        types.Resource(
+            uri=STATS_RESOURCE_URI,
+            name="stats",
+            description="Same JSON as the `server_stats` tool.",
+            mimeType="application/json",
+        ),
+    ]
+
+
+def _check_resource_uri(uri) -> None:
+    if str(uri) != UNREAD_RESOURCE_URI:
+        raise ValueError(f"Unknown resource: {uri}")
+
+
+@server.read_resource()
+async def read_resource(uri) -> list[ReadResourceContents]:
+    if str(uri) == STATS_RESOURCE_URI:
+        return [ReadResourceContents(content=_stats_json(), mime_type="application/json")]
+    _check_resource_uri(uri)
+    contents = await _run_tool("get_unread_emails", {})
+    return [ReadResourceContents(content=contents[0].text, mime_type="text/plain")]
+
+
+@server.subscribe_resource()
+async def subscribe_resource(uri) -> None:
+    _check_resource_uri(uri)
+    _unread_subscribers.add(server.request_context.session)
+
+
+@server.unsubscribe_resource()
+async def unsubscribe_resource(uri) -> None:
+    _check_resource_uri(uri)
+    _unread_subscribers.discard(server.request_context.session)
+
+
+async def _notify_unread_changed() -> None:
+    for session in list(_unread_subscribers):
+        try:
+            await session.send_resource_updated(UNREAD_RESOURCE_URI)
+        except Exception:
+            # the session is gone; stop notifying it
+            logger.exception("resources/updated notification failed")
+            _unread_subscribers.discard(session)
+
+
+def _stats_json() -> str:
+    return json.dumps(stats_snapshot(), indent=1)
+
+
 @server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
-    if name == "get_unread_emails":
-        return get_unread_emails()
+    if name in _TOOL_HANDLERS:
+        return await _run_tool(name, arguments)
 
-    if name == "create_draft_reply":
-        return _create_draft_reply(arguments)
-
-    if name == "send_thread_reply":
-        return send_thread_reply(arguments)
+    if name == "server_stats":
+        # in-memory only, so it runs on the event loop
+        return [types.TextContent(type="text", text=_stats_json())]
 
     raise ValueError(f"Unknown tool: {name}")
 
 
-async def main():
+_watcher = None
+_handshake_done = False
+
+
+def _after_handshake(loop: asyncio.AbstractEventLoop) -> None:
+    global _watcher
+    # push new-mail notifications instead of making clients poll
+    from mcp_email.get_unread_emails.idle_watcher import IMAP_IDLE_ENABLED, UnreadWatcher
+
+    if IMAP_IDLE_ENABLED:
+        _watcher = UnreadWatcher(
+            lambda: asyncio.run_coroutine_threadsafe(_notify_unread_changed(), loop)
+        )
+        _watcher.start()
+
+    if EMAIL_PREWARM:
+        for name in _TOOL_HANDLERS:
+            _tool_handler(name)
+        from mcp_email.utils import warm_up_gmail_service
+
+        try:
+            warm_up_gmail_service()
+        except Exception:
+            # not fatal: the first tool call retries and reports the error
+            logger.exception("Gmail service warm-up failed")
+
+        from mcp_email.create_draft_reply.body_pool import warm_up_body_pool
+
+        try:
+            warm_up_body_pool()
+        except Exception:
+            # not fatal: the first large thread starts the workers instead
+            logger.exception("body pool warm-up failed")
+
+
+def _log_start_up_failure(future) -> None:
+    if future.exception() is not None:
+        logger.error("post-handshake start-up failed", exc_info=future.exception())
+
+
+async def _on_initialized(notification: types.InitializedNotification) -> None:
+    global _handshake_done
+    if _handshake_done:
+        return
+    _handshake_done = True
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(_executor, _after_handshake, loop).add_done_callback(_log_start_up_failure)
+
+
+server.notification_handlers[types.InitializedNotification] = _on_initialized
+
+
+async def _serve_stdio() -> None:
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
@@ -106,5 +441,50 @@ async def main():
         )
 
 
+async def _serve_http(host: str, port: int) -> None:
+    import contextlib
+
+    import uvicorn
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+
+    sessions = StreamableHTTPSessionManager(
+        app=server,
+        max_sessions=MCP_HTTP_MAX_SESSIONS,
+        session_idle_timeout=MCP_HTTP_SESSION_IDLE_SECONDS,
+    )
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with sessions.run():
+            yield
+
+    app = Starlette(
+        routes=[Mount("/mcp", app=sessions.handle_request)],
+        lifespan=lifespan,
+    )
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+    await uvicorn.Server(config).serve()
+
+
+async def main(transport: str = MCP_TRANSPORT, host: str = MCP_HTTP_HOST, port: int = MCP_HTTP_PORT):
+    try:
+        if transport == "http":
+            await _serve_http(host, port)
+        else:
+            await _serve_stdio()
+    finally:
+        if _watcher is not None:
+            _watcher.stop()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=("stdio", "http"), default=MCP_TRANSPORT)
+    parser.add_argument("--host", default=MCP_HTTP_HOST)
+    parser.add_argument("--port", type=int, default=MCP_HTTP_PORT)
+    args = parser.parse_args()
+    asyncio.run(main(args.transport, args.host, args.port))
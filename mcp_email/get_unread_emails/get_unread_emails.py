@@ -1,13 +1,38 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
-from typing import TypedDict, List
+import base64
+import json
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from itertools import islice
+from typing import Iterable, Iterator, NamedTuple, TypedDict
 
 
 import mcp.types as types
 
-from mcp_email.utils import get_gmail_service
+from mcp_email.accounts import (
+    DEFAULT_ACCOUNT,
+    Account,
+    for_each_account,
+    get_account,
+    is_multi_account,
+    qualify_thread_id,
+    select_accounts,
+)
+from mcp_email.get_unread_emails.unread_index import get_unread_index, unread_query
+from mcp_email.gmail_requests import list_messages_request
+from mcp_email.gmail_scheduler import execute
+from mcp_email.mailbox_store import MailboxStore, get_mailbox_store
+from mcp_email.utils import GMAIL_BATCH_SIZE, MAIL_BACKEND
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+LIST_PAGE_SIZE = 100
+# messages().list walks whose seen threads are kept for their cursors
+MAX_LIST_WALKS = 64
 
 
 class EmailSummary(TypedDict):
@@ -44,63 +69,432 @@ def _parse_email_summary(msg: dict) -> EmailSummary:
         "subject": headers.get("subject", "(missing subject)"),
     }
 
-# MCP Tool
-def get_unread_emails() -> list[types.TextContent]:
-    service = get_gmail_service()
+def _parse_since(value: str | None, default: datetime) -> datetime:
+    if not value:
+        return default
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid since date (expected YYYY-MM-DD): {value}") from None
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+# where a Gmail listing continues: (internalDate in ms, threadId) of the last
+# message returned. Pages follow this order, newest first, so threads whose
+# newest messages share an internalDate are split between pages correctly.
+_Position = tuple[int, str]
+
+
+def _position(msg: dict) -> _Position:
+    return int(msg.get("internalDate", 0)), msg.get("threadId") or ""
+
+
+class _Resume(NamedTuple):
+    """
+    Where a messages().list walk continues: `offset` refs into the page at
+    `page_token` (None: the first page). `walk` keys the IDs of the threads
+    walked before that point, which stay on the server (see _walks).
+    """
+
+    page_token: str | None
+    offset: int
+    walk: str
+
+
+# walk key -> thread IDs walked before a cursor's resume point. A thread's
+# older unread messages are listed after its newest one, so resuming mid-way
+# has to skip these threads; a cursor whose key is gone (evicted, or the
+# server restarted) walks again from the first page instead. Every cursor
+# gets its own key, so a cursor used twice gives the same page twice.
+_walks: OrderedDict[str, frozenset[str]] = OrderedDict()
+_walks_lock = threading.Lock()
+
+
+def _save_walk(seen: frozenset[str]) -> str:
+    key = secrets.token_urlsafe(8)
+    with _walks_lock:
+        _walks[key] = seen
+        while len(_walks) > MAX_LIST_WALKS:
+            _walks.popitem(last=False)
+    return key
+
+
+def _load_walk(key: str) -> frozenset[str] | None:
+    with _walks_lock:
+        return _walks.get(key)
+
+
+# cursors are opaque to the client: the position of the last message returned
+# (its UID on the IMAP backend), plus the `since` bound of the listing being
+# walked. With several accounts, "before" maps each account still to be
+# walked to its own position (null: from its newest message). Accounts
+# listed from messages().list also get a "resume" point.
+def _encode_cursor(
+    before: int | _Position | dict[str, _Position | None],
+    since: datetime,
+    resume: dict[str, _Resume] | None = None,
+) -> str:
+    data: dict = {"before": before, "since": since.date().isoformat()}
+    if resume:
+        data["resume"] = {name: list(point) for name, point in resume.items()}
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def _decode_position(value) -> int | _Position:
+    if isinstance(value, list):
+        internal_date, thread_id = value
+        return int(internal_date), str(thread_id)
+    # an IMAP UID
+    return int(value)
+
+
+def _decode_gmail_position(value) -> _Position:
+    position = _decode_position(value)
+    if not isinstance(position, tuple):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def _decode_resume(value) -> _Resume:
+    page_token, offset, walk = value
+    return _Resume(None if page_token is None else str(page_token), int(offset), str(walk))
+
+
+def _decode_cursor(
+    cursor: str,
+) -> tuple[int | _Position | dict[str, _Position | None], datetime, dict[str, _Resume]]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        since = _parse_since(data["since"], default=None)
+        resume = {str(name): _decode_resume(value) for name, value in data.get("resume", {}).items()}
+        if isinstance(data["before"], dict):
+            before = {
+                str(name): None if position is None else _decode_gmail_position(position)
+                for name, position in data["before"].items()
+            }
+            return before, since, resume
+        return _decode_position(data["before"]), since, resume
+    except Exception:
+        raise ValueError("Invalid cursor") from None
+
+
+# a ref handed out by a messages().list walk: (threadId, page token, index
+# within that page)
+_Walked = tuple[str | None, str | None, int]
+
+
+def _iter_message_refs(
+    service,
+    query: str,
+    page_token: str | None = None,
+    offset: int = 0,
+    walked: list[_Walked] | None = None,
+) -> Iterator[dict]:
+    # lazily walks messages().list pages, from `offset` refs into the page at
+    # `page_token`; the next page is only requested once the consumer has
+    # used up the current one. Each ref handed out is noted in `walked`.
+    while True:
+        response = execute(
+            list_messages_request(
+                service,
+                query,
+                max_results=LIST_PAGE_SIZE,
+                page_token=page_token,
+            )
+        )
+
+        messages = response.get("messages", [])
+        for index in range(offset, len(messages)):
+            if walked is not None:
+                walked.append((messages[index].get("threadId"), page_token, index))
+            yield messages[index]
+
+        page_token = response.get("nextPageToken")
+        offset = 0
+        if not page_token:
+            return
+
+
+def _iter_new_thread_refs(refs: Iterable[dict], seen: Iterable[str] = ()) -> Iterator[dict]:
+    # list results already carry threadId, so repeats of a thread (and the
+    # threads in `seen`) are dropped before any metadata is fetched for them
+    seen = set(seen)
+    for ref in refs:
+        thread_id = ref.get("threadId")
+        if thread_id in seen:
+            continue
+        seen.add(thread_id)
+        yield ref
+
+
+class _Page(TypedDict):
+    messages: list[dict]
+    skipped: int
+    has_more: bool
+    # messages().list walks only: the refs walked, in order, and the threads
+    # skipped as walked on earlier pages
+    walked: list[_Walked]
+    seen: frozenset[str]
+
 
-    since = (datetime.now(timezone.utc) - timedelta(days=5)).strftime("%Y/%m/%d")
-    query = f"is:unread in:inbox category:primary after:{since}"
+def _collect_page(
+    service,
+    refs: Iterable[dict],
+    since: datetime,
+    before: _Position | None,
+    limit: int,
+    batch_size: int,
+    store: MailboxStore | None = None,
+    seen: frozenset[str] = frozenset(),
+) -> _Page:
+    """
+    Pulls newest-first message refs until `limit` threads are found.
 
-    response = service.users().messages().list(
-        userId="me",
-        q=query,
-        maxResults=5,
-    ).execute()
+    Only each thread's newest ref is considered, and metadata is fetched in
+    chunks no larger than the number of threads still needed, so walking
+    stops (and no further list pages are requested) once the page is full.
+    One thread past the page is read to tell whether there is a next page,
+    plus any further threads sharing the internalDate at the page boundary,
+    which are then ordered by thread ID. A thread whose newest message is
+    at or after `before` was listed on an earlier page and is skipped, as
+    are the threads in `seen`.
+    """
+    store = store or get_mailbox_store()
+    new_thread_refs = _iter_new_thread_refs(refs, seen)
+    since_ms = int(since.timestamp() * 1000)
+    page: _Page = {"messages": [], "skipped": 0, "has_more": False, "walked": [], "seen": seen}
+    found: list[dict] = []
+    last_date: int | None = None
 
-    messages = response.get("messages", [])
+    while len(found) <= limit or last_date == _boundary_date(found, limit):
+        chunk = list(islice(new_thread_refs, min(batch_size, max(1, limit + 1 - len(found)))))
+        if not chunk:
+            break
 
-    if not messages:
+        results = store.get_messages_metadata(
+            service,
+            [ref["id"] for ref in chunk],
+            batch_size,
+        )
+        in_range = True
+        for msg, error in results:
+            if error is not None or msg is None:
+                page["skipped"] += 1
+                continue
+
+            internal_date = int(msg.get("internalDate", 0))
+            if internal_date < since_ms:
+                # refs are newest first, so nothing later is in range
+                in_range = False
+                break
+            last_date = internal_date
+            if before is None or _position(msg) < before:
+                found.append(msg)
+        if not in_range:
+            break
+
+    found.sort(key=_position, reverse=True)
+    page["messages"] = found[:limit]
+    page["has_more"] = len(found) > limit
+    return page
+
+
+def _boundary_date(found: list[dict], limit: int) -> int | None:
+    # internalDate of the last message that makes the page
+    if len(found) < limit:
+        return None
+    return sorted((_position(msg)[0] for msg in found), reverse=True)[limit - 1]
+
+
+def _format_page(
+    summaries: list[EmailSummary],
+    skipped: int,
+    since: datetime,
+    next_cursor: str | None,
+    errors: dict[str, Exception] | None = None,
+) -> list[types.TextContent]:
+    if not summaries and not skipped and not errors:
         return [
             types.TextContent(
                 type="text",
-                text="No unread emails in the last 5 days",
+                text=f"No unread emails since {since.date().isoformat()}",
             )
         ]
 
-    summaries: list[EmailSummary] = []
-    skipped = 0
-    seen_threads: set[str] = set()
-
-    for m in messages:
-        try:
-            msg = service.users().messages().get(
-                userId="me",
-                id=m["id"],
-                format="metadata",
-            ).execute()
-
-            thread_id = msg.get("threadId")
-            if not thread_id or thread_id in seen_threads:
-                continue
+    formatted = _format_email_summary_results(summaries)
 
-            seen_threads.add(thread_id)
-            summaries.append(_parse_email_summary(msg))
+    if skipped:
+        formatted += f"\n\n({skipped} emails skipped due to errors)"
 
-        except Exception:
-            skipped += 1
+    for name, error in (errors or {}).items():
+        formatted += f"\n\n(account {name} could not be listed: {type(error).__name__}: {error})"
 
-    formatted = _format_email_summary_results(summaries)
+    if next_cursor is not None:
+        formatted += f"\n\nnext_cursor={next_cursor}"
 
     return [
         types.TextContent(
             type="text",
-            text=formatted
-            + (f"\n\n({skipped} emails skipped due to errors)" if skipped else ""),
+            text=formatted,
         )
     ]
 
 
-if __name__ == "__main__":
-    get_unread_emails()
+def _get_unread_emails_imap(
+    since: datetime,
+    before_uid: int | None,
+    limit: int,
+) -> list[types.TextContent]:
+    from mcp_email.get_unread_emails.imap_backend import get_imap_backend
+
+    rows, next_before = get_imap_backend().list_unread(since, before_uid, limit)
+    summaries: list[EmailSummary] = [
+        {"thread_id": r["thread_id"], "from_": r["from_"], "subject": r["subject"]}
+        for r in rows
+    ]
+    next_cursor = _encode_cursor(next_before, since) if next_before is not None else None
+    return _format_page(summaries, 0, since, next_cursor)
+
+
+def _account_page(
+    account: Account,
+    since: datetime,
+    before: _Position | None,
+    limit: int,
+    batch_size: int,
+    resume: _Resume | None = None,
+) -> _Page:
+    service = account.service()
+    index = account.unread_index()
+
+    # the history-synced index lists anything inside its window with a single
+    # history call; older ranges are paged straight from messages().list.
+    # Either way the listing starts at the newest unread message: a `before:`
+    # bound would hide a thread's newer messages, and its older ones would
+    # then bring it back after the cursor. Threads already shown are skipped
+    # by their newest message's position instead, and messages().list walks
+    # resume where the previous page left off rather than from page one.
+    if since >= index.window_start:
+        return _collect_page(service, index.refresh(service), since, before, limit, batch_size, store=account.store())
 
+    seen = _load_walk(resume.walk) if resume is not None else None
+    if seen is None:
+        resume, seen = None, frozenset()
+    walked: list[_Walked] = []
+    refs = _iter_message_refs(
+        service,
+        unread_query(since),
+        page_token=resume.page_token if resume else None,
+        offset=resume.offset if resume else 0,
+        walked=walked,
+    )
+    page = _collect_page(service, refs, since, before, limit, batch_size, store=account.store(), seen=seen)
+    page["walked"] = walked
+    return page
 
+
+def _next_resume(page: _Page, shown_thread_ids: set[str | None]) -> _Resume | None:
+    """
+    Where the next page's walk continues: at the first ref walked whose
+    thread was not shown, with every thread walked before it marked seen.
+    None if the page was not a messages().list walk.
+    """
+    seen = set(page["seen"])
+    for thread_id, page_token, index in page["walked"]:
+        if thread_id not in shown_thread_ids and thread_id not in seen:
+            return _Resume(page_token, index, _save_walk(frozenset(seen)))
+        seen.add(thread_id)
+    return None
+
+
+# MCP Tool
+def get_unread_emails(
+    arguments: dict | None = None,
+    batch_size: int = GMAIL_BATCH_SIZE,
+) -> list[types.TextContent]:
+    arguments = arguments or {}
+    limit = max(1, min(int(arguments.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+
+    resumes: dict[str, _Resume] = {}
+    if arguments.get("cursor"):
+        before, since, resumes = _decode_cursor(arguments["cursor"])
+    else:
+        before = None
+        since = _parse_since(arguments.get("since"), default=get_unread_index().window_start)
+
+    if MAIL_BACKEND == "imap":
+        if isinstance(before, (dict, tuple)):
+            raise ValueError("Invalid cursor")
+        return _get_unread_emails_imap(since, before, limit)
+
+    # account name -> where its listing continues
+    if isinstance(before, int):
+        # an IMAP UID
+        raise ValueError("Invalid cursor")
+    if isinstance(before, dict):
+        positions = before
+    else:
+        positions = {account.name: before for account in select_accounts(arguments.get("accounts"))}
+
+    # every account lists up to `limit` threads of its own, concurrently;
+    # the newest `limit` of all of them make the page
+    pages = for_each_account(
+        [get_account(name) for name in positions],
+        lambda account: _account_page(
+            account, since, positions[account.name], limit, batch_size, resumes.get(account.name)
+        ),
+    )
+    errors = {name: error for name, (_, error) in pages.items() if error is not None}
+    if errors and not is_multi_account():
+        raise errors[DEFAULT_ACCOUNT]
+
+    listed = sorted(
+        (
+            (name, msg)
+            for name, (page, _) in pages.items()
+            if page is not None
+            for msg in page["messages"]
+        ),
+        key=lambda item: _position(item[1]),
+        reverse=True,
+    )[:limit]
+
+    # an account continues after its last listed message, or where it was if
+    # none of its messages made the page; failed accounts are left out
+    next_positions: dict[str, _Position | None] = {}
+    next_resumes: dict[str, _Resume] = {}
+    for name, (page, _) in pages.items():
+        if page is None:
+            continue
+        shown = [msg for listed_name, msg in listed if listed_name == name]
+        if page["has_more"] or len(shown) < len(page["messages"]):
+            next_positions[name] = _position(shown[-1]) if shown else positions[name]
+            resume = _next_resume(page, {msg.get("threadId") for msg in shown}) if shown else resumes.get(name)
+            if resume is not None:
+                next_resumes[name] = resume
+
+    next_cursor = None
+    if next_positions:
+        next_cursor = _encode_cursor(
+            next_positions if is_multi_account() else next_positions[DEFAULT_ACCOUNT],
+            since,
+            next_resumes,
+        )
+
+    summaries: list[EmailSummary] = []
+    for name, msg in listed:
+        summary = _parse_email_summary(msg)
+        summary["thread_id"] = qualify_thread_id(name, summary["thread_id"])
+        summaries.append(summary)
+
+    return _format_page(
+        summaries,
+        sum(page["skipped"] for page, _ in pages.values() if page is not None),
+        since,
+        next_cursor,
+        errors,
+    )
+
+
+if __name__ == "__main__":
+    get_unread_emails()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import imaplib
+import logging
+import os
+import re
+import threading
+from typing import Callable
+
+from mcp_email.get_unread_emails.imap_backend import (
+    IMAP_GMAIL_EXTENSIONS,
+    IMAP_HOST,
+    IMAP_PASSWORD,
+    IMAP_PORT,
+    IMAP_SSL,
+    IMAP_USER,
+    search_unread,
+)
+from mcp_email.get_unread_emails.unread_index import get_unread_index
+from mcp_email.get_unread_emails.utils import _connect_and_select_gmail_inbox
+
+logger = logging.getLogger(__name__)
+
+# on by default whenever IMAP credentials are configured
+IMAP_IDLE_ENABLED = os.getenv("IMAP_IDLE", "1" if IMAP_USER else "0") != "0"
+# RFC 2177: clients should re-issue IDLE at least every 29 minutes
+IMAP_IDLE_RENEW_SECONDS = float(os.getenv("IMAP_IDLE_RENEW_SECONDS", str(25 * 60)))
+# how often the unread set is searched on a server without IDLE
+IMAP_POLL_SECONDS = float(os.getenv("IMAP_POLL_SECONDS", "60"))
+_MAX_RECONNECT_DELAY = 300
+
+_IDLE_TAG = b"IDLE1"
+# untagged responses that can change the unread set
+_CHANGE_RE = re.compile(rb"^\* (\d+ (EXISTS|EXPUNGE|FETCH)|VANISHED)\b", re.IGNORECASE)
+
+
+class UnreadWatcher:
+    """
+    Background IMAP IDLE watcher for the unread set.
+
+    Keeps one dedicated connection in IDLE. When the server reports new,
+    expunged or re-flagged messages, IDLE is ended, the unread UIDs are
+    searched again, and `on_change` is called only if they differ. On a
+    server without IDLE the unread UIDs are searched every
+    IMAP_POLL_SECONDS instead. `on_change` runs on the watcher thread and
+    must not block.
+    """
+
+    def __init__(
+        self,
+        on_change: Callable[[], None],
+        connect: Callable[[], imaplib.IMAP4] | None = None,
+    ) -> None:
+        self._on_change = on_change
+        self._connect = connect or (
+            lambda: _connect_and_select_gmail_inbox(
+                IMAP_USER,
+                IMAP_PASSWORD,
+                host=IMAP_HOST,
+                port=IMAP_PORT,
+                use_ssl=IMAP_SSL,
+            )
+        )
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # guards sending DONE: the reader thread is blocked in readline, so
+        # the renew timer and stop() end IDLE from other threads
+        self._done_lock = threading.Lock()
+        self._idling: imaplib.IMAP4 | None = None
+        self._unread: set[int] | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="imap-idle", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._end_idle()
+
+    def _end_idle(self) -> None:
+        with self._done_lock:
+            imap, self._idling = self._idling, None
+            if imap is not None:
+                try:
+                    imap.send(b"DONE\r\n")
+                except OSError:
+                    pass
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            imap = None
+            try:
+                imap = self._connect()
+                failures = 0
+                if "IDLE" not in imap.capabilities:
+                    self._poll(imap)
+                    continue
+                # a silent dead peer must not block readline forever
+                imap.sock.settimeout(IMAP_IDLE_RENEW_SECONDS + 60)
+                self._watch(imap)
+            except Exception:
+                failures += 1
+                logger.exception("IMAP IDLE watcher failed")
+                self._stop.wait(min(2 ** failures, _MAX_RECONNECT_DELAY))
+            finally:
+                if imap is not None:
+                    try:
+                        imap.logout()
+                    except Exception:
+                        pass
+
+    def _check(self, imap: imaplib.IMAP4) -> None:
+        unread = set(search_unread(imap, get_unread_index().window_start, IMAP_GMAIL_EXTENSIONS))
+        # the first search after a (re)connect notifies too: changes may
+        # have been missed while disconnected
+        if unread != self._unread:
+            self._unread = unread
+            self._on_change()
+
+    def _poll(self, imap: imaplib.IMAP4) -> None:
+        logger.warning("IMAP server does not support IDLE; polling every %s s", IMAP_POLL_SECONDS)
+        while not self._stop.is_set():
+            self._check(imap)
+            self._stop.wait(IMAP_POLL_SECONDS)
+
+    def _watch(self, imap: imaplib.IMAP4) -> None:
+        while not self._stop.is_set():
+            self._check(imap)
+
+            imap.send(_IDLE_TAG + b" IDLE\r\n")
+            line = imap.readline()
+            if not line.startswith(b"+"):
+                raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+            with self._done_lock:
+                self._idling = imap
+            if self._stop.is_set():
+                self._end_idle()
+            renew = threading.Timer(IMAP_IDLE_RENEW_SECONDS, self._end_idle)
+            renew.daemon = True
+            renew.start()
+
+            try:
+                while True:
+                    line = imap.readline()
+                    if not line:
+                        raise imaplib.IMAP4.abort("connection closed during IDLE")
+                    if line.startswith(_IDLE_TAG + b" "):
+                        if not line[len(_IDLE_TAG) + 1:].upper().startswith(b"OK"):
+                            raise imaplib.IMAP4.error(f"IDLE failed: {line!r}")
+                        break
+                    if line.startswith(b"* BYE"):
+                        raise imaplib.IMAP4.abort(f"server closed IDLE: {line!r}")
+                    if _CHANGE_RE.match(line):
+                        self._end_idle()
+            finally:
+                renew.cancel()
+
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import email
+import imaplib
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from email import policy
+from email.message import Message
+from email.parser import BytesHeaderParser
+from typing import Callable, Iterator
+
+from mcp_email.get_unread_emails.utils import (
+    _connect_and_select_gmail_inbox,
+    _decode_email_subject,
+)
+
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_SSL = os.getenv("IMAP_SSL", "1") != "0"
+IMAP_USER = os.getenv("EMAIL_USER", "")
+IMAP_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
+IMAP_POOL_SIZE = int(os.getenv("IMAP_POOL_SIZE", "4"))
+# Gmail's X-GM-RAW / X-GM-THRID / X-GM-MSGID extensions
+IMAP_GMAIL_EXTENSIONS = os.getenv(
+    "IMAP_GMAIL_EXTENSIONS", "1" if IMAP_HOST.endswith("gmail.com") else "0"
+) != "0"
+
+# idle connections older than this are checked with NOOP before reuse
+_IDLE_CHECK_SECONDS = 60
+
+_UID_RE = re.compile(rb"\bUID (\d+)")
+_THRID_RE = re.compile(rb"\bX-GM-THRID (\d+)")
+_MSGID_RE = re.compile(rb"\bX-GM-MSGID (\d+)")
+
+
+class ImapConnectionPool:
+    """
+    Bounded pool of logged-in, INBOX-selected IMAP connections.
+
+    A connection is used by one caller at a time. Connections that fail
+    with a protocol abort or socket error are dropped; after any other
+    error (a failed command, a bad argument) they go back to the pool.
+    """
+
+    def __init__(self, connect: Callable[[], imaplib.IMAP4], size: int = IMAP_POOL_SIZE) -> None:
+        self._connect = connect
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: queue.LifoQueue[tuple[imaplib.IMAP4, float]] = queue.LifoQueue()
+
+    def _checkout(self) -> imaplib.IMAP4:
+        while True:
+            try:
+                imap, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            if time.monotonic() - last_used < _IDLE_CHECK_SECONDS:
+                return imap
+            try:
+                imap.noop()
+                return imap
+            except (imaplib.IMAP4.abort, OSError):
+                _close_quietly(imap)
+
+    @contextmanager
+    def connection(self) -> Iterator[imaplib.IMAP4]:
+        with self._slots:
+            imap = self._checkout()
+            reusable = True
+            try:
+                yield imap
+            except (imaplib.IMAP4.abort, OSError):
+                reusable = False
+                _close_quietly(imap)
+                raise
+            finally:
+                if reusable:
+                    self._idle.put((imap, time.monotonic()))
+
+    def close(self) -> None:
+        while True:
+            try:
+                imap, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _close_quietly(imap)
+
+
+def _close_quietly(imap: imaplib.IMAP4) -> None:
+    try:
+        imap.logout()
+    except Exception:
+        pass
+
+
+def _uid_set(uids: list[int]) -> str:
+    return ",".join(str(uid) for uid in uids)
+
+
+def _iter_fetch_parts(data: list) -> Iterator[tuple[bytes, bytes]]:
+    # imaplib returns (envelope line, literal) tuples separated by b")"
+    for item in data:
+        if isinstance(item, tuple) and len(item) == 2:
+            yield item[0], item[1]
+
+
+def search_unread(imap: imaplib.IMAP4, since: datetime, gmail_extensions: bool = IMAP_GMAIL_EXTENSIONS) -> list[int]:
+    """UIDs of the unread INBOX messages received since `since`."""
+    if gmail_extensions:
+        criteria = (
+            "X-GM-RAW",
+            f'"is:unread in:inbox category:primary after:{since.strftime("%Y/%m/%d")}"',
+        )
+    else:
+        criteria = ("UNSEEN", "SINCE", since.strftime("%d-%b-%Y"))
+
+    typ, data = imap.uid("SEARCH", *criteria)
+    if typ != "OK":
+        raise imaplib.IMAP4.error(f"UID SEARCH failed: {data!r}")
+    return [int(uid) for uid in (data[0] or b"").split()]
+
+
+class ImapBackend:
+    """
+    Mailbox reads over IMAP instead of the Gmail API.
+
+    Listings are one UID SEARCH, one X-GM-THRID-only UID FETCH to pick each
+    thread's newest message, and one UID FETCH of the From/Subject headers
+    for the whole page; full bodies are fetched only when a thread's context
+    is requested.
+    """
+
+    def __init__(self, pool: ImapConnectionPool, gmail_extensions: bool = IMAP_GMAIL_EXTENSIONS) -> None:
+        self._pool = pool
+        self._gmail = gmail_extensions
+
+    def _newest_per_thread(self, imap: imaplib.IMAP4, uids: list[int]) -> list[tuple[int, str]]:
+        # (uid, thread ID) of each thread's newest message, newest first;
+        # X-GM-THRID alone is a few bytes per message
+        if not self._gmail:
+            return [(uid, str(uid)) for uid in sorted(uids, reverse=True)]
+
+        typ, data = imap.uid("FETCH", _uid_set(uids), "(UID X-GM-THRID)")
+        if typ != "OK":
+            raise imaplib.IMAP4.error(f"UID FETCH failed: {data!r}")
+
+        newest: dict[str, int] = {}
+        for line in data:
+            envelope = line[0] if isinstance(line, tuple) else line
+            uid, thrid = _UID_RE.search(envelope or b""), _THRID_RE.search(envelope or b"")
+            if uid is None or thrid is None:
+                continue
+            # X-GM-THRID is the Gmail API thread ID in decimal
+            thread_id = format(int(thrid.group(1)), "x")
+            newest[thread_id] = max(newest.get(thread_id, 0), int(uid.group(1)))
+
+        return sorted(((uid, thread_id) for thread_id, uid in newest.items()), reverse=True)
+
+    def list_unread(
+        self,
+        since: datetime,
+        before_uid: int | None,
+        limit: int,
+    ) -> tuple[list[dict], int | None]:
+        """
+        Returns (summaries, next_before_uid): up to `limit` unread threads,
+        newest first, and the UID to continue from (None when exhausted).
+        UIDs grow with arrival order, so "before UID" pages like a date
+        cursor; a thread whose newest unread UID is at or after it was
+        listed on an earlier page.
+        """
+        with self._pool.connection() as imap:
+            uids = search_unread(imap, since, self._gmail)
+            if not uids:
+                return [], None
+
+            threads = [
+                (uid, thread_id)
+                for uid, thread_id in self._newest_per_thread(imap, uids)
+                if before_uid is None or uid < before_uid
+            ]
+            selected = dict(threads[:limit])
+            if not selected:
+                return [], None
+
+            # headers for the whole page in one pipelined round trip
+            typ, data = imap.uid(
+                "FETCH",
+                _uid_set(list(selected)),
+                "(UID BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)])",
+            )
+            if typ != "OK":
+                raise imaplib.IMAP4.error(f"UID FETCH failed: {data!r}")
+
+        headers_by_uid = {}
+        for envelope, header_bytes in _iter_fetch_parts(data):
+            uid = _UID_RE.search(envelope)
+            if uid is not None:
+                headers_by_uid[int(uid.group(1))] = BytesHeaderParser().parsebytes(header_bytes)
+
+        summaries = []
+        for uid, thread_id in selected.items():
+            headers = headers_by_uid.get(uid)
+            if headers is None:
+                # expunged between SEARCH and FETCH
+                continue
+            summaries.append(
+                {
+                    "thread_id": thread_id,
+                    "from_": headers.get("From", "(missing sender)"),
+                    "subject": _decode_email_subject(headers) if headers.get("Subject") else "(missing subject)",
+                    "uid": uid,
+                }
+            )
+
+        has_more = len(threads) > limit
+        return summaries, (min(selected) if has_more else None)
+
+    def fetch_thread(self, thread_id: str) -> list[tuple[str, Message]]:
+        """
+        Returns (message ID, parsed message) for the thread's messages in
+        INBOX, oldest first. Message IDs are Gmail API IDs (hex X-GM-MSGID),
+        so cached bodies are shared with the Gmail API backend.
+        """
+        if not self._gmail:
+            raise ValueError("Thread lookups need Gmail's X-GM-THRID IMAP extension")
+
+        with self._pool.connection() as imap:
+            typ, data = imap.uid("SEARCH", "X-GM-THRID", str(int(thread_id, 16)))
+            if typ != "OK":
+                raise imaplib.IMAP4.error(f"UID SEARCH failed: {data!r}")
+            uids = sorted(int(uid) for uid in (data[0] or b"").split())
+            if not uids:
+                return []
+
+            typ, data = imap.uid("FETCH", _uid_set(uids), "(UID X-GM-MSGID BODY.PEEK[])")
+            if typ != "OK":
+                raise imaplib.IMAP4.error(f"UID FETCH failed: {data!r}")
+
+        messages = []
+        for envelope, raw in _iter_fetch_parts(data):
+            uid = _UID_RE.search(envelope)
+            if uid is None:
+                continue
+            msgid = _MSGID_RE.search(envelope)
+            message_id = format(int(msgid.group(1)), "x") if msgid else f"uid-{uid.group(1)}"
+            messages.append(
+                (int(uid.group(1)), message_id, email.message_from_bytes(raw, policy=policy.compat32))
+            )
+
+        return [(message_id, message) for _, message_id, message in sorted(messages, key=lambda m: m[0])]
+
+
+_backend: ImapBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_imap_backend() -> ImapBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            pool = ImapConnectionPool(
+                lambda: _connect_and_select_gmail_inbox(
+                    IMAP_USER,
+                    IMAP_PASSWORD,
+                    host=IMAP_HOST,
+                    port=IMAP_PORT,
+                    use_ssl=IMAP_SSL,
+                )
+            )
+            _backend = ImapBackend(pool)
+        return _backend
+
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from googleapiclient.errors import HttpError
+
+from mcp_email.gmail_requests import history_request, list_messages_request, profile_request
+from mcp_email.gmail_scheduler import execute
+
+
+UNREAD_WINDOW_DAYS = int(os.getenv("UNREAD_WINDOW_DAYS", "5"))
+
+# labels a message needs to match `is:unread in:inbox category:primary`
+_UNREAD_LABELS = frozenset({"UNREAD", "INBOX", "CATEGORY_PERSONAL"})
+
+_HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+
+
+def unread_query(since: datetime) -> str:
+    return f"is:unread in:inbox category:primary after:{since.strftime('%Y/%m/%d')}"
+
+
+class UnreadIndex:
+    """
+    In-memory list of unread primary-inbox messages (ID and thread ID),
+    newest first, kept current from users.history.list deltas.
+
+    A full resync lists the unread IDs inside the window (500 per call, no
+    metadata); after that each refresh is a single history call. New mail is
+    always the newest, so it goes to the front and the order stays correct
+    without knowing message dates. Metadata is left to the caller, which
+    fetches (and caches) it only for the messages it actually shows.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._history_id: str | None = None
+        self._window_start: datetime | None = None
+        # message ID -> thread ID, newest first
+        self._refs: OrderedDict[str, str | None] = OrderedDict()
+
+    @property
+    def window_start(self) -> datetime:
+        # day-aligned, like the `after:` date in the Gmail query
+        start = datetime.now(timezone.utc) - timedelta(days=UNREAD_WINDOW_DAYS)
+        return start.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _full_resync(self, service) -> None:
+        # take the watermark first so changes made while listing are replayed
+        profile = execute(profile_request(service))
+        window_start = self.window_start
+
+        refs: OrderedDict[str, str | None] = OrderedDict()
+        page_token = None
+        while True:
+            response = execute(
+                list_messages_request(
+                    service,
+                    unread_query(window_start),
+                    max_results=500,
+                    page_token=page_token,
+                )
+            )
+            for m in response.get("messages", []):
+                refs[m["id"]] = m.get("threadId")
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+        self._refs = refs
+        self._window_start = window_start
+        self._history_id = str(profile["historyId"])
+
+    def _apply_history(self, service) -> bool:
+        """Applies history deltas; returns False if a full resync is needed."""
+        page_token = None
+        latest = self._history_id
+
+        while True:
+            response = execute(
+                history_request(
+                    service,
+                    self._history_id,
+                    page_token=page_token,
+                    history_types=_HISTORY_TYPES,
+                )
+            )
+
+            # records come oldest first, so moving each new message to the
+            # front leaves the newest one first
+            for record in response.get("history", []):
+                for item in record.get("messagesDeleted", []):
+                    self._refs.pop(item["message"]["id"], None)
+
+                for item in record.get("messagesAdded", []):
+                    message = item["message"]
+                    if _UNREAD_LABELS.issubset(message.get("labelIds", [])):
+                        self._refs[message["id"]] = message.get("threadId")
+                        self._refs.move_to_end(message["id"], last=False)
+
+                for key in ("labelsAdded", "labelsRemoved"):
+                    for item in record.get(key, []):
+                        message = item["message"]
+                        if not _UNREAD_LABELS.issubset(message.get("labelIds", [])):
+                            self._refs.pop(message["id"], None)
+                        elif message["id"] not in self._refs:
+                            # an older message marked unread again: its place
+                            # in the date order is unknown, so relist
+                            return False
+
+            latest = str(response.get("historyId", latest))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+        self._history_id = latest
+        return True
+
+    def refresh(self, service) -> list[dict]:
+        """
+        Brings the index up to date and returns the unread message refs
+        (`{"id", "threadId"}`) inside the window, newest first.
+        """
+        with self._lock:
+            # the window moves once a day; relisting drops aged-out messages
+            if self._history_id is None or self._window_start != self.window_start:
+                self._full_resync(service)
+            else:
+                try:
+                    in_sync = self._apply_history(service)
+                except HttpError as e:
+                    # watermark too old for Gmail to replay
+                    if e.resp.status != 404:
+                        raise
+                    in_sync = False
+
+                if not in_sync:
+                    self._full_resync(service)
+
+            return [
+                {"id": message_id, "threadId": thread_id}
+                for message_id, thread_id in self._refs.items()
+            ]
+
+
+_index: UnreadIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_unread_index() -> UnreadIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = UnreadIndex()
+        return _index
@@ -3,11 +3,10 @@ import imaplib
 import email
 from email.header import decode_header
 
-import os
-import re
-import html as _html
 from typing import TypedDict
 
+from mcp_email.html_to_text import html_to_text
+
 
 def _decode_email_subject(message) -> str:
     subject, encoding = decode_header(message.get("Subject"))[0]
@@ -56,17 +55,9 @@ def _extract_body_text_and_html(message) -> tuple[str, str]:
     return body_text, body_html
 
 def _html_to_text(body_html: str) -> str:
-    # very small HTML -> text cleanup
-    # Remove <script> and <style> blocks (and their contents)
-    txt = re.sub(r"(?is)<(script|style).*?>.*?</\1>", "", body_html)
-    # Convert HTML line breaks (<br>) into newline characters
-    txt = re.sub(r"(?is)<br\s*/?>", "\n", txt)
-    # Convert paragraph endings (</p>) into blank-line-separated paragraphs
-    txt = re.sub(r"(?is)</p\s*>", "\n\n", txt)
-    # Strip any remaining HTML tags
-    txt = re.sub(r"(?is)<.*?>", "", txt)
-    # Decode HTML entities (e.g., &amp; -> &, &nbsp; -> space)
-    return _html.unescape(txt)
+    # shared streaming converter: drops script/style/hidden content and keeps
+    # <br>/paragraph breaks
+    return html_to_text(body_html)
 
 
 
@@ -148,8 +139,17 @@ def _fetch_and_parse_email(imap, msg_id) -> EmailFetchResult:
 
 
 
-def _connect_and_select_gmail_inbox(email_user: str, email_password: str) -> imaplib.IMAP4_SSL:
-    imap = imaplib.IMAP4_SSL("imap.gmail.com", 993)  # secure Gmail IMAP endpoint
-    imap.login(email_user, email_password)           # authenticate
-    imap.select("INBOX")                             # make INBOX the active mailbox
-    return imap
\ No newline at end of file
+def _connect_and_select_gmail_inbox(
+    email_user: str,
+    email_password: str,
+    host: str = "imap.gmail.com",
+    port: int = 993,
+    use_ssl: bool = True,
+) -> imaplib.IMAP4:
+    if use_ssl:
+        imap = imaplib.IMAP4_SSL(host, port)  # secure Gmail IMAP endpoint
+    else:
+        imap = imaplib.IMAP4(host, port)      # plain IMAP, e.g. a local test server
+    imap.login(email_user, email_password)    # authenticate
+    imap.select("INBOX")                      # make INBOX the active mailbox
+    return imap
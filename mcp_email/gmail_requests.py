@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+# Every Gmail read the tools make is built here, with partial-response
+# `fields=` masks and `metadataHeaders=` lists trimmed to what each call site
+# actually reads. Requests are returned unexecuted so callers can batch them.
+
+# get_unread_emails: thread, date and the two headers it shows
+MESSAGE_SUMMARY_HEADERS = ["From", "Subject"]
+MESSAGE_SUMMARY_FIELDS = "id,threadId,internalDate,payload/headers"
+
+LIST_MESSAGES_FIELDS = "messages(id,threadId),nextPageToken"
+
+PROFILE_FIELDS = "historyId"
+
+_HISTORY_MESSAGE = "message(id,threadId,labelIds)"
+HISTORY_FIELDS = (
+    f"history(messagesAdded/{_HISTORY_MESSAGE},messagesDeleted/{_HISTORY_MESSAGE},"
+    f"labelsAdded/{_HISTORY_MESSAGE},labelsRemoved/{_HISTORY_MESSAGE}),"
+    "historyId,nextPageToken"
+)
+
+# create_draft_reply: sender headers and the text bodies only; drops
+# attachment IDs/sizes, label IDs, snippets and part headers. A single-part
+# message has its body on the payload itself, and the text parts of a
+# message with attachments sit inside multipart/alternative (or deeper, in
+# multipart/related). Masks cannot recurse, so parts are spelled out down to
+# THREAD_CONTEXT_PART_DEPTH levels.
+THREAD_CONTEXT_PART_DEPTH = 4
+
+
+def _part_fields(depth: int) -> str:
+    fields = "partId,mimeType,body/data"
+    if depth > 1:
+        fields += f",parts({_part_fields(depth - 1)})"
+    return fields
+
+
+THREAD_CONTEXT_FIELDS = (
+    "id,historyId,"
+    "messages(id,threadId,payload(mimeType,headers,body/data,"
+    f"parts({_part_fields(THREAD_CONTEXT_PART_DEPTH)})))"
+)
+
+# create_draft_reply with DRAFT_REPLY_FORMAT=raw: the RFC 822 source, for
+# messages whose body is not cached yet
+RAW_MESSAGE_FIELDS = "id,raw"
+
+# send_thread_reply: only the headers used to address and thread the reply
+REPLY_TARGET_HEADERS = ["From", "To", "Subject", "Message-ID", "References"]
+THREAD_REPLY_TARGET_FIELDS = "id,historyId,messages(id,payload/headers)"
+
+# send_thread_reply: did a send whose response was lost go through?
+SENT_LOOKUP_FIELDS = "messages(id,threadId)"
+
+
+def message_summary_request(service, message_id: str):
+    return service.users().messages().get(
+        userId="me",
+        id=message_id,
+        format="metadata",
+        metadataHeaders=MESSAGE_SUMMARY_HEADERS,
+        fields=MESSAGE_SUMMARY_FIELDS,
+    )
+
+
+def list_messages_request(
+    service,
+    query: str,
+    max_results: int,
+    page_token: str | None = None,
+):
+    return service.users().messages().list(
+        userId="me",
+        q=query,
+        maxResults=max_results,
+        pageToken=page_token,
+        fields=LIST_MESSAGES_FIELDS,
+    )
+
+
+def profile_request(service):
+    return service.users().getProfile(userId="me", fields=PROFILE_FIELDS)
+
+
+def history_request(
+    service,
+    start_history_id: str,
+    page_token: str | None = None,
+    history_types: list[str] | None = None,
+):
+    return service.users().history().list(
+        userId="me",
+        startHistoryId=start_history_id,
+        historyTypes=history_types,
+        pageToken=page_token,
+        fields=HISTORY_FIELDS,
+    )
+
+
+def thread_request(service, thread_id: str, format: str = "full"):
+    """
+    "full" is shaped for create_draft_reply's thread context and "metadata"
+    for send_thread_reply's reply target.
+    """
+    if format == "metadata":
+        return service.users().threads().get(
+            userId="me",
+            id=thread_id,
+            format="metadata",
+            metadataHeaders=REPLY_TARGET_HEADERS,
+            fields=THREAD_REPLY_TARGET_FIELDS,
+        )
+
+    return service.users().threads().get(
+        userId="me",
+        id=thread_id,
+        format="full",
+        fields=THREAD_CONTEXT_FIELDS,
+    )
+
+
+def raw_message_requests(service, message_ids: list[str]) -> list:
+    # built from one messages() resource: each users().messages() call
+    # rebuilds it from the discovery document, which costs more than the
+    # request itself
+    messages = service.users().messages()
+    return [
+        messages.get(userId="me", id=message_id, format="raw", fields=RAW_MESSAGE_FIELDS)
+        for message_id in message_ids
+    ]
+
+
+def sent_message_lookup_request(service, rfc822_message_id: str):
+    return service.users().messages().list(
+        userId="me",
+        q=f"in:sent rfc822msgid:{rfc822_message_id.strip('<>')}",
+        maxResults=1,
+        fields=SENT_LOOKUP_FIELDS,
+    )
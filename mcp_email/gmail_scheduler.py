@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import email.utils
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from mcp_email.instrumentation import record_value, span
+
+# Gmail allows 250 quota units per user per second (moving average)
+GMAIL_QUOTA_UNITS_PER_SECOND = float(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "250"))
+GMAIL_MAX_RETRIES = int(os.getenv("GMAIL_MAX_RETRIES", "5"))
+GMAIL_BACKOFF_BASE_SECONDS = float(os.getenv("GMAIL_BACKOFF_BASE_SECONDS", "1"))
+GMAIL_BACKOFF_MAX_SECONDS = float(os.getenv("GMAIL_BACKOFF_MAX_SECONDS", "32"))
+
+# https://developers.google.com/workspace/gmail/api/reference/quota
+QUOTA_UNITS = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.history.list": 2,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.send": 100,
+    "gmail.users.threads.get": 10,
+    "gmail.users.threads.list": 10,
+    "gmail.users.drafts.create": 10,
+}
+_DEFAULT_QUOTA_UNITS = 5
+
+_RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+# 403s that are throttling rather than a permission problem
+_RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+_TRANSPORT_ERRORS = (socket.timeout, ConnectionError, httplib2.HttpLib2Error)
+
+
+def quota_units(request) -> int:
+    return QUOTA_UNITS.get(getattr(request, "methodId", None), _DEFAULT_QUOTA_UNITS)
+
+
+def is_throttled(error: Exception) -> bool:
+    """The request was rejected before Gmail acted on it, so a retry is always safe."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    return status == 429 or (
+        status == 403 and any(r in (error.content or b"") for r in _RATE_LIMIT_REASONS)
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        return error.resp.status in _RETRYABLE_STATUSES or is_throttled(error)
+    return isinstance(error, _TRANSPORT_ERRORS)
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class GmailScheduler:
+    """
+    Paces and retries Gmail API calls for the whole process.
+
+    A token bucket refilled at GMAIL_QUOTA_UNITS_PER_SECOND is charged with
+    each call's quota units before it is sent. Throttled (429, rate-limit
+    403) and transient (5xx, connection) failures are retried with
+    full-jitter exponential backoff, waiting at least as long as any
+    Retry-After header; a throttled response also holds back every other
+    caller until that time.
+    """
+
+    def __init__(
+        self,
+        units_per_second: float = GMAIL_QUOTA_UNITS_PER_SECOND,
+        max_retries: int = GMAIL_MAX_RETRIES,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._rate = units_per_second
+        self._capacity = units_per_second  # one second of burst
+        self._max_retries = max_retries
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def acquire(self, units: float) -> None:
+        # charge up front and let the balance go negative: each caller then
+        # sleeps off its own debt, which keeps callers in arrival order
+        units = min(units, self._capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= units
+            wait = max(-self._tokens / self._rate, self._paused_until - now)
+        if wait > 0:
+            record_value("gmail.quota_wait_ms", int(wait * 1000))
+            self._sleep(wait)
+
+    def backoff(self, attempt: int, error: Exception | None = None) -> float:
+        delay = random.uniform(
+            0, min(GMAIL_BACKOFF_MAX_SECONDS, GMAIL_BACKOFF_BASE_SECONDS * 2 ** attempt)
+        )
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if error is not None and is_throttled(error):
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        record_value("gmail.retry_delay_ms", int(delay * 1000))
+        return delay
+
+    @property
+    def max_retries(self) -> int:
+        return self._max_retries
+
+    def sleep(self, seconds: float) -> None:
+        """Waits on the scheduler's own (injectable) sleep, as its retries do."""
+        self._sleep(seconds)
+
+    def execute(
+        self,
+        request,
+        idempotent: bool = True,
+        find_sent: Callable[[], dict | None] | None = None,
+    ):
+        """
+        Executes one Gmail API request.
+
+        A non-idempotent request (a send) is only retried after a throttling
+        error, which Gmail returns before acting on it. After a 5xx or a
+        dropped connection the send may already have gone through, so it is
+        never sent again: `find_sent` is polled instead (see _await_sent),
+        and the error is raised if it never finds the message, or at once
+        without `find_sent`.
+        """
+        units = quota_units(request)
+        # method IDs look like "gmail.users.messages.get"
+        method = getattr(request, "methodId", None) or "gmail.unknown"
+        attempt = 0
+        while True:
+            self.acquire(units)
+            try:
+                with span(method):
+                    return request.execute()
+            except Exception as e:
+                if attempt >= self._max_retries or not is_retryable(e):
+                    raise
+                if not idempotent and not is_throttled(e):
+                    if find_sent is None:
+                        raise
+                    return self._await_sent(find_sent, e)
+                error = e
+
+            self._sleep(self.backoff(attempt, error))
+            attempt += 1
+
+    def _await_sent(self, find_sent: Callable[[], dict | None], error: Exception) -> dict:
+        # Gmail search can take a while to index a message that did go out,
+        # so the lookup is repeated with growing delays before giving up
+        for attempt in range(self._max_retries):
+            self._sleep(min(GMAIL_BACKOFF_MAX_SECONDS, GMAIL_BACKOFF_BASE_SECONDS * 2 ** attempt))
+            sent = find_sent()
+            if sent is not None:
+                return sent
+        raise error
+
+
+_scheduler = GmailScheduler()
+
+
+def get_scheduler() -> GmailScheduler:
+    return _scheduler
+
+
+def execute(request, idempotent: bool = True, find_sent: Callable[[], dict | None] | None = None):
+    """Runs `request` through the process-wide scheduler."""
+    return _scheduler.execute(request, idempotent=idempotent, find_sent=find_sent)
+
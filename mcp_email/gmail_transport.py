@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from http.client import HTTPException
+from typing import Callable, Iterator
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+
+from mcp_email.instrumentation import record_value
+
+# Http objects (each with its own keep-alive connection) kept for Gmail calls;
+# at most this many calls are on the wire at once
+GMAIL_HTTP_POOL_SIZE = int(os.getenv("GMAIL_HTTP_POOL_SIZE", "8"))
+# per socket operation, so a stalled connection cannot hold a worker forever
+GMAIL_HTTP_TIMEOUT_SECONDS = float(os.getenv("GMAIL_HTTP_TIMEOUT_SECONDS", "30"))
+
+# the connection is in an unknown state after these, so it is not reused
+_BROKEN_CONNECTION_ERRORS = (OSError, HTTPException, httplib2.HttpLib2Error)
+
+
+def default_http_factory() -> httplib2.Http:
+    return httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT_SECONDS)
+
+
+class PooledHttp:
+    """
+    Thread-safe stand-in for the single httplib2.Http a Gmail client holds.
+
+    Each request borrows one of up to `size` authorized Http objects for its
+    duration. httplib2 keeps connections open between requests, so a
+    borrowed object usually comes with a warm keep-alive connection. An Http
+    object whose request failed at the transport level is dropped rather
+    than returned. `http_factory` makes the underlying objects, e.g. with
+    other timeouts or a proxy.
+    """
+
+    def __init__(
+        self,
+        credentials,
+        size: int = GMAIL_HTTP_POOL_SIZE,
+        http_factory: Callable[[], httplib2.Http] = default_http_factory,
+    ) -> None:
+        # read by googleapiclient to refresh and apply credentials for batches
+        self.credentials = credentials
+        self._http_factory = http_factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: queue.LifoQueue[AuthorizedHttp] = queue.LifoQueue()
+
+    def _acquire_slot(self) -> None:
+        if self._slots.acquire(blocking=False):
+            return
+        start = time.perf_counter()
+        self._slots.acquire()
+        record_value("gmail.http_pool_wait_ms", int((time.perf_counter() - start) * 1000))
+
+    @contextmanager
+    def connection(self) -> Iterator[AuthorizedHttp]:
+        self._acquire_slot()
+        try:
+            try:
+                http = self._idle.get_nowait()
+            except queue.Empty:
+                http = AuthorizedHttp(self.credentials, http=self._http_factory())
+            try:
+                yield http
+            except _BROKEN_CONNECTION_ERRORS:
+                http.close()
+                raise
+            except Exception:
+                # failed above the transport (e.g. refreshing the
+                # credentials), so the connection is still good
+                self._idle.put(http)
+                raise
+            except BaseException:
+                # interrupted part-way through a request
+                http.close()
+                raise
+            self._idle.put(http)
+        finally:
+            self._slots.release()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        with self.connection() as http:
+            return http.request(uri, method, body=body, headers=headers, **kwargs)
+
+    def close(self) -> None:
+        while True:
+            try:
+                http = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            http.close()
+
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import re
+from html.parser import HTMLParser
+
+# input is fed to the parser in chunks of this size, so a max_chars limit
+# stops the work without tokenizing the rest of the document
+_FEED_CHUNK = 16 * 1024
+
+# content never shown to the reader
+_SKIP_TAGS = frozenset({"script", "style", "head", "title", "template", "noscript", "svg"})
+# head content; any other start tag ends an unclosed <head>
+_HEAD_TAGS = frozenset({"html", "head", "title", "meta", "link", "base", "style", "script", "noscript", "template"})
+# elements without an end tag; never pushed onto the element stack
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+_PARAGRAPH_TAGS = frozenset({
+    "p", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "table", "ul", "ol",
+})
+_LINE_TAGS = frozenset({
+    "div", "li", "tr", "dt", "dd", "section", "article", "header", "footer",
+    "address", "center", "form", "fieldset",
+})
+
+# elements whose end tag may be left out: the start tag -> the open
+# elements it ends. Block elements also end an open <p>.
+_IMPLIED_END_TAGS = {
+    "li": frozenset({"li", "p"}),
+    "dt": frozenset({"dt", "dd", "p"}),
+    "dd": frozenset({"dt", "dd", "p"}),
+    "td": frozenset({"td", "th"}),
+    "th": frozenset({"td", "th"}),
+    "tr": frozenset({"tr", "td", "th"}),
+    "option": frozenset({"option"}),
+    **{tag: frozenset({"p"}) for tag in _PARAGRAPH_TAGS | _LINE_TAGS if tag not in ("li", "dt", "dd", "tr")},
+}
+# implied end tags never reach past these
+_SCOPE_TAGS = frozenset({"html", "body", "table", "ul", "ol", "dl", "select", "td", "th", "blockquote"})
+
+_HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+_SPACES_RE = re.compile(r"[ \t\r\n\f\v]+")
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+\n")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+class _LimitReached(Exception):
+    pass
+
+
+def _is_hidden(attrs: list[tuple[str, str | None]]) -> bool:
+    for name, value in attrs:
+        if name == "hidden":
+            return True
+        if name == "aria-hidden" and (value or "").lower() == "true":
+            return True
+        if name == "style" and value and _HIDDEN_STYLE_RE.search(value):
+            return True
+    return False
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self, max_chars: int | None) -> None:
+        super().__init__(convert_charrefs=True)
+        self._max_chars = max_chars
+        self._chunks: list[str] = []
+        self._length = 0
+        # open (non-void) elements, outermost first
+        self._stack: list[str] = []
+        # index in _stack of the element whose content is being skipped
+        self._skip_at: int | None = None
+        self._pre_depth = 0
+
+    def _emit(self, text: str) -> None:
+        self._chunks.append(text)
+        self._length += len(text)
+        if self._max_chars is not None and self._length >= self._max_chars:
+            raise _LimitReached
+
+    def _at_space(self) -> bool:
+        # at the start of a line, or right after a space
+        return not self._chunks or self._chunks[-1].endswith(("\n", " "))
+
+    def _newlines(self, count: int) -> None:
+        # count trailing newlines already emitted so block tags never stack up
+        trailing = 0
+        for chunk in reversed(self._chunks):
+            stripped = chunk.rstrip(" ")
+            trailing += len(stripped) - len(stripped.rstrip("\n"))
+            if stripped.strip("\n"):
+                break
+        if self._chunks and trailing < count:
+            self._emit("\n" * (count - trailing))
+
+    def _pop_to(self, index: int) -> None:
+        # closes the element at `index` and everything opened inside it
+        self._pre_depth -= self._stack[index:].count("pre")
+        del self._stack[index:]
+        if self._skip_at is not None and index <= self._skip_at:
+            self._skip_at = None
+
+    def _close_implied(self, closes: frozenset[str]) -> None:
+        # the outermost open element `closes` names, up to the nearest scope
+        # boundary: <li> ends an open <li> of the same list, not of an outer one
+        found = None
+        for index in range(len(self._stack) - 1, -1, -1):
+            tag = self._stack[index]
+            if tag in closes:
+                found = index
+            elif tag in _SCOPE_TAGS:
+                break
+        if found is not None:
+            self._pop_to(found)
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_at is not None and tag not in _HEAD_TAGS and self._stack[self._skip_at] == "head":
+            # <body> or body content ends a head whose end tag was left out
+            self._pop_to(self._skip_at)
+        closes = _IMPLIED_END_TAGS.get(tag)
+        if closes:
+            self._close_implied(closes)
+
+        if tag in _VOID_TAGS:
+            if self._skip_at is None and tag == "br":
+                self._emit("\n")
+            return
+
+        self._stack.append(tag)
+        if tag == "pre":
+            self._pre_depth += 1
+        if self._skip_at is not None:
+            return
+
+        if tag in _SKIP_TAGS or _is_hidden(attrs):
+            self._skip_at = len(self._stack) - 1
+            return
+
+        if tag in _PARAGRAPH_TAGS:
+            self._newlines(2)
+        elif tag in _LINE_TAGS:
+            self._newlines(1)
+        elif tag in ("td", "th") and not self._at_space():
+            self._emit(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        index = None
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i] == tag:
+                index = i
+                break
+        # an end tag also ends any unclosed element (and skip) inside it
+        skipped = self._skip_at is not None and (index is None or index >= self._skip_at)
+        if index is not None:
+            self._pop_to(index)
+        if skipped:
+            return
+
+        if tag in _PARAGRAPH_TAGS:
+            self._newlines(2)
+        elif tag in _LINE_TAGS:
+            self._newlines(1)
+
+    def handle_data(self, data):
+        if self._skip_at is not None or not data:
+            return
+        if not self._pre_depth:
+            # lines never start with a space outside <pre>, so text() only
+            # strips line ends and keeps preformatted indentation
+            data = _SPACES_RE.sub(" ", data)
+            if self._at_space():
+                data = data.lstrip(" ")
+                if not data:
+                    return
+        self._emit(data)
+
+    def text(self) -> str:
+        text = "".join(self._chunks)
+        if self._max_chars is not None:
+            text = text[: self._max_chars]
+        text = _TRAILING_SPACE_RE.sub("\n", text)
+        text = _BLANK_LINES_RE.sub("\n\n", text)
+        return "\n".join(line.rstrip(" ") for line in text.split("\n")).lstrip("\n").rstrip()
+
+
+def html_to_text(html: str, max_chars: int | None = None) -> str:
+    """
+    Converts HTML to readable plain text in a single streaming pass.
+
+    Skips script/style/head content and hidden elements (`hidden`,
+    `aria-hidden="true"`, `display:none`, `visibility:hidden`), keeps line
+    and paragraph breaks from block elements, and stops parsing as soon as
+    `max_chars` characters of text have been produced. End tags that HTML
+    lets authors leave out (</head>, </p>, </li>, </td>, ...) are implied
+    the way browsers imply them.
+    """
+    parser = _TextExtractor(max_chars)
+    try:
+        for start in range(0, len(html), _FEED_CHUNK):
+            parser.feed(html[start:start + _FEED_CHUNK])
+        parser.close()
+    except _LimitReached:
+        pass
+    return parser.text()
+
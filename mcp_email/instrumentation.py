@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+
+# EMAIL_STATS=0 turns every span into a shared no-op
+STATS_ENABLED = os.getenv("EMAIL_STATS", "1") != "0"
+# optional: append one JSON line per span to this file
+STATS_JSONL_FILE = os.getenv("EMAIL_STATS_JSONL", "")
+
+# log-linear buckets: 4 per power of two, so any percentile read back from
+# the histogram is at most 20% below the true value
+_SUB_BUCKETS = 4
+
+
+def _bucket(value: int) -> int:
+    if value < _SUB_BUCKETS:
+        return value
+    exponent = value.bit_length() - 1
+    mantissa = (value >> (exponent - 2)) & (_SUB_BUCKETS - 1)
+    return exponent * _SUB_BUCKETS + mantissa
+
+
+def _bucket_floor(index: int) -> int:
+    if index < _SUB_BUCKETS:
+        return index
+    exponent, mantissa = divmod(index, _SUB_BUCKETS)
+    return (_SUB_BUCKETS + mantissa) << (exponent - 2)
+
+
+class Histogram:
+    """Count, sum, min, max and log-linear buckets of non-negative integers."""
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.min: int | None = None
+        self.max = 0
+        self.buckets: dict[int, int] = {}
+
+    def record(self, value: int) -> None:
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        index = _bucket(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def percentile(self, q: float) -> int:
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(_bucket_floor(index), self.min or 0), self.max)
+        return self.max
+
+    def summary(self, scale: float = 1.0) -> dict:
+        def s(value):
+            return round(value / scale, 3)
+
+        return {
+            "count": self.count,
+            "mean": s(self.total / self.count) if self.count else 0,
+            "min": s(self.min or 0),
+            "p50": s(self.percentile(0.5)),
+            "p90": s(self.percentile(0.9)),
+            "p99": s(self.percentile(0.99)),
+            "max": s(self.max),
+        }
+
+
+class _Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._durations: dict[str, Histogram] = {}
+        self._values: dict[str, Histogram] = {}
+        self._errors: dict[str, int] = {}
+        self._started = time.time()
+        self._jsonl = None
+        if STATS_JSONL_FILE:
+            self._jsonl = open(STATS_JSONL_FILE, "a", encoding="utf-8", buffering=1 << 16)
+            atexit.register(self._jsonl.close)
+
+    def add_duration(self, name: str, ns: int, error: bool, attrs: dict | None) -> None:
+        with self._lock:
+            histogram = self._durations.get(name)
+            if histogram is None:
+                histogram = self._durations[name] = Histogram()
+            histogram.record(ns)
+            if error:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            if self._jsonl is not None:
+                line = {"ts": round(time.time(), 6), "span": name, "ms": round(ns / 1e6, 3)}
+                if error:
+                    line["error"] = True
+                if attrs:
+                    line.update(attrs)
+                self._jsonl.write(json.dumps(line) + "\n")
+
+    def add_value(self, name: str, value: int) -> None:
+        with self._lock:
+            histogram = self._values.get(name)
+            if histogram is None:
+                histogram = self._values[name] = Histogram()
+            histogram.record(value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": True,
+                "uptime_s": round(time.time() - self._started, 1),
+                "spans_ms": {
+                    name: {**h.summary(scale=1e6), "errors": self._errors.get(name, 0)}
+                    for name, h in sorted(self._durations.items())
+                },
+                "values": {name: h.summary() for name, h in sorted(self._values.items())},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._durations.clear()
+            self._values.clear()
+            self._errors.clear()
+            self._started = time.time()
+
+
+_registry = _Registry()
+
+
+class _Span:
+    __slots__ = ("_name", "_attrs", "_start")
+
+    def __init__(self, name: str, attrs: dict | None) -> None:
+        self._name = name
+        self._attrs = attrs
+
+    def __enter__(self) -> _Span:
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _registry.add_duration(
+            self._name, time.perf_counter_ns() - self._start, exc_type is not None, self._attrs
+        )
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """
+    Times the `with` block into the duration histogram `name`; blocks that
+    raise are also counted as errors. `attrs` only go to the JSON lines export.
+    """
+    if not STATS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, attrs or None)
+
+
+def record_value(name: str, value: int) -> None:
+    """Adds `value` (e.g. response bytes) to the value histogram `name`."""
+    if STATS_ENABLED:
+        _registry.add_value(name, value)
+
+
+def stats_snapshot() -> dict:
+    if not STATS_ENABLED:
+        return {"enabled": False}
+    return _registry.snapshot()
+
+
+def reset_stats() -> None:
+    _registry.reset()
+
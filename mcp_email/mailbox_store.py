@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from mcp_email.gmail_requests import (
+    history_request,
+    message_summary_request,
+    profile_request,
+    thread_request,
+)
+from mcp_email.gmail_scheduler import execute
+from mcp_email.reply_target import ReplyTargetCache
+from mcp_email.utils import GMAIL_BATCH_SIZE, TOKEN_FILE, execute_batched
+
+# defaults to a file next to the OAuth token
+MAILBOX_DB_FILE = os.getenv("MAILBOX_DB_FILE", "") or os.path.join(
+    os.path.dirname(os.path.abspath(TOKEN_FILE)), "mailbox.sqlite3"
+)
+# history.list is cheap, but tool calls seconds apart do not need a call each
+MAILBOX_SYNC_INTERVAL_SECONDS = float(os.getenv("MAILBOX_SYNC_INTERVAL_SECONDS", "10"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS threads (
+    id TEXT PRIMARY KEY,
+    history_id TEXT,
+    format TEXT NOT NULL,
+    stale INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    history_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bodies (
+    message_id TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+);
+"""
+
+# bump when the way cleaned bodies are produced changes, to drop stale ones
+BODY_FORMAT_VERSION = "5"
+# bump when the fields requested for threads (gmail_requests.THREAD_CONTEXT_FIELDS,
+# REPLY_TARGET_HEADERS) change, to drop threads saved without them
+THREAD_FORMAT_VERSION = "3"
+
+# history record keys whose entries change a thread's messages
+_THREAD_CHANGING_KEYS = ("messagesAdded", "messagesDeleted")
+_LABEL_KEYS = ("labelsAdded", "labelsRemoved")
+
+
+class MailboxStore:
+    """
+    On-disk cache of Gmail threads, message metadata and cleaned bodies.
+
+    Kept current by replaying users.history.list deltas from a saved
+    historyId watermark: threads that gained or lost messages are marked
+    stale and refetched on next read. Message headers and bodies never
+    change in Gmail, so those are cached until the message is deleted.
+    """
+
+    def __init__(self, path: str = MAILBOX_DB_FILE) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        # in memory only; dropped whenever the thread is known to change
+        self.reply_targets = ReplyTargetCache()
+
+        if self._get_meta("body_format") != BODY_FORMAT_VERSION:
+            with self._db:
+                self._db.execute("DELETE FROM bodies")
+            self._set_meta("body_format", BODY_FORMAT_VERSION)
+        if self._get_meta("thread_format") != THREAD_FORMAT_VERSION:
+            with self._db:
+                self._db.execute("DELETE FROM threads")
+            self._set_meta("thread_format", THREAD_FORMAT_VERSION)
+
+    # --- watermark ---
+    def _get_meta(self, key: str) -> str | None:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+    @property
+    def history_id(self) -> str | None:
+        return self._get_meta("history_id")
+
+    # --- history sync ---
+    def _reset_watermark(self, service) -> None:
+        profile = execute(profile_request(service))
+        self._set_meta("history_id", str(profile["historyId"]))
+
+    def _list_history(self, service, start_history_id: str) -> tuple[list[dict], str]:
+        records: list[dict] = []
+        latest = start_history_id
+        page_token = None
+
+        while True:
+            response = execute(history_request(service, start_history_id, page_token))
+
+            records.extend(response.get("history", []))
+            latest = str(response.get("historyId", latest))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return records, latest
+
+    def apply_history(self, records: list[dict]) -> None:
+        with self._db_lock, self._db:
+            for record in records:
+                for key in _THREAD_CHANGING_KEYS:
+                    for item in record.get(key, []):
+                        message = item.get("message", {})
+                        if message.get("threadId"):
+                            self._db.execute(
+                                "UPDATE threads SET stale = 1 WHERE id = ?",
+                                (message["threadId"],),
+                            )
+                            self.reply_targets.discard(message["threadId"])
+                        if key == "messagesDeleted" and message.get("id"):
+                            self._db.execute(
+                                "DELETE FROM messages WHERE id = ?", (message["id"],)
+                            )
+                            self._db.execute(
+                                "DELETE FROM bodies WHERE message_id = ?",
+                                (message["id"],),
+                            )
+
+                for key in _LABEL_KEYS:
+                    for item in record.get(key, []):
+                        message = item.get("message", {})
+                        if message.get("id"):
+                            self._update_labels(message["id"], message.get("labelIds", []))
+
+    def _update_labels(self, message_id: str, label_ids: list[str]) -> None:
+        row = self._db.execute(
+            "SELECT data FROM messages WHERE id = ?", (message_id,)
+        ).fetchone()
+        if row is None:
+            return
+        data = json.loads(row[0])
+        data["labelIds"] = label_ids
+        self._db.execute(
+            "UPDATE messages SET data = ? WHERE id = ?",
+            (json.dumps(data), message_id),
+        )
+
+    def sync(self, service, force: bool = False) -> list[dict]:
+        """
+        Applies history deltas since the saved watermark.
+
+        Returns the applied history records. On first use, or when Gmail no
+        longer has the watermark (404), every cached thread is marked stale
+        and the watermark restarts from the mailbox's current historyId.
+        """
+        with self._sync_lock:
+            now = time.monotonic()
+            if not force and now - self._last_sync < MAILBOX_SYNC_INTERVAL_SECONDS:
+                return []
+
+            watermark = self.history_id
+            records: list[dict] = []
+
+            if watermark is None:
+                self._mark_all_stale()
+                self._reset_watermark(service)
+            else:
+                try:
+                    records, latest = self._list_history(service, watermark)
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    self._mark_all_stale()
+                    self._reset_watermark(service)
+                else:
+                    self.apply_history(records)
+                    self._set_meta("history_id", latest)
+
+            self._last_sync = now
+            return records
+
+    def _mark_all_stale(self) -> None:
+        with self._db_lock, self._db:
+            self._db.execute("UPDATE threads SET stale = 1")
+        self.reply_targets.clear()
+
+    # --- threads ---
+    def invalidate_thread(self, thread_id: str) -> None:
+        with self._db_lock, self._db:
+            self._db.execute("UPDATE threads SET stale = 1 WHERE id = ?", (thread_id,))
+        self.reply_targets.discard(thread_id)
+
+    def _cached_thread(self, thread_id: str, format: str) -> dict | None:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT format, stale, data FROM threads WHERE id = ?", (thread_id,)
+            ).fetchone()
+
+        if row is not None:
+            cached_format, stale, data = row
+            if not stale and (cached_format == format or cached_format == "full"):
+                return json.loads(data)
+        return None
+
+    def _put_threads(self, threads: dict[str, dict], format: str) -> None:
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO threads (id, history_id, format, stale, data) "
+                "VALUES (?, ?, ?, 0, ?)",
+                [
+                    (thread_id, thread.get("historyId"), format, json.dumps(thread))
+                    for thread_id, thread in threads.items()
+                ],
+            )
+
+    def get_thread(self, service, thread_id: str, format: str = "full") -> dict:
+        """
+        Returns the thread from the store, fetching it only if it is missing,
+        stale, or cached in a smaller format than requested. A cached "full"
+        thread also serves "metadata" reads.
+        """
+        self.sync(service)
+
+        thread = self._cached_thread(thread_id, format)
+        if thread is not None:
+            return thread
+
+        thread = execute(thread_request(service, thread_id, format))
+        self._put_threads({thread_id: thread}, format)
+        return thread
+
+    def get_threads(
+        self,
+        service,
+        thread_ids: list[str],
+        format: str = "full",
+        batch_size: int = GMAIL_BATCH_SIZE,
+    ) -> list[tuple[dict | None, Exception | None]]:
+        """
+        Like get_thread for many threads: returns one (thread, error) pair
+        per ID, in order, fetching the ones not in the store as Gmail batch
+        requests.
+        """
+        self.sync(service)
+
+        cached = {}
+        for thread_id in dict.fromkeys(thread_ids):
+            thread = self._cached_thread(thread_id, format)
+            if thread is not None:
+                cached[thread_id] = thread
+
+        missing = [t for t in dict.fromkeys(thread_ids) if t not in cached]
+        fetched: dict[str, tuple[dict | None, Exception | None]] = {}
+
+        if missing:
+            requests = [thread_request(service, t, format) for t in missing]
+            fetched = dict(zip(missing, execute_batched(service, requests, batch_size)))
+            self._put_threads(
+                {t: thread for t, (thread, error) in fetched.items() if error is None and thread is not None},
+                format,
+            )
+
+        return [
+            (cached[t], None) if t in cached else fetched[t]
+            for t in thread_ids
+        ]
+
+    # --- message metadata ---
+    def get_messages_metadata(
+        self,
+        service,
+        message_ids: list[str],
+        batch_size: int = GMAIL_BATCH_SIZE,
+    ) -> list[tuple[dict | None, Exception | None]]:
+        """
+        Returns one (message, error) pair per ID, in order, fetching only the
+        messages not already in the store (as Gmail batch requests).
+        """
+        cached: dict[str, dict] = {}
+        with self._db_lock:
+            for message_id in message_ids:
+                row = self._db.execute(
+                    "SELECT data FROM messages WHERE id = ?", (message_id,)
+                ).fetchone()
+                if row is not None:
+                    cached[message_id] = json.loads(row[0])
+
+        missing = [m for m in message_ids if m not in cached]
+        fetched: dict[str, tuple[dict | None, Exception | None]] = {}
+
+        if missing:
+            requests = [message_summary_request(service, m) for m in missing]
+            results = execute_batched(service, requests, batch_size)
+            fetched = dict(zip(missing, results))
+
+            with self._db_lock, self._db:
+                for message_id, (msg, error) in fetched.items():
+                    if error is None and msg is not None:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO messages (id, thread_id, history_id, data) "
+                            "VALUES (?, ?, ?, ?)",
+                            (message_id, msg.get("threadId"), msg.get("historyId"), json.dumps(msg)),
+                        )
+
+        return [
+            (cached[m], None) if m in cached else fetched[m]
+            for m in message_ids
+        ]
+
+    # --- cleaned bodies ---
+    def get_bodies(self, message_ids: list[str]) -> dict[str, str]:
+        with self._db_lock:
+            rows = [
+                self._db.execute(
+                    "SELECT message_id, body FROM bodies WHERE message_id = ?", (m,)
+                ).fetchone()
+                for m in message_ids
+            ]
+        return {row[0]: row[1] for row in rows if row is not None}
+
+    def put_bodies(self, bodies: dict[str, str]) -> None:
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO bodies (message_id, body) VALUES (?, ?)",
+                bodies.items(),
+            )
+
+
+_store: MailboxStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_mailbox_store() -> MailboxStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MailboxStore()
+        return _store
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TypedDict
+
+# how long a reply target read with a thread is trusted without reading the
+# thread again; history syncs and sends drop it sooner
+REPLY_TARGET_TTL_SECONDS = float(os.getenv("REPLY_TARGET_TTL_SECONDS", "120"))
+REPLY_TARGET_CACHE_SIZE = int(os.getenv("REPLY_TARGET_CACHE_SIZE", "500"))
+
+
+class ReplyTarget(TypedDict):
+    to: str
+    subject: str
+    message_id: str  # Message-ID of the message replied to, "" if it has none
+    references: str  # that message's References header
+
+
+def reply_target(thread: dict) -> ReplyTarget:
+    """
+    Prefers the latest external message.
+    Falls back to replying to self if the thread is self-only.
+    """
+    messages = thread.get("messages", [])
+    if not messages:
+        raise ValueError("Empty thread")
+
+    latest_headers: dict[str, str] | None = None
+    target_headers: dict[str, str] | None = None
+
+    for msg in reversed(messages):
+        headers = {
+            h["name"].lower(): h["value"]
+            for h in msg.get("payload", {}).get("headers", [])
+        }
+        latest_headers = headers
+
+        from_ = headers.get("from", "").lower()
+        to_ = headers.get("to", "").lower()
+
+        # Prefer replying to an external sender
+        if "me" not in (from_ + to_):
+            target_headers = headers
+            break
+
+    # Fallback: self-reply (test / notes-to-self threads)
+    if target_headers is None:
+        target_headers = latest_headers
+
+    return {
+        "to": target_headers.get("from", ""),
+        "subject": target_headers.get("subject", ""),
+        "message_id": target_headers.get("message-id", ""),
+        "references": target_headers.get("references", ""),
+    }
+
+
+class ReplyTargetCache:
+    """Reply targets by thread ID, each kept for `ttl` seconds, at most `max_size` of them."""
+
+    def __init__(
+        self,
+        ttl: float = REPLY_TARGET_TTL_SECONDS,
+        max_size: int = REPLY_TARGET_CACHE_SIZE,
+    ) -> None:
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        # thread ID -> (expiry on the monotonic clock, target)
+        self._entries: OrderedDict[str, tuple[float, ReplyTarget]] = OrderedDict()
+
+    def get(self, thread_id: str) -> ReplyTarget | None:
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[thread_id]
+                return None
+            return entry[1]
+
+    def put(self, thread_id: str, target: ReplyTarget) -> None:
+        if self._ttl <= 0 or self._max_size <= 0:
+            return
+        with self._lock:
+            self._entries[thread_id] = (time.monotonic() + self._ttl, target)
+            self._entries.move_to_end(thread_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, thread_id: str) -> None:
+        with self._lock:
+            self._entries.pop(thread_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
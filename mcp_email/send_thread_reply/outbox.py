@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from email.utils import make_msgid
+
+from mcp_email.utils import TOKEN_FILE
+
+# defaults to a file next to the OAuth token
+OUTBOX_DB_FILE = os.getenv("OUTBOX_DB_FILE", "") or os.path.join(
+    os.path.dirname(os.path.abspath(TOKEN_FILE)), "outbox.sqlite3"
+)
+# a "sending" entry is another process's until its claim is this old; the
+# process renews its claims while it sends, so only a process that stopped
+# mid-send loses them
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    idempotency_key TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    reply_text TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    gmail_id TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+"""
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+_COLUMNS = (
+    "idempotency_key", "thread_id", "reply_text", "message_id",
+    "status", "attempts", "gmail_id", "error",
+)
+
+# identifies this process's claims
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+
+class KeyConflict(ValueError):
+    """An idempotency key was reused for a different reply."""
+
+
+class Outbox:
+    """
+    Persistent queue of replies keyed by client idempotency keys.
+
+    Each reply gets its RFC 822 Message-ID when it is first queued, so a
+    reply whose send may or may not have gone through (a crash, a dropped
+    connection) can be looked up in Sent before it is sent again. A key
+    that was sent is never sent again.
+    """
+
+    def __init__(self, path: str = OUTBOX_DB_FILE) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.RLock()
+        # entries claimed by this process and not yet marked sent or failed
+        self._held: set[str] = set()
+        self._renewer: threading.Thread | None = None
+
+    def _row(self, key: str) -> dict | None:
+        row = self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM outbox WHERE idempotency_key = ?", (key,)
+        ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row is not None else None
+
+    def enqueue(self, key: str, thread_id: str, reply_text: str) -> dict:
+        """
+        Queues a reply, or returns the existing entry for `key`. A failed
+        entry is queued again. Raises KeyConflict if `key` was used for a
+        different thread or text.
+        """
+        with self._db_lock, self._db:
+            row = self._row(key)
+            if row is None:
+                self._db.execute(
+                    "INSERT INTO outbox (idempotency_key, thread_id, reply_text, message_id, status, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, thread_id, reply_text, make_msgid(), PENDING, time.time()),
+                )
+            elif (row["thread_id"], row["reply_text"]) != (thread_id, reply_text):
+                raise KeyConflict(f"idempotency key {key!r} was already used for a different reply")
+            elif row["status"] == FAILED:
+                self._db.execute(
+                    "UPDATE outbox SET status = ?, updated = ? WHERE idempotency_key = ?",
+                    (PENDING, time.time(), key),
+                )
+            return self._row(key)
+
+    def claim(self, key: str) -> dict | None:
+        """
+        Marks the entry as being sent by this process and returns it, or
+        returns None if it was sent or another call (in this process or, for
+        OUTBOX_LEASE_SECONDS after its last renewal, another one) is sending
+        it. `attempts` counts this claim.
+        """
+        now = time.time()
+        with self._db_lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE outbox SET status = ?, claimed_by = ?, attempts = attempts + 1, updated = ? "
+                "WHERE idempotency_key = ? "
+                "AND (status = ? OR (status = ? AND claimed_by IS NOT ? AND updated < ?))",
+                (SENDING, _PROCESS_TOKEN, now, key, PENDING, SENDING, _PROCESS_TOKEN, now - OUTBOX_LEASE_SECONDS),
+            )
+            if not cursor.rowcount:
+                return None
+            self._held.add(key)
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_claims, name="outbox-lease", daemon=True)
+                self._renewer.start()
+            return self._row(key)
+
+    def _renew_claims(self) -> None:
+        # well inside the lease, so a slow send never loses its claim; stops
+        # once nothing is held, and the next claim starts it again
+        while True:
+            time.sleep(OUTBOX_LEASE_SECONDS / 4)
+            with self._db_lock:
+                if not self._held:
+                    self._renewer = None
+                    return
+                with self._db:
+                    self._db.execute(
+                        "UPDATE outbox SET updated = ? WHERE status = ? AND claimed_by = ?",
+                        (time.time(), SENDING, _PROCESS_TOKEN),
+                    )
+
+    def mark_sent(self, key: str, gmail_id: str | None) -> None:
+        with self._db_lock, self._db:
+            self._held.discard(key)
+            self._db.execute(
+                "UPDATE outbox SET status = ?, gmail_id = ?, error = NULL, updated = ? "
+                "WHERE idempotency_key = ?",
+                (SENT, gmail_id, time.time(), key),
+            )
+
+    def mark_failed(self, key: str, error: str, only_if_pending: bool = False) -> None:
+        # only_if_pending: the failure happened before claiming, so leave
+        # entries another call is sending alone
+        with self._db_lock, self._db:
+            if not only_if_pending:
+                self._held.discard(key)
+            self._db.execute(
+                "UPDATE outbox SET status = ?, error = ?, updated = ? WHERE idempotency_key = ?"
+                + (" AND status = ?" if only_if_pending else ""),
+                (FAILED, error, time.time(), key) + ((PENDING,) if only_if_pending else ()),
+            )
+
+    def get(self, keys: list[str]) -> dict[str, dict]:
+        with self._db_lock:
+            rows = (self._row(key) for key in keys)
+            return {row["idempotency_key"]: row for row in rows if row is not None}
+
+
+_outbox: Outbox | None = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
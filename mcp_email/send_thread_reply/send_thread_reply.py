@@ -2,80 +2,254 @@
 from __future__ import annotations
 
 import base64
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from email.message import EmailMessage
+from email.utils import make_msgid
 
 import mcp.types as types
-from mcp_email.utils import get_gmail_service
+from mcp_email.accounts import get_threads, route_thread_id
+from mcp_email.gmail_requests import sent_message_lookup_request
+from mcp_email.gmail_scheduler import execute
+from mcp_email.mailbox_store import MailboxStore, get_mailbox_store
+from mcp_email.reply_target import ReplyTarget, reply_target
+from mcp_email.send_thread_reply.outbox import PENDING, SENDING, SENT, KeyConflict, get_outbox
 
+# sends in flight for bulk calls; the scheduler still paces them to the quota
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+# a bulk call returns after this long; unfinished replies keep sending in the
+# background and can be checked by calling again with the same keys
+OUTBOX_WAIT_SECONDS = float(os.getenv("OUTBOX_WAIT_SECONDS", "45"))
+MAX_REPLIES_PER_CALL = 100
+
+_outbox_workers = ThreadPoolExecutor(
+    max_workers=OUTBOX_WORKERS,
+    thread_name_prefix="outbox",
+)
 
-def _get_latest_reply_target(service, thread_id: str) -> tuple[str, str]:
-    """
-    Returns (to_address, subject).
 
-    Prefers the sender of the latest external message.
-    Falls back to replying to self if the thread is self-only.
+def _get_latest_reply_target(
+    service,
+    thread_id: str,
+    store: MailboxStore | None = None,
+) -> ReplyTarget:
     """
-    thread = service.users().threads().get(
-        userId="me",
-        id=thread_id,
-        format="metadata",
-    ).execute()
-
-    messages = thread.get("messages", [])
-    if not messages:
-        raise ValueError("Empty thread")
-
-    latest_headers: dict[str, str] | None = None
-
-    for msg in reversed(messages):
-        headers = {
-            h["name"].lower(): h["value"]
-            for h in msg.get("payload", {}).get("headers", [])
-        }
-        latest_headers = headers
-
-        from_ = headers.get("from", "").lower()
-        to_ = headers.get("to", "").lower()
-
-        # Prefer replying to an external sender
-        if "me" not in (from_ + to_):
-            return headers.get("from", ""), headers.get("subject", "")
-
-    # Fallback: self-reply (test / notes-to-self threads)
-    if latest_headers is None:
-        raise ValueError("No headers found in thread")
-
-    return (
-        latest_headers.get("from", ""),
-        latest_headers.get("subject", ""),
-    )
+    Returns the reply target cached when the thread was last read (e.g. by
+    create_draft_reply) if it is still fresh, otherwise reads the thread's
+    metadata.
+    """
+    store = store or get_mailbox_store()
+    target = store.reply_targets.get(thread_id)
+    if target is not None:
+        return target
+    return reply_target(store.get_thread(service, thread_id, format="metadata"))
 
 
-def send_thread_reply(arguments: dict) -> list[types.TextContent]:
-    thread_id = arguments["threadId"]
-    reply_text = arguments["replyText"]
+def _reply_targets(thread_ids: list[str]) -> dict[str, tuple[ReplyTarget | None, Exception | None]]:
+    # fresh cached targets as they are; the rest from one batch read per account
+    targets: dict[str, tuple[ReplyTarget | None, Exception | None]] = {}
+    missing = []
+    for thread_id in thread_ids:
+        try:
+            account, gmail_thread_id = route_thread_id(thread_id)
+        except ValueError:
+            missing.append(thread_id)  # get_threads reports it
+            continue
+        target = account.store().reply_targets.get(gmail_thread_id)
+        if target is not None:
+            targets[thread_id] = (target, None)
+        else:
+            missing.append(thread_id)
+
+    for thread_id, (thread, error) in zip(missing, get_threads(missing, format="metadata")):
+        if error is not None:
+            targets[thread_id] = (None, error)
+            continue
+        try:
+            targets[thread_id] = (reply_target(thread), None)
+        except ValueError as e:
+            targets[thread_id] = (None, e)
+    return targets
+
 
-    service = get_gmail_service()
+def _find_sent_message(service, rfc822_message_id: str) -> dict | None:
+    response = execute(sent_message_lookup_request(service, rfc822_message_id))
+    messages = response.get("messages", [])
+    return messages[0] if messages else None
 
+
+def _send_reply(
+    service,
+    thread_id: str,
+    reply_text: str,
+    message_id: str,
+    target: ReplyTarget | None = None,
+    store: MailboxStore | None = None,
+) -> dict:
+    store = store or get_mailbox_store()
     # Determine correct reply target + subject
-    to_address, subject = _get_latest_reply_target(service, thread_id)
+    if target is None:
+        target = _get_latest_reply_target(service, thread_id, store)
+    subject = target["subject"]
 
     email_msg = EmailMessage()
-    email_msg["To"] = to_address
+    email_msg["To"] = target["to"]
     email_msg["Subject"] = (
         subject if subject.lower().startswith("re:") else f"Re: {subject}"
     )
+    # our own Message-ID lets a retry check whether the send already went through
+    email_msg["Message-ID"] = message_id
+    # lets the recipient's client (and Gmail, with threadId) thread the reply
+    if target["message_id"]:
+        email_msg["In-Reply-To"] = target["message_id"]
+        email_msg["References"] = f"{target['references']} {target['message_id']}".strip()
     email_msg.set_content(reply_text)
 
     raw = base64.urlsafe_b64encode(email_msg.as_bytes()).decode("utf-8")
 
-    service.users().messages().send(
-        userId="me",
-        body={
-            "raw": raw,
-            "threadId": thread_id,  # ensures in-thread reply
-        },
-    ).execute()
+    sent = execute(
+        service.users().messages().send(
+            userId="me",
+            body={
+                "raw": raw,
+                "threadId": thread_id,  # ensures in-thread reply
+            },
+        ),
+        idempotent=False,
+        find_sent=lambda: _find_sent_message(service, message_id),
+    )
+
+    # the thread just gained a message; do not wait for the next history sync
+    store.invalidate_thread(thread_id)
+    return sent
+
+
+def _send_outbox_entry(
+    key: str,
+    thread_id: str,
+    targets: dict[str, tuple[ReplyTarget | None, Exception | None]],
+) -> None:
+    outbox = get_outbox()
+    target, error = targets[thread_id]
+    if error is not None:
+        # nothing can have been sent without a reply target
+        outbox.mark_failed(key, f"{type(error).__name__}: {error}", only_if_pending=True)
+        return
+
+    entry = outbox.claim(key)
+    if entry is None:
+        return
+
+    try:
+        account, gmail_thread_id = route_thread_id(thread_id)
+        service = account.service()
+
+        # an earlier attempt may have been sent without us hearing back
+        if entry["attempts"] > 1:
+            sent = _find_sent_message(service, entry["message_id"])
+            if sent is not None:
+                outbox.mark_sent(key, sent.get("id"))
+                return
+
+        sent = _send_reply(
+            service,
+            gmail_thread_id,
+            entry["reply_text"],
+            entry["message_id"],
+            target,
+            store=account.store(),
+        )
+    except Exception as e:
+        outbox.mark_failed(key, f"{type(e).__name__}: {e}")
+    else:
+        outbox.mark_sent(key, sent.get("id"))
+
+
+def _send_replies(replies: list[dict]) -> list[dict]:
+    """
+    Sends each reply at most once per idempotency key, through the
+    persistent outbox. Returns one status per reply, in order; replies
+    still sending after OUTBOX_WAIT_SECONDS are reported as pending.
+    """
+    if not replies or len(replies) > MAX_REPLIES_PER_CALL:
+        raise ValueError(f"replies must hold 1 to {MAX_REPLIES_PER_CALL} items")
+    keys = [reply["idempotencyKey"] for reply in replies]
+    if len(set(keys)) != len(keys):
+        raise ValueError("idempotencyKey values must be unique within a call")
+
+    outbox = get_outbox()
+    results: dict[str, dict] = {}
+    already_sent: set[str] = set()
+    to_send: dict[str, str] = {}  # idempotency key -> thread ID
+    for reply in replies:
+        key = reply["idempotencyKey"]
+        try:
+            entry = outbox.enqueue(key, reply["threadId"], reply["replyText"])
+        except KeyConflict as e:
+            results[key] = {"idempotencyKey": key, "threadId": reply["threadId"], "status": "rejected", "error": str(e)}
+            continue
+        if entry["status"] == SENT:
+            already_sent.add(key)
+        else:
+            to_send[key] = reply["threadId"]
+
+    if to_send:
+        targets = _reply_targets(list(dict.fromkeys(to_send.values())))
+
+        futures = [
+            _outbox_workers.submit(_send_outbox_entry, key, thread_id, targets)
+            for key, thread_id in to_send.items()
+        ]
+        wait(futures, timeout=OUTBOX_WAIT_SECONDS)
+
+    entries = outbox.get([key for key in keys if key not in results])
+    for key, entry in entries.items():
+        result = {"idempotencyKey": key, "threadId": entry["thread_id"], "status": entry["status"]}
+        if entry["status"] == SENDING:
+            result["status"] = PENDING
+        if entry["gmail_id"]:
+            result["gmailMessageId"] = entry["gmail_id"]
+        if entry["error"]:
+            result["error"] = entry["error"]
+        if key in already_sent:
+            result["duplicate"] = True
+        results[key] = result
+
+    return [results[key] for key in keys]
+
+
+def send_thread_reply(arguments: dict) -> list[types.TextContent]:
+    if "replies" in arguments:
+        results = _send_replies(list(arguments["replies"]))
+        counts: dict[str, int] = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        return [
+            types.TextContent(
+                type="text",
+                text=json.dumps({"counts": counts, "results": results}, separators=(",", ":")),
+            )
+        ]
+
+    thread_id = arguments["threadId"]
+    reply_text = arguments["replyText"]
+
+    if "idempotencyKey" in arguments:
+        result = _send_replies(
+            [{"threadId": thread_id, "replyText": reply_text, "idempotencyKey": arguments["idempotencyKey"]}]
+        )[0]
+        if result["status"] != SENT:
+            raise RuntimeError(f"Reply {result['status']}: {result.get('error', 'still sending')}")
+        return [
+            types.TextContent(
+                type="text",
+                text="Reply already sent" if result.get("duplicate") else "Reply sent successfully",
+            )
+        ]
+
+    account, gmail_thread_id = route_thread_id(thread_id)
+    _send_reply(account.service(), gmail_thread_id, reply_text, make_msgid(), store=account.store())
 
     return [
         types.TextContent(
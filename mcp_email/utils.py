@@ -1,8 +1,15 @@
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.http import HttpRequest
 from google.auth.transport.requests import Request
+from datetime import datetime, timedelta, timezone
 import os
+import tempfile
+import threading
+
+from mcp_email.gmail_scheduler import get_scheduler, is_retryable, quota_units
+from mcp_email.gmail_transport import PooledHttp
+from mcp_email.instrumentation import STATS_ENABLED, record_value, span
 
 SCOPES = [
     "https://www.googleapis.com/auth/gmail.readonly",
@@ -12,24 +19,214 @@ SCOPES = [
 TOKEN_FILE = os.getenv("TOKEN_FILE", "")
 CLIENT_SECRET_FILE = os.getenv("CLIENT_SECRET_FILE", "")
 
+# "gmail_api" (default) or "imap" (see get_unread_emails/imap_backend.py)
+MAIL_BACKEND = os.getenv("MAIL_BACKEND", "gmail_api").lower()
 
-def get_gmail_service():
+# Gmail accepts up to 100 calls per batch but recommends staying at or below 50
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+
+
+# refresh the access token this long before it actually expires
+TOKEN_REFRESH_MARGIN = timedelta(
+    seconds=int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+)
+
+
+def _write_token_file(creds: Credentials, token_file: str = TOKEN_FILE) -> None:
+    # write to a temp file in the same directory, then swap it in atomically
+    # so a crash mid-write never leaves a truncated token behind
+    directory = os.path.dirname(os.path.abspath(token_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(creds.to_json())
+        os.replace(tmp_path, token_file)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _load_credentials(
+    token_file: str = TOKEN_FILE,
+    client_secret_file: str = CLIENT_SECRET_FILE,
+) -> Credentials:
     creds = None
 
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+    if os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file, SCOPES)
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
+            # only needed for the one-time browser sign-in
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
             flow = InstalledAppFlow.from_client_secrets_file(
-                CLIENT_SECRET_FILE,
+                client_secret_file,
                 SCOPES,
             )
             creds = flow.run_local_server(port=0)
 
-        with open(TOKEN_FILE, "w") as f:
-            f.write(creds.to_json())
+        _write_token_file(creds, token_file)
+
+    return creds
+
+
+def _count_response_bytes(postproc, method_id: str | None):
+    # postproc also runs for each part of a batch, so batched calls are counted too
+    name = f"{method_id or 'gmail.unknown'}.response_bytes"
+
+    def _postproc(resp, content):
+        record_value(name, len(content or b""))
+        return postproc(resp, content)
+
+    return _postproc
+
+
+def _build_request(http, postproc, *args, **kwargs) -> HttpRequest:
+    if STATS_ENABLED:
+        postproc = _count_response_bytes(postproc, kwargs.get("methodId"))
+    return HttpRequest(http, postproc, *args, **kwargs)
+
+
+class _GmailServiceHolder:
+    """
+    Gmail client for the account whose token is in `token_file`.
+
+    Credentials are read from disk and the client is built (from the static
+    discovery document) once; after that, calls only check the in-memory
+    token expiry and refresh it shortly before it runs out. The client
+    sends its requests through a PooledHttp, so it can be shared by all
+    worker threads.
+    """
+
+    def __init__(self, token_file: str = TOKEN_FILE, client_secret_file: str = CLIENT_SECRET_FILE) -> None:
+        self._token_file = token_file
+        self._client_secret_file = client_secret_file
+        self._lock = threading.Lock()
+        self._creds: Credentials | None = None
+        self._http: PooledHttp | None = None
+        self._service = None
+
+    def _expires_soon(self) -> bool:
+        expiry = self._creds.expiry  # naive UTC, as stored by google-auth
+        if expiry is None:
+            return False
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return expiry - now <= TOKEN_REFRESH_MARGIN
+
+    def get(self):
+        with self._lock:
+            if self._service is None:
+                with span("gmail.client.build"):
+                    self._creds = _load_credentials(self._token_file, self._client_secret_file)
+                    self._http = PooledHttp(self._creds)
+                    self._service = build(
+                        "gmail",
+                        "v1",
+                        http=self._http,
+                        requestBuilder=_build_request,
+                        static_discovery=True,
+                        cache_discovery=False,
+                    )
+            elif self._creds is not None and self._creds.refresh_token and self._expires_soon():
+                # the pool holds this same credentials object, so refreshing
+                # it in place updates the token used by every connection
+                with span("gmail.auth.refresh"):
+                    self._creds.refresh(Request())
+                    _write_token_file(self._creds, self._token_file)
+
+            return self._service
+
+    def _close_http(self) -> None:
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._close_http()
+            self._creds = None
+            self._service = None
+
+    def install(self, service) -> None:
+        with self._lock:
+            self._close_http()
+            self._creds = None
+            self._service = service
+
+
+# the default account (see accounts.py)
+_service_holder = _GmailServiceHolder()
+
+
+def get_gmail_service():
+    return _service_holder.get()
+
+
+def set_gmail_service(service) -> None:
+    """
+    Makes get_gmail_service() return `service` (e.g. the replaying fake in
+    benchmarks/fake_gmail.py); None goes back to the real client.
+    """
+    _service_holder.install(service)
+
+
+def warm_up_gmail_service() -> None:
+    """Loads credentials and builds the Gmail client before the first tool call."""
+    _service_holder.get()
+
+
+def execute_batched(
+    service,
+    requests: list,
+    batch_size: int = GMAIL_BATCH_SIZE,
+) -> list[tuple[dict | None, Exception | None]]:
+    """
+    Executes Gmail API requests as batch HTTP requests of up to `batch_size`
+    calls each, one round trip per batch.
+
+    Returns one (response, error) pair per request, in request order.
+    Sub-requests fail independently: a failing call only sets its own error.
+    Calls that fail with a throttling or transient error are retried in a
+    later batch, with backoff, through the shared scheduler.
+    """
+    results: list[tuple[dict | None, Exception | None]] = [
+        (None, None) for _ in requests
+    ]
+    batch_size = max(1, min(batch_size, 100))
+    scheduler = get_scheduler()
+
+    def _callback(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+
+    pending = list(range(len(requests)))
+    attempt = 0
+    while pending:
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=_callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+
+            # each call in a batch counts against the quota on its own
+            scheduler.acquire(sum(quota_units(requests[index]) for index in chunk))
+            try:
+                with span("gmail.batch", calls=len(chunk)):
+                    batch.execute()
+            except Exception as e:
+                # the whole round trip failed: every call in this chunk failed with it
+                for index in chunk:
+                    results[index] = (None, e)
+
+        retry = [index for index in pending if results[index][1] is not None and is_retryable(results[index][1])]
+        if not retry or attempt >= scheduler.max_retries:
+            break
+
+        # the longest Retry-After among the failures applies to all of them
+        scheduler.sleep(max(scheduler.backoff(attempt, results[index][1]) for index in retry))
+        pending = retry
+        attempt += 1
 
-    return build("gmail", "v1", credentials=creds)
+    return results
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import tempfile
+
+# the real mailbox and outbox databases must never see test data, and the
+# scheduler must not pace or back off for long; this has to happen before
+# mcp_email is imported
+_TMP_DIR = tempfile.mkdtemp(prefix="mcp-email-tests-")
+os.environ["MAILBOX_DB_FILE"] = os.path.join(_TMP_DIR, "mailbox.sqlite3")
+os.environ["OUTBOX_DB_FILE"] = os.path.join(_TMP_DIR, "outbox.sqlite3")
+os.environ["BODY_CACHE_SIZE"] = "0"
+os.environ["GMAIL_QUOTA_UNITS_PER_SECOND"] = "1000000"
+os.environ["GMAIL_BACKOFF_BASE_SECONDS"] = "0.001"
+
+import pytest  # noqa: E402
+
+from benchmarks.fake_gmail import _request_key, build_replay_service  # noqa: E402
+from mcp_email import accounts, mailbox_store  # noqa: E402
+from mcp_email.accounts import Account, _DefaultAccount  # noqa: E402
+from mcp_email.get_unread_emails import unread_index  # noqa: E402
+from mcp_email.utils import set_gmail_service  # noqa: E402
+from imap_standin import ImapStandIn  # noqa: E402
+
+
+class FakeMailbox:
+    """
+    Collects ReplayHttp fixture entries for requests made with the
+    gmail_requests builders, then serves them from a replaying client.
+    """
+
+    def __init__(self) -> None:
+        # only used to build requests; never executed
+        self.builder, _ = build_replay_service({"entries": []})
+        self.entries: list[dict] = []
+
+    def add(self, request, body, status: int = 200, drop: tuple[str, ...] = ()) -> None:
+        self.entries.append(
+            {"request": _request_key(request.method, request.uri, drop), "status": status, "body": body}
+        )
+
+    def service(self):
+        """Returns (service, traffic)."""
+        return build_replay_service({"entries": self.entries})
+
+
+@pytest.fixture
+def mailbox() -> FakeMailbox:
+    return FakeMailbox()
+
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    """
+    Makes the tools use a FakeMailbox's fixtures, with an empty mailbox
+    store and unread index; returns the traffic counters.
+    """
+
+    def serve_(fake: FakeMailbox):
+        service, traffic = fake.service()
+        monkeypatch.setattr(
+            mailbox_store, "_store", mailbox_store.MailboxStore(str(tmp_path / "served.sqlite3"))
+        )
+        monkeypatch.setattr(unread_index, "_index", None)
+        set_gmail_service(service)
+        return traffic
+
+    yield serve_
+    set_gmail_service(None)
+
+
+@pytest.fixture
+def two_accounts(tmp_path, monkeypatch, serve, mailbox):
+    """
+    The default account and "work", each over its own FakeMailbox; call
+    with the mailboxes filled in. Returns both accounts' traffic counters.
+    """
+    work = FakeMailbox()
+
+    def install():
+        default_traffic = serve(mailbox)
+        service, work_traffic = work.service()
+        account = Account("work", token_file="", db_file=str(tmp_path / "work.sqlite3"))
+        account._service_holder.install(service)
+        monkeypatch.setattr(accounts, "_accounts", {"default": _DefaultAccount("default"), "work": account})
+        return default_traffic, work_traffic
+
+    return mailbox, work, install
+
+
+@pytest.fixture
+def imap_server():
+    server = ImapStandIn()
+    yield server
+    server.close()
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import email
+import imaplib
+import re
+import socket
+import socketserver
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, make_msgid, parsedate_to_datetime
+
+from mcp_email.get_unread_emails.utils import _connect_and_select_gmail_inbox
+
+_FETCH_RE = re.compile(rb"^(?:UID )?FETCH (\S+) \((.*)\)$", re.IGNORECASE)
+_HEADER_FIELDS = b"BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)]"
+_AFTER_RE = re.compile(r"after:(\d{4}/\d{2}/\d{2})")
+
+
+class StandInMessage:
+    def __init__(self, uid: int, raw: bytes, thread_id: int, message_id: int, seen: bool) -> None:
+        self.uid = uid
+        self.raw = raw
+        self.thread_id = thread_id
+        self.message_id = message_id
+        self.seen = seen
+        parsed = email.message_from_bytes(raw)
+        self.headers = parsed
+        self.date = parsedate_to_datetime(parsed["Date"]) if parsed["Date"] else datetime.now(timezone.utc)
+
+
+def make_message(sender: str, subject: str, body: str = "Hello", date: datetime | None = None) -> bytes:
+    date = date or datetime.now(timezone.utc)
+    return (
+        f"From: {sender}\r\nTo: Me <me@example.com>\r\nSubject: {subject}\r\n"
+        f"Date: {format_datetime(date)}\r\nMessage-ID: {make_msgid()}\r\n\r\n{body}\r\n"
+    ).encode()
+
+
+class _Session(socketserver.StreamRequestHandler):
+    # responses go out in several writes; with Nagle on, each command
+    # would wait out the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    server: "ImapStandIn"
+
+    def setup(self) -> None:
+        super().setup()
+        self._write_lock = threading.Lock()
+        self.server._sessions_opened(self)
+
+    def finish(self) -> None:
+        self.server._session_closed(self)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def write(self, data: bytes) -> None:
+        with self._write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def handle(self) -> None:
+        try:
+            self.write(b"* OK IMAP stand-in ready\r\n")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                tag, _, command = line.rstrip(b"\r\n").partition(b" ")
+                name = command.split(b" ", 1)[0].decode("ascii", "replace").lower()
+                self.server._count(command)
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                if not getattr(self, "_do_" + name, self._do_unknown)(tag, command):
+                    return
+        except OSError:
+            # the client went away (or drop_connections closed the socket)
+            return
+
+    def _ok(self, tag: bytes, text: bytes = b"completed") -> bool:
+        self.write(tag + b" OK " + text + b"\r\n")
+        return True
+
+    def _do_unknown(self, tag: bytes, command: bytes) -> bool:
+        self.write(tag + b" BAD unknown command\r\n")
+        return True
+
+    def _do_capability(self, tag: bytes, command: bytes) -> bool:
+        capabilities = b"IMAP4rev1" + (b" IDLE" if self.server.idle else b"")
+        self.write(b"* CAPABILITY " + capabilities + b"\r\n")
+        return self._ok(tag)
+
+    def _do_login(self, tag: bytes, command: bytes) -> bool:
+        self.server._count_login()
+        return self._ok(tag, b"LOGIN completed")
+
+    def _do_select(self, tag: bytes, command: bytes) -> bool:
+        self.write(
+            b"* FLAGS (\\Seen)\r\n"
+            + b"* %d EXISTS\r\n" % len(self.server.messages())
+            + b"* 0 RECENT\r\n* OK [UIDVALIDITY 1] UIDs valid\r\n"
+        )
+        return self._ok(tag, b"[READ-WRITE] SELECT completed")
+
+    def _do_noop(self, tag: bytes, command: bytes) -> bool:
+        return self._ok(tag)
+
+    def _do_logout(self, tag: bytes, command: bytes) -> bool:
+        self.write(b"* BYE logging out\r\n")
+        self._ok(tag)
+        return False
+
+    def _do_idle(self, tag: bytes, command: bytes) -> bool:
+        if not self.server.idle:
+            return self._do_unknown(tag, command)
+        self.write(b"+ idling\r\n")
+        self.server._idling(self, True)
+        try:
+            line = self.rfile.readline()
+        finally:
+            self.server._idling(self, False)
+        if not line:
+            return False
+        if line.strip().upper() != b"DONE":
+            self.write(tag + b" BAD expected DONE\r\n")
+            return True
+        return self._ok(tag, b"IDLE terminated")
+
+    def _do_search(self, tag: bytes, command: bytes) -> bool:
+        # by sequence number, as _fetch_and_parse_email's callers use it
+        try:
+            uids = set(self.server.search(command.split(b" ", 1)[1].decode()))
+        except (IndexError, ValueError):
+            self.write(tag + b" BAD invalid search criteria\r\n")
+            return True
+        seqs = [seq for seq, message in enumerate(self.server.messages(), 1) if message.uid in uids]
+        self.write(b"* SEARCH" + b"".join(b" %d" % seq for seq in seqs) + b"\r\n")
+        return self._ok(tag)
+
+    def _do_fetch(self, tag: bytes, command: bytes) -> bool:
+        match = _FETCH_RE.match(command)
+        if not match:
+            return self._do_unknown(tag, command)
+        seqs = _number_set(match.group(1).decode())
+        fetched = [(seq, m) for seq, m in enumerate(self.server.messages(), 1) if seq in seqs]
+        self.write(b"".join(_fetch_response(seq, message, match.group(2).upper()) for seq, message in fetched))
+        return self._ok(tag)
+
+    def _do_uid(self, tag: bytes, command: bytes) -> bool:
+        args = command.split(b" ", 1)[1]
+        sub = args.split(b" ", 1)[0].upper()
+        if sub == b"SEARCH":
+            try:
+                uids = self.server.search(args.split(b" ", 1)[1].decode())
+            except (IndexError, ValueError):
+                self.write(tag + b" BAD invalid search criteria\r\n")
+                return True
+            self.write(b"* SEARCH" + b"".join(b" %d" % uid for uid in uids) + b"\r\n")
+            return self._ok(tag)
+        match = _FETCH_RE.match(command)
+        if sub == b"FETCH" and match:
+            items = match.group(2).upper()
+            fetched = self.server.fetch(match.group(1).decode())
+            self.write(b"".join(_fetch_response(seq, message, items) for seq, message in fetched))
+            return self._ok(tag)
+        return self._do_unknown(tag, command)
+
+
+def _fetch_response(seq: int, message: StandInMessage, items: bytes) -> bytes:
+    parts = [b"UID %d" % message.uid]
+    if b"X-GM-THRID" in items:
+        parts.append(b"X-GM-THRID %d" % message.thread_id)
+    if b"X-GM-MSGID" in items:
+        parts.append(b"X-GM-MSGID %d" % message.message_id)
+    literal = None
+    if _HEADER_FIELDS in items:
+        literal = b"".join(
+            f"{name}: {message.headers[name]}\r\n".encode() for name in ("From", "Subject") if message.headers[name]
+        ) + b"\r\n"
+        parts.append(b"BODY[HEADER.FIELDS (FROM SUBJECT)] {%d}" % len(literal))
+    elif b"BODY.PEEK[]" in items:
+        literal = message.raw
+        parts.append(b"BODY[] {%d}" % len(literal))
+    if literal is None:
+        return b"* %d FETCH (%s)\r\n" % (seq, b" ".join(parts))
+    return b"* %d FETCH (%s\r\n%s)\r\n" % (seq, b" ".join(parts), literal)
+
+
+def _number_set(value: str) -> set[int]:
+    uids: set[int] = set()
+    for item in value.split(","):
+        low, _, high = item.partition(":")
+        uids.update(range(int(low), int(high or low) + 1))
+    return uids
+
+
+class ImapStandIn(socketserver.ThreadingTCPServer):
+    """
+    In-process IMAP server on 127.0.0.1 for the IMAP backend and IDLE
+    watcher: LOGIN, SELECT, NOOP, LOGOUT, IDLE, SEARCH / FETCH and UID
+    SEARCH / UID FETCH with the Gmail X-GM-RAW, X-GM-THRID and X-GM-MSGID
+    extensions. It counts logins and commands, can drop every open
+    connection, and can add `latency` seconds to every command, as a
+    network round trip would.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, idle: bool = True, latency: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), _Session)
+        self.idle = idle
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._messages: list[StandInMessage] = []
+        self._sessions: set[_Session] = set()
+        self._idlers: set[_Session] = set()
+        self._idle_changed = threading.Condition(self._lock)
+        self.logins = 0
+        self.idles = 0
+        self.commands: list[str] = []
+        threading.Thread(
+            target=self.serve_forever, args=(0.05,), name="imap-stand-in", daemon=True
+        ).start()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def connect(self) -> imaplib.IMAP4:
+        """A logged-in connection with INBOX selected, as the backend makes them."""
+        return _connect_and_select_gmail_inbox(
+            "me@example.com", "secret", host="127.0.0.1", port=self.port, use_ssl=False
+        )
+
+    def close(self) -> None:
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+
+    # mailbox
+
+    def deliver(self, raw: bytes, thread_id: int | None = None, seen: bool = False) -> int:
+        """Adds a message to INBOX and tells idling clients; returns its UID."""
+        with self._lock:
+            uid = (self._messages[-1].uid if self._messages else 0) + 1
+            self._messages.append(
+                StandInMessage(uid, raw, thread_id if thread_id is not None else 1000 + uid, 5000 + uid, seen)
+            )
+            count = len(self._messages)
+            idlers = list(self._idlers)
+        for session in idlers:
+            self._push(session, b"* %d EXISTS\r\n" % count)
+        return uid
+
+    def mark_seen(self, uid: int) -> None:
+        with self._lock:
+            seq, message = next((n, m) for n, m in enumerate(self._messages, 1) if m.uid == uid)
+            message.seen = True
+            idlers = list(self._idlers)
+        for session in idlers:
+            self._push(session, b"* %d FETCH (FLAGS (\\Seen))\r\n" % seq)
+
+    def messages(self) -> list[StandInMessage]:
+        with self._lock:
+            return list(self._messages)
+
+    def search(self, criteria: str) -> list[int]:
+        # the criteria imap_backend sends: X-GM-RAW "is:unread ... after:Y/m/d",
+        # UNSEEN SINCE d-b-Y, or X-GM-THRID n
+        words = criteria.split()
+        unseen, since, thread_id = False, None, None
+        if words[0].upper() == "X-GM-RAW":
+            unseen = "is:unread" in criteria
+            after = _AFTER_RE.search(criteria)
+            since = datetime.strptime(after.group(1), "%Y/%m/%d").date() if after else None
+        elif words[0].upper() == "X-GM-THRID":
+            thread_id = int(words[1])
+        else:
+            unseen = "UNSEEN" in (word.upper() for word in words)
+            if "SINCE" in (word.upper() for word in words):
+                since = datetime.strptime(words[[w.upper() for w in words].index("SINCE") + 1], "%d-%b-%Y").date()
+        return [
+            m.uid
+            for m in self.messages()
+            if (not unseen or not m.seen)
+            and (since is None or m.date.date() >= since)
+            and (thread_id is None or m.thread_id == thread_id)
+        ]
+
+    def fetch(self, uid_set: str) -> list[tuple[int, StandInMessage]]:
+        uids = _number_set(uid_set)
+        return [(seq, m) for seq, m in enumerate(self.messages(), 1) if m.uid in uids]
+
+    # connections
+
+    def _sessions_opened(self, session: _Session) -> None:
+        with self._lock:
+            self._sessions.add(session)
+
+    def _session_closed(self, session: _Session) -> None:
+        with self._lock:
+            self._sessions.discard(session)
+            self._idlers.discard(session)
+
+    def _count_login(self) -> None:
+        with self._lock:
+            self.logins += 1
+
+    def _count(self, command: bytes) -> None:
+        words = command.split(b" ", 2)
+        name = b" ".join(words[:2]) if words[0].upper() == b"UID" else words[0]
+        with self._lock:
+            self.commands.append(name.decode("ascii", "replace").upper())
+
+    def _idling(self, session: _Session, idling: bool) -> None:
+        with self._lock:
+            if idling:
+                self._idlers.add(session)
+                self.idles += 1
+                self._idle_changed.notify_all()
+            else:
+                self._idlers.discard(session)
+
+    def wait_for_idle(self, count: int = 1, timeout: float = 5) -> None:
+        """Waits until clients have entered IDLE `count` times in all."""
+        with self._lock:
+            if not self._idle_changed.wait_for(lambda: self.idles >= count, timeout):
+                raise TimeoutError(f"IDLE entered {self.idles} of {count} times")
+
+    def _push(self, session: _Session, data: bytes) -> None:
+        try:
+            session.write(data)
+        except OSError:
+            pass
+
+    def drop_connections(self) -> None:
+        """Closes every client connection, as a server restart would."""
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            try:
+                session.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import base64
+import time
+from datetime import datetime, timezone
+from email.parser import Parser
+
+import pytest
+
+from conftest import FakeMailbox
+from mcp_email.accounts import _DefaultAccount, get_threads, route_thread_id
+from mcp_email.get_unread_emails.get_unread_emails import _decode_cursor, get_unread_emails
+from mcp_email.get_unread_emails.unread_index import unread_query
+from mcp_email.gmail_requests import list_messages_request, message_summary_request, profile_request, thread_request
+from mcp_email.mailbox_store import MAILBOX_DB_FILE
+from mcp_email.send_thread_reply.send_thread_reply import send_thread_reply
+
+
+def _inbox(mailbox: FakeMailbox, threads: list[tuple[str, int]]) -> None:
+    """Unread threads as (thread ID, internalDate), newest first."""
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "100"})
+    mailbox.add(
+        list_messages_request(b, unread_query(datetime.now(timezone.utc)), max_results=500),
+        {"messages": [{"id": "m" + thread_id, "threadId": thread_id} for thread_id, _ in threads]},
+        drop=("q",),
+    )
+    for thread_id, internal_date in threads:
+        mailbox.add(
+            message_summary_request(b, "m" + thread_id),
+            {"id": "m" + thread_id, "threadId": thread_id, "internalDate": str(internal_date), "payload": {"headers": []}},
+        )
+
+
+def _thread(mailbox: FakeMailbox, thread_id: str, sender: str) -> None:
+    # the store reads the history ID before its first thread
+    mailbox.add(profile_request(mailbox.builder), {"historyId": "100"})
+    mailbox.add(
+        thread_request(mailbox.builder, thread_id, format="metadata"),
+        {
+            "id": thread_id,
+            "historyId": "100",
+            "messages": [
+                {
+                    "id": "m" + thread_id,
+                    "payload": {
+                        "headers": [
+                            {"name": "From", "value": sender},
+                            {"name": "To", "value": "Me <me@example.com>"},
+                            {"name": "Subject", "value": f"about {thread_id}"},
+                            {"name": "Message-ID", "value": f"<{thread_id}@example.com>"},
+                        ]
+                    },
+                }
+            ],
+        },
+    )
+
+
+def _page(arguments: dict) -> tuple[list[str], str, str | None]:
+    text = get_unread_emails(arguments)[0].text
+    thread_ids = [
+        line.split("thread_id=", 1)[1].split(" | ", 1)[0]
+        for line in text.splitlines()
+        if line.startswith("thread_id=")
+    ]
+    cursor = text.rsplit("next_cursor=", 1)[1] if "next_cursor=" in text else None
+    return thread_ids, text, cursor
+
+
+def test_default_account_has_the_base_attributes():
+    account = _DefaultAccount("default")
+    assert account.name == "default"
+    assert account._db_file == MAILBOX_DB_FILE
+    assert account._store is None and account._index is None
+
+
+def test_unread_mail_is_merged_newest_first(two_accounts):
+    default, work, install = two_accounts
+    now = int(time.time() * 1000)
+    _inbox(default, [("d1", now - 1000), ("d2", now - 3000)])
+    _inbox(work, [("w1", now - 2000), ("w2", now - 4000)])
+    install()
+
+    first, _, cursor = _page({"limit": 3})
+    assert first == ["default:d1", "work:w1", "default:d2"]
+
+    # the default account is done; work continues after w1
+    before, _, _ = _decode_cursor(cursor)
+    assert before == {"work": (now - 2000, "w1")}
+
+    second, _, cursor = _page({"limit": 3, "cursor": cursor})
+    assert second == ["work:w2"]
+    assert cursor is None
+
+
+def test_listing_selected_accounts(two_accounts):
+    default, work, install = two_accounts
+    now = int(time.time() * 1000)
+    _inbox(default, [("d1", now - 1000)])
+    _inbox(work, [("w1", now - 2000)])
+    default_traffic, _ = install()
+
+    assert _page({"accounts": ["work"]})[0] == ["work:w1"]
+    assert default_traffic.api_calls == 0
+
+
+def test_a_failing_account_does_not_hide_the_others(two_accounts):
+    default, work, install = two_accounts
+    now = int(time.time() * 1000)
+    _inbox(default, [("d1", now - 1000)])
+    # nothing recorded for work: every call gets a 404
+    install()
+
+    thread_ids, text, _ = _page({})
+    assert thread_ids == ["default:d1"]
+    assert "account work could not be listed: HttpError" in text
+
+
+def test_threads_are_fetched_from_their_own_account(two_accounts):
+    default, work, install = two_accounts
+    _thread(default, "t1", "Alice <alice@example.com>")
+    _thread(work, "t1", "Bob <bob@example.com>")
+    install()
+
+    results = get_threads(["work:t1", "default:t1", "t1", "home:t1"], format="metadata")
+
+    senders = [
+        thread["messages"][0]["payload"]["headers"][0]["value"] if thread else None for thread, _ in results
+    ]
+    assert senders == ["Bob <bob@example.com>", "Alice <alice@example.com>", "Alice <alice@example.com>", None]
+    assert "Unknown account: home" in str(results[3][1])
+
+
+def test_reply_is_sent_from_the_owning_account(two_accounts):
+    default, work, install = two_accounts
+    _thread(work, "w1", "Bob <bob@example.com>")
+    work.add(
+        work.builder.users().messages().send(userId="me", body={}),
+        {"id": "sent1", "threadId": "w1"},
+    )
+    default_traffic, work_traffic = install()
+
+    assert route_thread_id("work:w1")[0].name == "work"
+    send_thread_reply({"threadId": "work:w1", "replyText": "Thanks Bob"})
+
+    assert default_traffic.api_calls == 0 and default_traffic.sent == []
+    [sent] = work_traffic.sent
+    headers = Parser().parsestr(base64.urlsafe_b64decode(sent["raw"]).decode(), headersonly=True)
+    assert sent["threadId"] == "w1"
+    assert headers["To"] == "Bob <bob@example.com>"
+    assert headers["In-Reply-To"] == "<w1@example.com>"
+
+
+def test_unknown_account_is_rejected(two_accounts):
+    *_, install = two_accounts
+    install()
+    with pytest.raises(ValueError, match="Unknown account: home"):
+        route_thread_id("home:t1")
+    with pytest.raises(ValueError, match="Unknown account: home"):
+        send_thread_reply({"threadId": "home:t1", "replyText": "?"})
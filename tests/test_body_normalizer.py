@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import pytest
+
+from benchmarks.body_normalizer import DEFAULT_FIXTURES, _fixture_bodies, previous_clean_body
+from mcp_email.create_draft_reply import body_normalizer
+from mcp_email.create_draft_reply.body_normalizer import normalize_body, normalize_body_cached
+
+_BODIES = [
+    "Hello,\n\nsee you  tomorrow.\n\n-- \nAlice",
+    # quoted-printable: soft line breaks and encoded bytes
+    "Caf=C3=A9 au lait, the meeting is=\n moved to 3pm.=20\n",
+    # "=" that is not quoted-printable
+    "x = 1 and y == 2, a=b",
+    # non-ASCII text, which quopri rejects
+    "Réunion à 10h — ça marche? “Oui” ≥ 2 =C3",
+    # links, URLs and addresses
+    "Read [the report](https://example.com/r?id=1) or [this]( ) at https://example.com, mail bob@example.com",
+    "[a](b) [c](d)   [e](f)\n\n\n[g](h",
+    "trailing spaces   \nand\ttabs\t\t\nand\r\nCRLF\r\n",
+    "",
+    "   ",
+]
+
+
+@pytest.mark.parametrize("text", _BODIES)
+def test_normalize_body_matches_previous_implementation(text):
+    assert normalize_body(text) == previous_clean_body(text)
+
+
+def test_normalize_body_matches_previous_implementation_on_fixtures():
+    bodies = _fixture_bodies(DEFAULT_FIXTURES)
+    assert bodies
+    assert [normalize_body(b) for b in bodies] == [previous_clean_body(b) for b in bodies]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    calls: list[str] = []
+
+    def counting(text: str) -> str:
+        calls.append(text)
+        return text.upper()
+
+    monkeypatch.setattr(body_normalizer, "BODY_CACHE_SIZE", 2)
+    monkeypatch.setattr(body_normalizer, "_cache", body_normalizer._BodyCache(2))
+    monkeypatch.setattr(body_normalizer, "normalize_body", counting)
+    return calls
+
+
+def test_cached_normalizes_each_message_and_text_once(cache):
+    assert normalize_body_cached("a", "m1") == "A"
+    assert normalize_body_cached("a", "m1") == "A"
+    assert cache == ["a"]
+
+    # another message, or the same message with other text, is a miss
+    normalize_body_cached("a", "m2")
+    normalize_body_cached("b", "m1")
+    assert cache == ["a", "a", "b"]
+
+
+def test_cached_evicts_least_recently_used(cache):
+    normalize_body_cached("a", "m1")
+    normalize_body_cached("b", "m2")
+    normalize_body_cached("a", "m1")
+    normalize_body_cached("c", "m3")  # evicts m2
+    normalize_body_cached("a", "m1")
+    normalize_body_cached("b", "m2")
+    assert cache == ["a", "b", "c", "b"]
+
+
+def test_cache_size_zero_disables_the_cache(cache, monkeypatch):
+    monkeypatch.setattr(body_normalizer, "BODY_CACHE_SIZE", 0)
+    normalize_body_cached("a", "m1")
+    normalize_body_cached("a", "m1")
+    assert cache == ["a", "a"]
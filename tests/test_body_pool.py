@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import base64
+import operator
+from functools import partial
+
+import pytest
+
+from mcp_email.create_draft_reply import body_pool
+from mcp_email.create_draft_reply.body_pool import (
+    call_in_body_pool,
+    map_in_body_pool,
+    use_body_pool,
+    warm_up_body_pool,
+)
+from mcp_email.create_draft_reply.create_draft_reply import _decode_message_text, _fetch_thread_context
+from mcp_email.mailbox_store import MailboxStore
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    monkeypatch.setattr(body_pool, "BODY_POOL_WORKERS", 2)
+    yield
+    body_pool.shutdown_body_pool()
+
+
+def test_pool_is_used_from_the_threshold_on(monkeypatch):
+    monkeypatch.setattr(body_pool, "BODY_POOL_WORKERS", 2)
+    monkeypatch.setattr(body_pool, "BODY_POOL_MIN_MESSAGES", 3)
+    assert [use_body_pool(n) for n in (0, 2, 3, 50)] == [False, False, True, True]
+
+    monkeypatch.setattr(body_pool, "BODY_POOL_WORKERS", 0)
+    assert not use_body_pool(50)
+
+
+def test_map_keeps_input_order(workers):
+    assert map_in_body_pool(operator.mul, range(200), range(200)) == [n * n for n in range(200)]
+    assert map_in_body_pool(operator.neg, []) == []
+
+
+def _payload(n: int) -> dict:
+    html = f"<p>Message <b>{n}</b></p><ul><li>one</li><li>two</li></ul>"
+    return {"mimeType": "text/html", "body": {"data": base64.urlsafe_b64encode(html.encode()).decode()}}
+
+
+def test_partials_are_called_in_the_workers(workers):
+    decoders = [partial(_decode_message_text, _payload(n)) for n in range(30)]
+    assert call_in_body_pool(decoders) == [decode() for decode in decoders]
+
+
+def test_broken_pool_falls_back_to_inline(workers):
+    warm_up_body_pool()
+    pool = body_pool._pool
+    for process in list(pool._processes.values()):
+        process.kill()
+        process.join()
+
+    assert map_in_body_pool(operator.neg, [1, 2, 3]) == [-1, -2, -3]
+    # the broken pool was dropped; the next call starts a new one
+    assert body_pool._pool is None
+    assert map_in_body_pool(operator.neg, [4]) == [-4]
+    assert body_pool._pool is not pool
+
+
+def _thread(count: int) -> dict:
+    return {
+        "id": "t1",
+        "historyId": "100",
+        "messages": [
+            {
+                "id": f"m{n}",
+                "payload": {
+                    "headers": [{"name": "From", "value": "Alice <alice@example.com>"}],
+                    "parts": [_payload(n)],
+                },
+            }
+            for n in range(count)
+        ],
+    }
+
+
+def test_pooled_thread_context_matches_inline(workers, monkeypatch, tmp_path):
+    thread = _thread(8)
+
+    monkeypatch.setattr(body_pool, "BODY_POOL_MIN_MESSAGES", 1000)
+    inline = _fetch_thread_context(None, "t1", thread=thread, store=MailboxStore(str(tmp_path / "inline.sqlite3")))
+
+    monkeypatch.setattr(body_pool, "BODY_POOL_MIN_MESSAGES", 2)
+    pooled = _fetch_thread_context(None, "t1", thread=thread, store=MailboxStore(str(tmp_path / "pooled.sqlite3")))
+
+    assert body_pool._pool is not None
+    assert pooled == inline
+    assert [m["body"] for m in inline][:2] == ["Message 0 one two", "Message 1 one two"]
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import base64
+import json
+from email import message_from_bytes
+from email.message import EmailMessage
+from email.mime.text import MIMEText
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from mcp_email import instrumentation
+from mcp_email.create_draft_reply import create_draft_reply
+from mcp_email.create_draft_reply.create_draft_reply import (
+    _MIN_TRUNCATED_CHARS,
+    MAX_THREADS_PER_CALL,
+    _apply_char_budget,
+    _create_draft_reply,
+    _extract_body_from_mime,
+    _fetch_thread_context,
+    _text_from_raw,
+)
+from mcp_email.gmail_requests import profile_request, raw_message_requests, thread_request
+from mcp_email.instrumentation import reset_stats, stats_snapshot
+from mcp_email.utils import get_gmail_service
+
+
+def _thread(count: int, body_chars: int = 1000) -> list[dict]:
+    # external and own messages alternating, the last one external
+    return [
+        {
+            "index": i,
+            "from_": "Alice <alice@example.com>" if (count - 1 - i) % 2 == 0 else "Me <me@example.com>",
+            "role": "external" if (count - 1 - i) % 2 == 0 else "me",
+            "body": f"{i:04d}" + "x" * (body_chars - 4),
+            "is_latest": i == count - 1,
+        }
+        for i in range(count)
+    ]
+
+
+def _body_chars(messages: list[dict]) -> int:
+    return sum(len(m["body"]) for m in messages)
+
+
+@pytest.mark.parametrize("count", [1, 10, 80, 320])
+def test_payload_stays_bounded_as_the_thread_grows(count):
+    max_chars = 5000
+    messages, omitted = _apply_char_budget(_thread(count), max_chars)
+
+    # the bodies fit the budget, apart from the truncation marker
+    marker = len("[... 0000 earlier chars omitted] ")
+    assert _body_chars(messages) <= max_chars + marker
+    assert len(json.dumps(messages, separators=(",", ":"))) < 2 * max_chars
+    # the oldest messages are the ones left out
+    assert omitted + [m["index"] for m in messages] == list(range(count))
+
+
+def test_over_budget_keeps_the_newest_messages_and_truncates_from_the_start():
+    thread = _thread(10)
+    messages, omitted = _apply_char_budget(thread, 3500)
+
+    assert [m["index"] for m in messages] == [6, 7, 8, 9]
+    assert omitted == [0, 1, 2, 3, 4, 5]
+    assert messages[-1] == thread[-1]
+    # 500 chars were left for message 6, which keeps its end
+    assert messages[0]["body"] == "[... 500 earlier chars omitted] " + thread[6]["body"][500:]
+
+
+def test_too_little_left_omits_instead_of_truncating():
+    thread = _thread(3)
+    messages, omitted = _apply_char_budget(thread, 2000 + _MIN_TRUNCATED_CHARS - 1)
+
+    assert [m["index"] for m in messages] == [1, 2]
+    assert omitted == [0]
+
+
+def test_latest_external_message_is_kept_in_full_even_over_budget():
+    thread = _thread(1, body_chars=100_000)
+    assert _apply_char_budget(thread, 5000) == (thread, [])
+
+    # the reply goes to the latest external message, not to my later one
+    thread = _thread(3, body_chars=100_000)
+    thread[2]["role"] = "me"
+    thread[1]["role"] = "external"
+    messages, omitted = _apply_char_budget(thread, 5000)
+    assert messages == [thread[1]]
+    assert omitted == [0, 2]
+
+
+def test_zero_budget_keeps_only_the_latest_external_message():
+    thread = _thread(5)
+    messages, omitted = _apply_char_budget(thread, 0)
+
+    assert messages == [thread[4]]
+    assert omitted == [0, 1, 2, 3]
+
+
+def test_empty_thread():
+    assert _apply_char_budget([], 0) == ([], [])
+
+
+def _text_message(**parts: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "Alice <alice@example.com>"
+    msg["Subject"] = "Report"
+    first = True
+    for subtype, content in parts.items():
+        if first:
+            msg.set_content(content, subtype=subtype)
+            first = False
+        else:
+            msg.add_alternative(content, subtype=subtype)
+    return msg
+
+
+def _with_attachment(msg: EmailMessage, size: int = 4096) -> EmailMessage:
+    msg.add_attachment(bytes(range(256)) * (size // 256), maintype="application", subtype="pdf", filename="r.pdf")
+    return msg
+
+
+def _empty_plain_then_html() -> EmailMessage:
+    # an empty text/plain part falls back to the HTML one
+    msg = EmailMessage()
+    msg.make_mixed()
+    plain = MIMEText("", "plain")
+    html = MIMEText("<p>Only in <b>HTML</b></p>", "html")
+    msg.attach(plain)
+    msg.attach(html)
+    return msg
+
+
+_RAW_CASES = {
+    "alternative_and_attachment": lambda: _with_attachment(
+        _text_message(plain="Plain text body\nsecond line", html="<p>HTML body</p>")
+    ),
+    "html_only": lambda: _text_message(html="<html><body><p>Hello</p><p>from HTML</p></body></html>"),
+    "empty_plain_before_html": _empty_plain_then_html,
+}
+
+
+def _raw(msg: EmailMessage) -> str:
+    return base64.urlsafe_b64encode(msg.as_bytes()).decode("ascii")
+
+
+@pytest.mark.parametrize("case", sorted(_RAW_CASES))
+@pytest.mark.parametrize("chunk_chars", [create_draft_reply._RAW_CHUNK_CHARS, 8])
+def test_raw_parsing_matches_the_whole_message_parser(case, chunk_chars, monkeypatch):
+    # small chunks put part boundaries in the middle of a chunk
+    monkeypatch.setattr(create_draft_reply, "_RAW_CHUNK_CHARS", chunk_chars)
+    msg = _RAW_CASES[case]()
+
+    expected = _extract_body_from_mime(message_from_bytes(msg.as_bytes()))
+    assert expected.strip() and expected != "(empty body)"
+    assert _text_from_raw(_raw(msg)) == expected
+
+
+def test_raw_parsing_stops_before_a_large_attachment(monkeypatch):
+    monkeypatch.setattr(instrumentation, "STATS_ENABLED", True)
+    monkeypatch.setattr(create_draft_reply, "_RAW_CHUNK_CHARS", 4096)
+    msg = _with_attachment(_text_message(plain="Short body"), size=512 * 1024)
+    size = len(msg.as_bytes())
+    reset_stats()
+
+    assert _text_from_raw(_raw(msg)) == "Short body"
+
+    decoded = stats_snapshot()["values"]["parse.raw_bytes_decoded"]["max"]
+    assert decoded < size / 10
+    reset_stats()
+
+
+def _metadata_thread(message_ids: list[str]) -> dict:
+    return {
+        "id": "t1",
+        "historyId": "100",
+        "messages": [
+            {"id": msg_id, "payload": {"headers": [{"name": "From", "value": "Alice <alice@example.com>"}]}}
+            for msg_id in message_ids
+        ],
+    }
+
+
+def test_raw_format_reads_bodies_from_the_raw_source(serve, mailbox):
+    for msg_id, body in (("m1", "First message"), ("m2", "Second message")):
+        [request] = raw_message_requests(mailbox.builder, [msg_id])
+        mailbox.add(request, {"id": msg_id, "raw": _raw(_text_message(plain=body))})
+    traffic = serve(mailbox)
+
+    context = _fetch_thread_context(
+        get_gmail_service(), "t1", thread=_metadata_thread(["m1", "m2"]), body_format="raw"
+    )
+
+    assert [m["body"] for m in context] == ["First message", "Second message"]
+    # both raw sources in one batch
+    assert (traffic.round_trips, traffic.api_calls) == (1, 2)
+
+
+def test_failed_raw_fetch_is_raised(serve, mailbox):
+    # no fixture for m1's raw source: Gmail answers 404
+    serve(mailbox)
+
+    with pytest.raises(HttpError):
+        _fetch_thread_context(get_gmail_service(), "t1", thread=_metadata_thread(["m1"]), body_format="raw")
+
+
+def _full_thread(mailbox, thread_id: str, body: str) -> None:
+    # the store reads the history ID before its first thread
+    mailbox.add(profile_request(mailbox.builder), {"historyId": "100"})
+    mailbox.add(
+        thread_request(mailbox.builder, thread_id, format="full"),
+        {
+            "id": thread_id,
+            "historyId": "100",
+            "messages": [
+                {
+                    "id": "m" + thread_id,
+                    "payload": {
+                        "mimeType": "text/plain",
+                        "headers": [{"name": "From", "value": "Alice <alice@example.com>"}],
+                        "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()},
+                    },
+                }
+            ],
+        },
+    )
+
+
+def _draft_threads(arguments: dict) -> list[dict]:
+    return json.loads(_create_draft_reply(arguments)[0].text)["threads"]
+
+
+def test_thread_ids_are_answered_in_the_order_asked(serve, mailbox):
+    for n in range(1, 5):
+        _full_thread(mailbox, f"t{n}", f"Body of thread {n}")
+    traffic = serve(mailbox)
+
+    threads = _draft_threads({"threadIds": ["t3", "t1", "t4", "t2"]})
+
+    assert [t["threadId"] for t in threads] == ["t3", "t1", "t4", "t2"]
+    assert [t["messages"][0]["body"] for t in threads] == [f"Body of thread {n}" for n in (3, 1, 4, 2)]
+    # the history watermark, then all four threads in one batch
+    assert (traffic.round_trips, traffic.api_calls) == (2, 5)
+
+
+def test_a_failing_thread_only_sets_its_own_error(serve, mailbox):
+    _full_thread(mailbox, "t1", "Body of thread 1")
+    _full_thread(mailbox, "t3", "Body of thread 3")
+    # no fixture for t2: Gmail answers 404
+    serve(mailbox)
+
+    t1, t2, t3 = _draft_threads({"threadIds": ["t1", "t2", "t3"]})
+
+    assert t1["messages"][0]["body"] == "Body of thread 1"
+    assert t3["messages"][0]["body"] == "Body of thread 3"
+    assert "messages" not in t2 and t2["error"].startswith("HttpError")
+
+
+def test_threads_are_fetched_in_one_batch_per_account(two_accounts):
+    default, work, install = two_accounts
+    for n in (1, 2):
+        _full_thread(default, f"d{n}", f"Default thread {n}")
+        _full_thread(work, f"w{n}", f"Work thread {n}")
+    default_traffic, work_traffic = install()
+
+    threads = _draft_threads({"threadIds": ["work:w1", "d1", "work:w2", "default:d2"]})
+
+    assert [t["messages"][0]["body"] for t in threads] == [
+        "Work thread 1",
+        "Default thread 1",
+        "Work thread 2",
+        "Default thread 2",
+    ]
+    # per account: the history watermark, then one batch of its threads
+    assert (default_traffic.round_trips, default_traffic.api_calls) == (2, 3)
+    assert (work_traffic.round_trips, work_traffic.api_calls) == (2, 3)
+
+
+@pytest.mark.parametrize(
+    "arguments, message",
+    [
+        ({"threadId": "t1", "threadIds": ["t2"]}, "either threadId or threadIds"),
+        ({}, "either threadId or threadIds"),
+        ({"threadIds": []}, "threadIds must hold 1 to"),
+        ({"threadIds": [f"t{n}" for n in range(MAX_THREADS_PER_CALL + 1)]}, "threadIds must hold 1 to"),
+    ],
+)
+def test_bad_thread_id_arguments_are_rejected(serve, mailbox, arguments, message):
+    traffic = serve(mailbox)
+
+    with pytest.raises(ValueError, match=message):
+        _create_draft_reply(arguments)
+    assert traffic.api_calls == 0
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+
+import mcp.types as types
+import pytest
+
+try:
+    from mcp.server.lowlevel.server import request_ctx
+
+    from mcp_email import email_server
+except (ImportError, AttributeError):
+    # the server is written against the decorator API of the 1.x SDK
+    pytest.skip("needs the mcp 1.x low-level Server API", allow_module_level=True)
+
+
+class _Session:
+    """Stands in for a client session; the server keys its slots by it."""
+
+
+class SlowTool:
+    """A blocking tool handler that records how many calls ran at once."""
+
+    def __init__(self, seconds: float = 0.1) -> None:
+        self.seconds = seconds
+        # cleared: calls wait for it before finishing
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.finished = 0
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, arguments: dict) -> list[types.TextContent]:
+        with self._lock:
+            self.started += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if not self.gate.wait(5):
+                raise AssertionError("gate never opened")
+            time.sleep(self.seconds)
+            return [types.TextContent(type="text", text=str(arguments["n"]))]
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.finished += 1
+
+
+@pytest.fixture
+def tool(monkeypatch) -> SlowTool:
+    slow = SlowTool()
+    monkeypatch.setattr(email_server, "_tool_handler", lambda name: slow)
+    # asyncio semaphores belong to the loop that first waits on them, and
+    # every test runs its own loop
+    monkeypatch.setattr(email_server, "_session_slots", weakref.WeakKeyDictionary())
+    return slow
+
+
+def _limits(monkeypatch, tool_calls: int, session_calls: int) -> asyncio.Semaphore:
+    slots = asyncio.Semaphore(tool_calls)
+    monkeypatch.setattr(email_server, "_tool_semaphores", {"get_unread_emails": slots})
+    monkeypatch.setattr(email_server, "SESSION_MAX_CONCURRENT_CALLS", session_calls)
+    return slots
+
+
+async def _call(session: _Session, n: int) -> str:
+    request_ctx.set(SimpleNamespace(session=session))
+    [content] = await email_server._run_tool("get_unread_emails", {"n": n})
+    return content.text
+
+
+async def _calls(*sessions: _Session) -> list[str]:
+    return await asyncio.gather(*(_call(session, n) for n, session in enumerate(sessions)))
+
+
+def test_sessions_run_at_the_same_time(tool, monkeypatch):
+    _limits(monkeypatch, tool_calls=2, session_calls=1)
+
+    assert asyncio.run(_calls(_Session(), _Session())) == ["0", "1"]
+    assert tool.max_running == 2
+
+
+def test_calls_of_one_session_wait_for_its_slots(tool, monkeypatch):
+    _limits(monkeypatch, tool_calls=4, session_calls=1)
+    session = _Session()
+
+    assert asyncio.run(_calls(session, session, session)) == ["0", "1", "2"]
+    assert tool.max_running == 1
+
+
+def test_calls_of_one_tool_wait_for_its_slots(tool, monkeypatch):
+    _limits(monkeypatch, tool_calls=1, session_calls=4)
+
+    assert asyncio.run(_calls(_Session(), _Session(), _Session())) == ["0", "1", "2"]
+    assert tool.max_running == 1
+
+
+def test_timed_out_call_holds_its_slot_until_the_worker_finishes(tool, monkeypatch):
+    slots = _limits(monkeypatch, tool_calls=1, session_calls=4)
+    monkeypatch.setattr(email_server, "TOOL_TIMEOUT_SECONDS", 0.2)
+    tool.seconds = 0.01
+    tool.gate.clear()
+
+    async def scenario() -> str:
+        with pytest.raises(TimeoutError, match="get_unread_emails did not finish within 0.2 seconds"):
+            await _call(_Session(), 0)
+
+        # the worker is still running, and still holds the tool's only slot
+        assert (tool.started, tool.finished) == (1, 0)
+        assert slots.locked()
+        waiting = asyncio.ensure_future(_call(_Session(), 1))
+        await asyncio.sleep(0.1)
+        assert tool.started == 1 and not waiting.done()
+
+        # once it finishes, the slot goes to the waiting call
+        tool.gate.set()
+        result = await waiting
+        assert not slots.locked()
+        return result
+
+    assert asyncio.run(scenario()) == "1"
+    assert (tool.finished, tool.max_running) == (2, 1)
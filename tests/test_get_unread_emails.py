@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from mcp_email.get_unread_emails import get_unread_emails as listing
+from mcp_email.get_unread_emails.get_unread_emails import (
+    LIST_PAGE_SIZE,
+    _decode_cursor,
+    _encode_cursor,
+    _Resume,
+    get_unread_emails,
+)
+from mcp_email.get_unread_emails.unread_index import unread_query
+from mcp_email.gmail_requests import list_messages_request, message_summary_request, profile_request
+
+
+def _inbox(mailbox, threads: list[tuple[str, int]]) -> None:
+    """Unread threads as (thread ID, internalDate), in Gmail's listing order."""
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "100"})
+    mailbox.add(
+        list_messages_request(b, unread_query(datetime.now(timezone.utc)), max_results=500),
+        {"messages": [{"id": "m" + thread_id, "threadId": thread_id} for thread_id, _ in threads]},
+        drop=("q",),
+    )
+    for thread_id, internal_date in threads:
+        mailbox.add(
+            message_summary_request(b, "m" + thread_id),
+            {
+                "id": "m" + thread_id,
+                "threadId": thread_id,
+                "internalDate": str(internal_date),
+                "payload": {"headers": [{"name": "Subject", "value": f"about {thread_id}"}]},
+            },
+        )
+
+
+def _page(arguments: dict) -> tuple[list[str], str | None]:
+    text = get_unread_emails(arguments)[0].text
+    thread_ids = [
+        line.split("thread_id=", 1)[1].split(" | ", 1)[0]
+        for line in text.splitlines()
+        if line.startswith("thread_id=")
+    ]
+    cursor = text.rsplit("next_cursor=", 1)[1] if "next_cursor=" in text else None
+    return thread_ids, cursor
+
+
+def test_threads_sharing_the_boundary_date_are_not_dropped(mailbox, serve):
+    now = int(time.time() * 1000)
+    # t2 and t3 arrived in the same millisecond, t2 listed first
+    _inbox(mailbox, [("t5", now - 1000), ("t4", now - 2000), ("t2", now - 3000), ("t3", now - 3000), ("t1", now - 4000)])
+    serve(mailbox)
+
+    first, cursor = _page({"limit": 3})
+    assert first == ["t5", "t4", "t3"]
+    assert cursor is not None
+
+    second, cursor = _page({"limit": 3, "cursor": cursor})
+    assert second == ["t2", "t1"]
+    assert cursor is None
+
+
+def test_full_last_page_has_no_cursor(mailbox, serve):
+    now = int(time.time() * 1000)
+    _inbox(mailbox, [("t3", now - 1000), ("t2", now - 2000), ("t1", now - 3000)])
+    traffic = serve(mailbox)
+
+    assert _page({"limit": 3}) == (["t3", "t2", "t1"], None)
+    # profile, list and one metadata batch
+    assert traffic.round_trips == 3
+
+
+def test_one_extra_thread_is_read_for_the_cursor(mailbox, serve):
+    now = int(time.time() * 1000)
+    _inbox(mailbox, [(f"t{n}", now - n * 1000) for n in range(1, 6)])
+    traffic = serve(mailbox)
+
+    first, cursor = _page({"limit": 2})
+    assert first == ["t1", "t2"]
+    assert traffic.api_calls == 2 + 3
+
+    # t3 was read for the first page and comes from the store
+    second, cursor = _page({"limit": 2, "cursor": cursor})
+    assert second == ["t3", "t4"]
+    assert cursor is not None
+
+
+def test_older_messages_do_not_bring_a_thread_back(mailbox, serve):
+    # `since` is older than the unread index's window, so threads are listed
+    # straight from messages().list; thread A has a newer and an older
+    # unread message
+    now = int(time.time() * 1000)
+    since = datetime.fromtimestamp(now / 1000 - 30 * 86400, timezone.utc)
+    refs = [("a2", "A", now - 1000), ("b1", "B", now - 2000), ("c1", "C", now - 3000), ("a1", "A", now - 4000)]
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "100"})
+    mailbox.add(
+        list_messages_request(b, unread_query(since), max_results=LIST_PAGE_SIZE),
+        {"messages": [{"id": message_id, "threadId": thread_id} for message_id, thread_id, _ in refs]},
+    )
+    for message_id, thread_id, internal_date in refs:
+        mailbox.add(
+            message_summary_request(b, message_id),
+            {"id": message_id, "threadId": thread_id, "internalDate": str(internal_date), "payload": {"headers": []}},
+        )
+    serve(mailbox)
+
+    pages = []
+    cursor = None
+    arguments = {"limit": 1, "since": since.date().isoformat()}
+    while True:
+        thread_ids, cursor = _page({**arguments, "cursor": cursor} if cursor else arguments)
+        pages += thread_ids
+        if cursor is None:
+            break
+    assert pages == ["A", "B", "C"]
+
+
+def _paged_inbox(mailbox, since: datetime, refs: list[tuple[str, str, int]], page_size: int) -> None:
+    """Unread (message ID, thread ID, internalDate), newest first, in list pages of `page_size`."""
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "100"})
+    pages = [refs[i : i + page_size] for i in range(0, len(refs), page_size)]
+    for n, page in enumerate(pages):
+        body: dict = {"messages": [{"id": message_id, "threadId": thread_id} for message_id, thread_id, _ in page]}
+        if n + 1 < len(pages):
+            body["nextPageToken"] = f"p{n + 1}"
+        mailbox.add(
+            list_messages_request(b, unread_query(since), max_results=page_size, page_token=f"p{n}" if n else None),
+            body,
+        )
+    for message_id, thread_id, internal_date in refs:
+        mailbox.add(
+            message_summary_request(b, message_id),
+            {"id": message_id, "threadId": thread_id, "internalDate": str(internal_date), "payload": {"headers": []}},
+        )
+
+
+@pytest.fixture
+def list_calls(monkeypatch) -> list[str | None]:
+    """Page tokens of the messages().list calls made, in order."""
+    calls: list[str | None] = []
+
+    def counting(service, query, max_results, page_token=None):
+        calls.append(page_token)
+        return list_messages_request(service, query, max_results=max_results, page_token=page_token)
+
+    monkeypatch.setattr(listing, "list_messages_request", counting)
+    monkeypatch.setattr(listing, "LIST_PAGE_SIZE", 2)
+    return calls
+
+
+def _walk(arguments: dict, list_calls: list[str | None]) -> tuple[list[str], list[list[str | None]]]:
+    """Every page of a listing; returns the thread IDs and each page's list calls."""
+    thread_ids: list[str] = []
+    calls_per_page: list[list[str | None]] = []
+    cursor = None
+    while True:
+        list_calls.clear()
+        page, cursor = _page({**arguments, "cursor": cursor} if cursor else arguments)
+        thread_ids += page
+        calls_per_page.append(list(list_calls))
+        if cursor is None:
+            return thread_ids, calls_per_page
+
+
+def _deep_inbox(mailbox) -> datetime:
+    # older than the unread index's window, so listed from messages().list;
+    # thread A's older unread message is two list pages after its newest one
+    now = int(time.time() * 1000)
+    since = datetime.fromtimestamp(now / 1000 - 30 * 86400, timezone.utc)
+    refs = [("a2", "A", now - 1000)] + [(f"{t.lower()}1", t, now - (n + 2) * 1000) for n, t in enumerate("BCDEFGH")]
+    refs.insert(5, ("a1", "A", now - 5500))
+    _paged_inbox(mailbox, since, refs, page_size=2)
+    return since
+
+
+def test_deep_pages_resume_the_list_walk(mailbox, serve, list_calls):
+    since = _deep_inbox(mailbox)
+    serve(mailbox)
+
+    thread_ids, calls_per_page = _walk({"limit": 1, "since": since.date().isoformat()}, list_calls)
+
+    assert thread_ids == ["A", "B", "C", "D", "E", "F", "G", "H"]
+    # each page lists from where the last one stopped: at most the list page
+    # it resumes in and the next one, never again from the first
+    assert calls_per_page == [[None], [None, "p1"], ["p1"], ["p1", "p2"], ["p2", "p3"], ["p3"], ["p3", "p4"], ["p4"]]
+
+
+def test_forgotten_walk_starts_over_from_the_first_list_page(mailbox, serve, list_calls):
+    since = _deep_inbox(mailbox)
+    serve(mailbox)
+    arguments = {"limit": 3, "since": since.date().isoformat()}
+
+    first, cursor = _page(arguments)
+    listing._walks.clear()
+    list_calls.clear()
+    second, cursor = _page({**arguments, "cursor": cursor})
+
+    assert first + second == ["A", "B", "C", "D", "E", "F"]
+    assert list_calls[0] is None
+
+
+def test_cursor_round_trips():
+    since = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    assert _decode_cursor(_encode_cursor((1700000000000, "t1"), since)) == ((1700000000000, "t1"), since, {})
+    assert _decode_cursor(_encode_cursor({"work": (1700000000000, "t1"), "home": None}, since)) == (
+        {"work": (1700000000000, "t1"), "home": None},
+        since,
+        {},
+    )
+    resume = {"default": _Resume("p2", 1, "w1"), "work": _Resume(None, 0, "w2")}
+    assert _decode_cursor(_encode_cursor((1700000000000, "t1"), since, resume))[2] == resume
+
+
+def test_imap_cursor_is_rejected_on_gmail(serve, mailbox):
+    since = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    serve(mailbox)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        get_unread_emails({"cursor": _encode_cursor(42, since)})
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        _decode_cursor(_encode_cursor({"work": 42}, since))
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import base64
+import json
+import urllib.parse
+
+import httplib2
+import pytest
+from googleapiclient.discovery import build
+
+from benchmarks.fake_gmail import RecordingHttp, apply_fields
+from mcp_email.create_draft_reply.create_draft_reply import _decode_message_text
+from mcp_email.gmail_requests import (
+    HISTORY_FIELDS,
+    LIST_MESSAGES_FIELDS,
+    MESSAGE_SUMMARY_FIELDS,
+    MESSAGE_SUMMARY_HEADERS,
+    PROFILE_FIELDS,
+    RAW_MESSAGE_FIELDS,
+    REPLY_TARGET_HEADERS,
+    SENT_LOOKUP_FIELDS,
+    THREAD_CONTEXT_FIELDS,
+    THREAD_REPLY_TARGET_FIELDS,
+    history_request,
+    list_messages_request,
+    message_summary_request,
+    profile_request,
+    raw_message_requests,
+    sent_message_lookup_request,
+    thread_request,
+)
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def _part_headers(mime_type: str, filename: str = "") -> list[dict]:
+    headers = [{"name": "Content-Type", "value": f'{mime_type}; charset="UTF-8"'}]
+    if filename:
+        headers.append({"name": "Content-Disposition", "value": f'attachment; filename="{filename}"'})
+    else:
+        headers.append({"name": "Content-Transfer-Encoding", "value": "quoted-printable"})
+    return headers
+
+
+def _text(part_id: str, mime_type: str, text: str) -> dict:
+    return {
+        "partId": part_id,
+        "mimeType": mime_type,
+        "filename": "",
+        "headers": _part_headers(mime_type),
+        "body": {"size": len(text), "data": _b64(text)},
+    }
+
+
+def _attachment(part_id: str, mime_type: str, filename: str) -> dict:
+    return {
+        "partId": part_id,
+        "mimeType": mime_type,
+        "filename": filename,
+        "headers": _part_headers(mime_type, filename),
+        "body": {"attachmentId": "ANGjdJ" + "x" * 180, "size": 48213},
+    }
+
+
+def _multipart(part_id: str, subtype: str, parts: list[dict]) -> dict:
+    return {
+        "partId": part_id,
+        "mimeType": f"multipart/{subtype}",
+        "filename": "",
+        "headers": [{"name": "Content-Type", "value": f'multipart/{subtype}; boundary="000000000000abcdef"'}],
+        "body": {"size": 0},
+        "parts": parts,
+    }
+
+
+def _message(message_id: str, payload: dict) -> dict:
+    payload = dict(payload, partId="")
+    payload["headers"] = [
+        {"name": "Delivered-To", "value": "me@example.com"},
+        {"name": "Received", "value": "by 2002:a05:6a10:1234 with SMTP id abc; Mon, 2 Jun 2025 10:00:00 -0700"},
+        {"name": "From", "value": "Alice Martin <alice@example.com>"},
+        {"name": "To", "value": "Me <me@example.com>"},
+        {"name": "Subject", "value": "Re: the contract"},
+        {"name": "Message-ID", "value": f"<{message_id}@example.com>"},
+        {"name": "MIME-Version", "value": "1.0"},
+    ] + payload["headers"]
+    return {
+        "id": message_id,
+        "threadId": "t1",
+        "labelIds": ["UNREAD", "IMPORTANT", "CATEGORY_PERSONAL", "INBOX"],
+        "snippet": "Thanks for the update, the schedule works for us",
+        "sizeEstimate": 58231,
+        "historyId": "1234",
+        "internalDate": "1748883600000",
+        "payload": payload,
+    }
+
+
+_PLAIN = "Thanks for the update.\nThe schedule works for us.\n"
+_HTML = "<html><body><p>Thanks for the update.</p><p>The schedule works for us.</p></body></html>"
+
+# the layouts Gmail returns for common messages
+_THREAD = {
+    "id": "t1",
+    "historyId": "1234",
+    "messages": [
+        # single part: the body is on the payload
+        _message("m1", dict(_text("", "text/plain", _PLAIN))),
+        _message("m2", dict(_text("", "text/html", _HTML))),
+        # with an attachment: multipart/mixed > multipart/alternative > text
+        _message(
+            "m3",
+            _multipart(
+                "",
+                "mixed",
+                [
+                    _multipart("0", "alternative", [_text("0.0", "text/plain", _PLAIN), _text("0.1", "text/html", _HTML)]),
+                    _attachment("1", "application/pdf", "contract.pdf"),
+                ],
+            ),
+        ),
+        # with inline images too: mixed > related > alternative > text
+        _message(
+            "m4",
+            _multipart(
+                "",
+                "mixed",
+                [
+                    _multipart(
+                        "0",
+                        "related",
+                        [
+                            _multipart("0.0", "alternative", [_text("0.0.0", "text/html", _HTML)]),
+                            _attachment("0.1", "image/png", "logo.png"),
+                        ],
+                    ),
+                    _attachment("1", "application/pdf", "contract.pdf"),
+                ],
+            ),
+        ),
+    ],
+}
+
+
+class _UnmaskedGmail:
+    """Answers with full responses, cut down by the request's `fields=` like Gmail does."""
+
+    def __init__(self, responses: dict[str, dict]) -> None:
+        # "<path>" or "<path>?format=<format>" -> full response
+        self._responses = responses
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        parsed = urllib.parse.urlsplit(uri)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        full = self._responses.get(f"{parsed.path}?format={params.get('format')}", self._responses.get(parsed.path))
+        if full is None:
+            return httplib2.Response({"status": 404}), b'{"error": {"code": 404}}'
+        content = json.dumps(apply_fields(full, params.get("fields")))
+        return httplib2.Response({"status": 200, "content-type": "application/json"}), content.encode()
+
+
+_PREFIX = "/gmail/v1/users/me"
+_RESPONSES = {
+    f"{_PREFIX}/threads/t1?format=full": _THREAD,
+    f"{_PREFIX}/threads/t1?format=metadata": _THREAD,
+    f"{_PREFIX}/messages/m3?format=metadata": _THREAD["messages"][2],
+    f"{_PREFIX}/messages/m3?format=raw": dict(_THREAD["messages"][2], raw=_b64("From: a@example.com\r\n\r\nhi")),
+    f"{_PREFIX}/messages": {
+        "messages": [{"id": "m3", "threadId": "t1"}],
+        "nextPageToken": "next",
+        "resultSizeEstimate": 201,
+    },
+    f"{_PREFIX}/profile": {
+        "emailAddress": "me@example.com",
+        "messagesTotal": 51234,
+        "threadsTotal": 30120,
+        "historyId": "1234",
+    },
+    f"{_PREFIX}/history": {
+        "history": [
+            {
+                "id": "1230",
+                "messages": [{"id": "m3", "threadId": "t1"}],
+                "messagesAdded": [{"message": _THREAD["messages"][2]}],
+            }
+        ],
+        "historyId": "1234",
+    },
+}
+
+
+@pytest.fixture
+def recorded():
+    http = RecordingHttp(_UnmaskedGmail(_RESPONSES))
+    service = build("gmail", "v1", http=http, static_discovery=True, cache_discovery=False)
+
+    def execute(request) -> tuple[dict[str, list[str]], dict]:
+        """Runs `request`; returns its query parameters and the masked response."""
+        request.execute()
+        # recorded keys have their query parameters sorted
+        entry = http.entries[-1]
+        query = urllib.parse.urlsplit(entry["request"].split(" ", 1)[1]).query
+        return urllib.parse.parse_qs(query), entry["body"]
+
+    return service, execute
+
+
+def _size(body) -> int:
+    return len(json.dumps(body, separators=(",", ":")))
+
+
+@pytest.mark.parametrize(
+    "build_request, expected",
+    [
+        (
+            lambda s: message_summary_request(s, "m3"),
+            {"format": ["metadata"], "metadataHeaders": sorted(MESSAGE_SUMMARY_HEADERS), "fields": [MESSAGE_SUMMARY_FIELDS]},
+        ),
+        (
+            lambda s: list_messages_request(s, "is:unread", max_results=100),
+            {"q": ["is:unread"], "maxResults": ["100"], "fields": [LIST_MESSAGES_FIELDS]},
+        ),
+        (lambda s: profile_request(s), {"fields": [PROFILE_FIELDS]}),
+        (
+            lambda s: history_request(s, "1200", history_types=["messageAdded"]),
+            {"startHistoryId": ["1200"], "historyTypes": ["messageAdded"], "fields": [HISTORY_FIELDS]},
+        ),
+        (lambda s: thread_request(s, "t1", "full"), {"format": ["full"], "fields": [THREAD_CONTEXT_FIELDS]}),
+        (
+            lambda s: thread_request(s, "t1", "metadata"),
+            {"format": ["metadata"], "metadataHeaders": sorted(REPLY_TARGET_HEADERS), "fields": [THREAD_REPLY_TARGET_FIELDS]},
+        ),
+        (lambda s: raw_message_requests(s, ["m3"])[0], {"format": ["raw"], "fields": [RAW_MESSAGE_FIELDS]}),
+        (
+            lambda s: sent_message_lookup_request(s, "<abc@example.com>"),
+            {"q": ["in:sent rfc822msgid:abc@example.com"], "maxResults": ["1"], "fields": [SENT_LOOKUP_FIELDS]},
+        ),
+    ],
+)
+def test_builders_send_masks(recorded, build_request, expected):
+    service, execute = recorded
+    params, _ = execute(build_request(service))
+    assert params == expected
+
+
+def test_thread_context_mask_keeps_every_body(recorded):
+    service, execute = recorded
+    _, masked = execute(thread_request(service, "t1", "full"))
+
+    expected = [_decode_message_text(m["payload"]) for m in _THREAD["messages"]]
+    assert all(expected)
+    assert [_decode_message_text(m["payload"]) for m in masked["messages"]] == expected
+    assert masked["messages"][2]["payload"]["parts"][0]["parts"][0]["body"] == {"data": _b64(_PLAIN)}
+    # no attachment IDs, part headers, labels or snippets
+    assert "attachmentId" not in json.dumps(masked)
+    assert _size(masked) < _size(_THREAD) * 0.6
+
+
+def test_masks_shrink_responses(recorded):
+    service, execute = recorded
+    for build_request, full in (
+        (lambda s: message_summary_request(s, "m3"), _RESPONSES[f"{_PREFIX}/messages/m3?format=metadata"]),
+        (lambda s: thread_request(s, "t1", "metadata"), _THREAD),
+        (lambda s: profile_request(s), _RESPONSES[f"{_PREFIX}/profile"]),
+        (lambda s: history_request(s, "1200"), _RESPONSES[f"{_PREFIX}/history"]),
+    ):
+        _, masked = execute(build_request(service))
+        assert _size(masked) < _size(full) / 2
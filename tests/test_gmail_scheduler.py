@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import json
+
+import httplib2
+import pytest
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+
+from mcp_email import gmail_scheduler, utils
+from mcp_email.gmail_scheduler import (
+    GMAIL_BACKOFF_BASE_SECONDS,
+    QUOTA_UNITS,
+    GmailScheduler,
+)
+from mcp_email.gmail_requests import message_summary_request
+
+_OK = ({"status": "200"}, json.dumps({"id": "m1", "threadId": "t1"}))
+_TOO_MANY = ({"status": "429"}, json.dumps({"error": {"code": 429}}))
+_RATE_LIMITED = (
+    {"status": "403"},
+    json.dumps({"error": {"code": 403, "errors": [{"reason": "userRateLimitExceeded"}]}}),
+)
+_FORBIDDEN = ({"status": "403"}, json.dumps({"error": {"code": 403, "errors": [{"reason": "forbidden"}]}}))
+_BAD_GATEWAY = ({"status": "502"}, "bad gateway")
+
+
+class FakeHttp(HttpMockSequence):
+    """Answers with `responses` in order and counts the requests made."""
+
+    def __init__(self, responses: list[tuple[dict, str]]) -> None:
+        super().__init__(responses)
+        self.requests = 0
+
+    def request(self, *args, **kwargs):
+        self.requests += 1
+        return super().request(*args, **kwargs)
+
+
+class FakeClock:
+    """time.monotonic for the scheduler; sleeping advances it."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(gmail_scheduler.time, "monotonic", clock.monotonic)
+    # full jitter draws from [0, cap]; always take the cap
+    monkeypatch.setattr(gmail_scheduler.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def _service(http):
+    return build("gmail", "v1", http=http, static_discovery=True, cache_discovery=False)
+
+
+def _get(http):
+    return _service(http).users().messages().get(userId="me", id="m1")
+
+
+def _send(http):
+    return _service(http).users().messages().send(userId="me", body={"raw": ""})
+
+
+def test_throttling_is_retried_with_backoff_and_retry_after(clock):
+    http = FakeHttp([({**_TOO_MANY[0], "retry-after": "3"}, _TOO_MANY[1]), _RATE_LIMITED, _BAD_GATEWAY, _OK])
+    scheduler = GmailScheduler(units_per_second=1000, sleep=clock.sleep)
+
+    assert scheduler.execute(_get(http))["id"] == "m1"
+    assert http.requests == 4
+    # Retry-After wins over the first backoff; then the cap doubles
+    base = GMAIL_BACKOFF_BASE_SECONDS
+    assert clock.sleeps == [3, round(base * 2, 6), round(base * 4, 6)]
+
+
+def test_throttling_pauses_every_caller(clock):
+    scheduler = GmailScheduler(units_per_second=1000, sleep=clock.sleep)
+    throttled = HttpError(httplib2.Response({"status": "429", "retry-after": "3"}), b"")
+
+    # the caller that was throttled backs off...
+    assert scheduler.backoff(0, throttled) == 3
+    # ...and any other request waits out the same pause before it is sent
+    scheduler.acquire(QUOTA_UNITS["gmail.users.messages.get"])
+    assert clock.sleeps == [3]
+
+
+def test_retries_stop_after_max_retries(clock):
+    http = FakeHttp([_TOO_MANY] * 10)
+    scheduler = GmailScheduler(units_per_second=1000, max_retries=3, sleep=clock.sleep)
+
+    with pytest.raises(HttpError) as raised:
+        scheduler.execute(_get(http))
+    assert raised.value.resp.status == 429
+    assert http.requests == 4
+    assert len(clock.sleeps) == 3
+
+
+def test_other_errors_are_not_retried(clock):
+    http = FakeHttp([_FORBIDDEN, _OK])
+    scheduler = GmailScheduler(units_per_second=1000, sleep=clock.sleep)
+
+    with pytest.raises(HttpError):
+        scheduler.execute(_get(http))
+    assert http.requests == 1
+    assert clock.sleeps == []
+
+
+def test_quota_units_are_charged_before_each_call(clock):
+    http = FakeHttp([_OK] * 10)
+    scheduler = GmailScheduler(units_per_second=10, sleep=clock.sleep)
+
+    # 5 units per messages.get: two calls fit the one-second bucket, then
+    # each call waits for its own units to refill
+    for _ in range(4):
+        scheduler.execute(_get(http))
+    assert QUOTA_UNITS["gmail.users.messages.get"] == 5
+    assert clock.sleeps == [0.5, 0.5]
+
+    # a send costs 100 units, more than the bucket holds: it empties it
+    clock.now += 10
+    clock.sleeps.clear()
+    scheduler.execute(_send(FakeHttp([_OK])))
+    scheduler.execute(_get(http))
+    assert clock.sleeps == [0.5]
+
+
+def test_throttled_send_is_resent(clock):
+    http = FakeHttp([_TOO_MANY, _OK])
+    scheduler = GmailScheduler(units_per_second=1000, sleep=clock.sleep)
+
+    # Gmail rejects a throttled request before acting on it
+    assert scheduler.execute(_send(http), idempotent=False, find_sent=lambda: None)["id"] == "m1"
+    assert http.requests == 2
+
+
+def test_ambiguous_send_is_looked_up_until_it_shows_up(clock):
+    http = FakeHttp([_BAD_GATEWAY, _OK])
+    scheduler = GmailScheduler(units_per_second=1000, sleep=clock.sleep)
+    # Gmail search only finds the sent message on the third lookup
+    lookups = iter([None, None, {"id": "sent"}])
+
+    assert scheduler.execute(_send(http), idempotent=False, find_sent=lambda: next(lookups)) == {"id": "sent"}
+    assert http.requests == 1
+    base = GMAIL_BACKOFF_BASE_SECONDS
+    assert clock.sleeps == [round(base, 6), round(base * 2, 6), round(base * 4, 6)]
+
+
+def test_ambiguous_send_is_never_resent(clock):
+    http = FakeHttp([_BAD_GATEWAY, _OK])
+    scheduler = GmailScheduler(units_per_second=1000, max_retries=3, sleep=clock.sleep)
+    lookups = []
+
+    with pytest.raises(HttpError) as raised:
+        scheduler.execute(_send(http), idempotent=False, find_sent=lambda: lookups.append(1))
+    assert raised.value.resp.status == 502
+    assert http.requests == 1
+    assert len(lookups) == 3
+
+    # without a lookup the error is raised at once
+    http = FakeHttp([_BAD_GATEWAY, _OK])
+    with pytest.raises(HttpError):
+        scheduler.execute(_send(http), idempotent=False)
+    assert http.requests == 1
+
+
+# --- execute_batched ---
+_NOT_FOUND = {"error": {"code": 404, "message": "Not Found"}}
+
+
+def _message(message_id: str) -> dict:
+    return {"id": message_id, "threadId": "t" + message_id}
+
+
+@pytest.fixture
+def batches(clock, monkeypatch):
+    """Gets messages with execute_batched, through a scheduler on the fake clock."""
+
+    def run(service, message_ids: list[str], batch_size: int = 100, max_retries: int = 3):
+        scheduler = GmailScheduler(units_per_second=1000, max_retries=max_retries, sleep=clock.sleep)
+        monkeypatch.setattr(utils, "get_scheduler", lambda: scheduler)
+        requests = [message_summary_request(service, message_id) for message_id in message_ids]
+        return utils.execute_batched(service, requests, batch_size)
+
+    return run
+
+
+def test_failing_call_in_a_batch_only_sets_its_own_error(batches, mailbox):
+    for message_id in ("m1", "m3"):
+        mailbox.add(message_summary_request(mailbox.builder, message_id), _message(message_id))
+    mailbox.add(message_summary_request(mailbox.builder, "m2"), _NOT_FOUND, status=404)
+
+    service, traffic = mailbox.service()
+    results = batches(service, ["m1", "m2", "m3"])
+
+    assert [response for response, _ in results] == [_message("m1"), None, _message("m3")]
+    assert results[0][1] is None and results[2][1] is None
+    assert isinstance(results[1][1], HttpError) and results[1][1].resp.status == 404
+    # a 404 is not retried
+    assert traffic.round_trips == 1
+
+
+def test_failed_batch_round_trip_fails_every_call_in_its_chunk(batches, mailbox, monkeypatch):
+    for message_id in ("m1", "m2", "m3"):
+        mailbox.add(message_summary_request(mailbox.builder, message_id), _message(message_id))
+    service, _ = mailbox.service()
+    replay = service._http
+    round_trips = []
+
+    def first_batch_fails(uri, *args, **kwargs):
+        round_trips.append(uri)
+        if len(round_trips) == 1:
+            raise ConnectionResetError("connection reset by peer")
+        return type(replay).request(replay, uri, *args, **kwargs)
+
+    monkeypatch.setattr(replay, "request", first_batch_fails)
+
+    results = batches(service, ["m1", "m2", "m3"], batch_size=2, max_retries=0)
+
+    assert [type(error) for _, error in results] == [ConnectionResetError, ConnectionResetError, type(None)]
+    assert results[2][0] == _message("m3")
+    assert len(round_trips) == 2
+
+
+def test_throttled_and_transient_calls_are_retried_in_a_later_batch(batches, mailbox, clock):
+    b = mailbox.builder
+    mailbox.add(message_summary_request(b, "m1"), {"error": {"code": 429}}, status=429)
+    mailbox.add(message_summary_request(b, "m1"), _message("m1"))
+    mailbox.add(message_summary_request(b, "m2"), _message("m2"))
+    mailbox.add(message_summary_request(b, "m3"), {"error": {"code": 503}}, status=503)
+    mailbox.add(message_summary_request(b, "m3"), _message("m3"))
+
+    service, traffic = mailbox.service()
+    results = batches(service, ["m1", "m2", "m3"])
+
+    assert results == [(_message(m), None) for m in ("m1", "m2", "m3")]
+    # the second batch only holds the two calls that failed
+    assert (traffic.round_trips, traffic.api_calls) == (2, 5)
+    # one backoff between the batches, on the scheduler's clock
+    assert clock.sleeps == [GMAIL_BACKOFF_BASE_SECONDS]
+
+
+def test_batched_retries_stop_after_max_retries(batches, mailbox, clock):
+    mailbox.add(message_summary_request(mailbox.builder, "m1"), {"error": {"code": 429}}, status=429)
+    mailbox.add(message_summary_request(mailbox.builder, "m2"), _message("m2"))
+
+    service, traffic = mailbox.service()
+    results = batches(service, ["m1", "m2"], max_retries=2)
+
+    assert results[1] == (_message("m2"), None)
+    assert isinstance(results[0][1], HttpError) and results[0][1].resp.status == 429
+    assert (traffic.round_trips, traffic.api_calls) == (3, 4)
+    assert len(clock.sleeps) == 2
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import httplib2
+import pytest
+
+from benchmarks.gmail_transport import GmailStandIn, run_calls, stand_in_credentials
+from mcp_email.gmail_transport import PooledHttp, default_http_factory
+
+
+@pytest.fixture
+def stand_in():
+    stand_in = GmailStandIn(delay=0.005)
+    yield stand_in
+    stand_in.close()
+
+
+def test_concurrent_calls_share_the_pooled_connections(stand_in):
+    http = PooledHttp(stand_in_credentials(), size=4)
+
+    run_calls(http, stand_in.endpoint, threads=16, calls=10)
+
+    assert stand_in.requests == 160
+    # every call went out on one of the pool's keep-alive connections...
+    assert stand_in.connections <= 4
+    # ...and no more than `size` calls were on the wire at once
+    assert 1 < stand_in.max_in_flight <= 4
+    http.close()
+
+
+def test_connections_are_kept_between_calls(stand_in):
+    http = PooledHttp(stand_in_credentials(), size=4)
+
+    run_calls(http, stand_in.endpoint, threads=1, calls=20)
+
+    assert (stand_in.requests, stand_in.connections) == (20, 1)
+    http.close()
+
+
+def _pool(size: int) -> tuple[PooledHttp, list[httplib2.Http]]:
+    """A pool, and the Http objects it makes as they are made."""
+    made: list[httplib2.Http] = []
+
+    def factory() -> httplib2.Http:
+        made.append(default_http_factory())
+        return made[-1]
+
+    return PooledHttp(stand_in_credentials(), size=size, http_factory=factory), made
+
+
+def test_broken_connection_is_not_reused(stand_in):
+    http, made = _pool(size=2)
+    run_calls(http, stand_in.endpoint, threads=1, calls=1)
+
+    with pytest.raises(OSError):
+        with http.connection():
+            raise ConnectionResetError("connection reset by peer")
+
+    # the failed Http object was dropped: the next call opens a new one
+    run_calls(http, stand_in.endpoint, threads=1, calls=1)
+    assert len(made) == 2
+    assert stand_in.connections == 2
+    http.close()
+
+
+def test_connection_is_returned_after_an_error_above_the_transport(stand_in):
+    http, made = _pool(size=1)
+    run_calls(http, stand_in.endpoint, threads=1, calls=1)
+
+    with pytest.raises(ValueError):
+        with http.connection():
+            raise ValueError("not a transport error")
+
+    # the slot was released and the same keep-alive connection is reused
+    run_calls(http, stand_in.endpoint, threads=1, calls=1)
+    assert len(made) == 1
+    assert stand_in.connections == 1
+    http.close()
+
+
+def test_interrupted_connection_is_closed(stand_in):
+    http, made = _pool(size=1)
+    run_calls(http, stand_in.endpoint, threads=1, calls=1)
+
+    with pytest.raises(KeyboardInterrupt):
+        with http.connection():
+            raise KeyboardInterrupt
+
+    run_calls(http, stand_in.endpoint, threads=1, calls=1)
+    assert len(made) == 2
+    assert stand_in.connections == 2
+    http.close()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+
+from mcp_email.html_to_text import html_to_text
+
+
+@pytest.mark.parametrize(
+    "html, text",
+    [
+        # lists, with and without end tags
+        ("<ul><li>one<li> two</ul><ol><li>a</li><li>b</li></ol>", "one\ntwo\n\na\nb"),
+        ("<ul><li>outer<ul><li>inner</ul><li>next</ul>", "outer\n\ninner\n\nnext"),
+        # links keep their text only
+        ('<p>see <a href="https://example.com">the  site</a> now</p>', "see the site now"),
+        # table cells on one line per row
+        ("<table><tr><td>a</td><td> b</td></tr><tr><th>c<td>d</table>", "a b\nc d"),
+        ("<p>x</p><table><tr><td>1<td>2</table><p>y</p>", "x\n\n1 2\n\ny"),
+        # entities
+        ("&amp; &lt;tag&gt; caf&eacute; &#233;&#x41;", "& <tag> café éA"),
+        ("a&nbsp;b", "a\xa0b"),
+        # script, style, head and hidden content is dropped
+        (
+            "<html><head><title>t</title><style>p{}</style></head><body>"
+            "<script>var a = 1;</script>hello <span hidden>x</span>"
+            '<div style="display: none">y</div><b aria-hidden="true">z</b>world</body></html>',
+            "hello world",
+        ),
+        ("<head><title>t</title><p>body without </head>", "body without"),
+        # paragraphs, breaks and whitespace
+        ("<p>one</p><p>two<br>three</p>", "one\n\ntwo\nthree"),
+        ("<div>  lead  </div>\n\n<div>\tsecond </div>", "lead\nsecond"),
+        ("<p>a</p><p></p><p></p><p>b</p>", "a\n\nb"),
+    ],
+)
+def test_html_to_text(html, text):
+    assert html_to_text(html) == text
+
+
+def test_pre_keeps_indentation_and_line_breaks():
+    assert html_to_text("<pre>  a\n  b</pre>") == "  a\n  b"
+    assert html_to_text(
+        "<p>code:</p><pre>\ndef f():\n    return  1\n</pre><p>done</p>"
+    ) == "code:\n\ndef f():\n    return  1\n\ndone"
+
+
+def test_max_chars_stops_early():
+    html = "<p>" + "word " * 100_000 + "</p>"
+    text = html_to_text(html, max_chars=100)
+    assert len(text) <= 100
+    assert text.startswith("word word")
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from imap_standin import ImapStandIn, make_message
+from mcp_email.get_unread_emails import idle_watcher
+from mcp_email.get_unread_emails.idle_watcher import UnreadWatcher
+
+
+class Changes:
+    """Counts on_change calls."""
+
+    def __init__(self) -> None:
+        self._changed = threading.Condition()
+        self.count = 0
+
+    def __call__(self) -> None:
+        with self._changed:
+            self.count += 1
+            self._changed.notify_all()
+
+    def wait_for(self, count: int, timeout: float = 5) -> None:
+        with self._changed:
+            if not self._changed.wait_for(lambda: self.count >= count, timeout):
+                raise TimeoutError(f"{self.count} of {count} changes")
+
+
+@pytest.fixture
+def watch(monkeypatch):
+    """Starts an UnreadWatcher on a stand-in server; returns its Changes."""
+    monkeypatch.setattr(idle_watcher, "_MAX_RECONNECT_DELAY", 0.1)
+    watchers = []
+
+    def watch_(server: ImapStandIn) -> Changes:
+        changes = Changes()
+        watcher = UnreadWatcher(changes, connect=server.connect)
+        watcher.start()
+        watchers.append(watcher)
+        return changes
+
+    yield watch_
+    for watcher in watchers:
+        watcher.stop()
+        watcher._thread.join(5)
+
+
+def test_new_mail_is_pushed(imap_server, watch):
+    imap_server.deliver(make_message("Alice <alice@example.com>", "Hello"))
+    changes = watch(imap_server)
+    # the first search reports the unread set as it is
+    changes.wait_for(1)
+    imap_server.wait_for_idle(1)
+
+    imap_server.deliver(make_message("Bob <bob@example.com>", "New"))
+    changes.wait_for(2)
+    imap_server.wait_for_idle(2)
+
+    imap_server.mark_seen(1)
+    changes.wait_for(3)
+    imap_server.wait_for_idle(3)
+
+    # mail that arrives already read wakes the watcher but changes nothing
+    imap_server.deliver(make_message("Me <me@example.com>", "Sent from another client"), seen=True)
+    imap_server.wait_for_idle(4)
+    assert changes.count == 3
+    assert imap_server.logins == 1
+
+
+def test_watcher_reconnects_and_reports_missed_mail(imap_server, watch):
+    changes = watch(imap_server)
+    changes.wait_for(1)
+    imap_server.wait_for_idle(1)
+
+    imap_server.drop_connections()
+    imap_server.deliver(make_message("Alice <alice@example.com>", "While disconnected"))
+
+    changes.wait_for(2)
+    imap_server.wait_for_idle(2)
+    assert imap_server.logins == 2
+
+
+def test_server_without_idle_is_polled(watch, monkeypatch):
+    monkeypatch.setattr(idle_watcher, "IMAP_POLL_SECONDS", 0.05)
+    server = ImapStandIn(idle=False)
+    try:
+        changes = watch(server)
+        changes.wait_for(1)
+
+        server.deliver(make_message("Alice <alice@example.com>", "Hello"))
+        changes.wait_for(2)
+
+        assert "IDLE" not in server.commands
+        assert server.logins == 1
+    finally:
+        server.close()
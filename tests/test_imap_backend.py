@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import imaplib
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from imap_standin import make_message
+from mcp_email.get_unread_emails import imap_backend
+from mcp_email.get_unread_emails.imap_backend import ImapBackend, ImapConnectionPool
+
+_SINCE = datetime.now(timezone.utc) - timedelta(days=7)
+
+
+def _fill(server, threads: int, per_thread: int) -> None:
+    # thread n gets X-GM-THRID 100 + n; messages arrive round-robin, so the
+    # last thread has the newest message
+    for i in range(per_thread):
+        for n in range(threads):
+            server.deliver(make_message(f"Sender {n} <s{n}@example.com>", f"Thread {n}", f"message {i}"), 100 + n)
+
+
+@pytest.fixture
+def pool(imap_server):
+    pool = ImapConnectionPool(imap_server.connect, size=2)
+    yield pool
+    pool.close()
+
+
+def test_listing_is_three_commands_for_any_page_size(imap_server, pool):
+    _fill(imap_server, threads=10, per_thread=3)
+    backend = ImapBackend(pool, gmail_extensions=True)
+
+    summaries, next_before = backend.list_unread(_SINCE, None, limit=5)
+
+    assert [s["thread_id"] for s in summaries] == [format(100 + n, "x") for n in (9, 8, 7, 6, 5)]
+    assert summaries[0]["from_"] == "Sender 9 <s9@example.com>"
+    assert summaries[0]["subject"] == "Thread 9"
+    # each thread is listed by its newest message
+    assert [s["uid"] for s in summaries] == [30, 29, 28, 27, 26]
+    assert next_before == 26
+    # a search, a thread ID fetch, and one header fetch for the whole page
+    assert imap_server.commands[-3:] == ["UID SEARCH", "UID FETCH", "UID FETCH"]
+
+
+def test_pages_follow_the_uid_cursor(imap_server, pool):
+    _fill(imap_server, threads=10, per_thread=3)
+    imap_server.mark_seen(30)  # thread 9 is still unread through its older messages
+    backend = ImapBackend(pool, gmail_extensions=True)
+
+    pages = []
+    before = None
+    while True:
+        summaries, before = backend.list_unread(_SINCE, before, limit=4)
+        pages.append([s["thread_id"] for s in summaries])
+        if before is None:
+            break
+
+    expected = [format(100 + n, "x") for n in (8, 7, 6, 5, 4, 3, 2, 1, 0)]
+    # thread 9's newest unread message (UID 20) sorts after thread 0's (UID 21)
+    expected.insert(9, format(109, "x"))
+    assert pages == [expected[:4], expected[4:8], expected[8:]]
+
+
+def test_listing_without_gmail_extensions(imap_server, pool):
+    old = datetime.now(timezone.utc) - timedelta(days=30)
+    imap_server.deliver(make_message("Old <old@example.com>", "Too old", date=old))
+    imap_server.deliver(make_message("Alice <alice@example.com>", "Read already"), seen=True)
+    imap_server.deliver(make_message("Bob <bob@example.com>", "First"))
+    imap_server.deliver(make_message("Carol <carol@example.com>", "Second"))
+    backend = ImapBackend(pool, gmail_extensions=False)
+
+    summaries, next_before = backend.list_unread(_SINCE, None, limit=5)
+
+    # every message is its own thread, named by its UID
+    assert [(s["thread_id"], s["subject"]) for s in summaries] == [("4", "Second"), ("3", "First")]
+    assert next_before is None
+    assert imap_server.commands[-2:] == ["UID SEARCH", "UID FETCH"]
+
+
+def test_fetch_thread_returns_the_thread_oldest_first(imap_server, pool):
+    _fill(imap_server, threads=3, per_thread=2)
+    backend = ImapBackend(pool, gmail_extensions=True)
+
+    messages = backend.fetch_thread(format(101, "x"))
+
+    # Gmail API message IDs: X-GM-MSGID in hex
+    assert [message_id for message_id, _ in messages] == [format(5002, "x"), format(5005, "x")]
+    assert [m.get_payload().strip() for _, m in messages] == ["message 0", "message 1"]
+    assert backend.fetch_thread(format(999, "x")) == []
+
+
+def test_pool_reuses_its_connections(imap_server, pool):
+    _fill(imap_server, threads=3, per_thread=1)
+    backend = ImapBackend(pool, gmail_extensions=True)
+
+    for _ in range(5):
+        backend.list_unread(_SINCE, None, limit=2)
+    assert imap_server.logins == 1
+
+    # eight callers at once share the pool's two connections
+    errors = []
+
+    def list_page():
+        try:
+            backend.list_unread(_SINCE, None, limit=2)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=list_page) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert imap_server.logins <= 2
+
+
+def test_command_error_keeps_the_connection(imap_server, pool):
+    backend = ImapBackend(pool, gmail_extensions=True)
+    backend.list_unread(_SINCE, None, limit=2)
+
+    with pytest.raises(ValueError):
+        backend.fetch_thread("not-a-thread-id")
+    with pytest.raises(imaplib.IMAP4.error):
+        with pool.connection() as imap:
+            imap.uid("SEARCH", "X-GM-THRID")  # the stand-in answers BAD
+
+    backend.list_unread(_SINCE, None, limit=2)
+    assert imap_server.logins == 1
+
+
+def test_dropped_connection_is_replaced(imap_server, pool, monkeypatch):
+    _fill(imap_server, threads=2, per_thread=1)
+    backend = ImapBackend(pool, gmail_extensions=True)
+    backend.list_unread(_SINCE, None, limit=2)
+
+    # a connection that was idle for a while is checked with NOOP first
+    monkeypatch.setattr(imap_backend, "_IDLE_CHECK_SECONDS", 0)
+    imap_server.drop_connections()
+    assert len(backend.list_unread(_SINCE, None, limit=2)[0]) == 2
+    assert imap_server.logins == 2
+
+    # a recently used one is not: the call fails and the connection is dropped
+    monkeypatch.setattr(imap_backend, "_IDLE_CHECK_SECONDS", 60)
+    imap_server.drop_connections()
+    with pytest.raises((imaplib.IMAP4.abort, OSError)):
+        backend.list_unread(_SINCE, None, limit=2)
+    assert len(backend.list_unread(_SINCE, None, limit=2)[0]) == 2
+    assert imap_server.logins == 3
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from googleapiclient.discovery import build
+
+from benchmarks.fake_gmail import ReplayHttp, _request_key
+from mcp_email import instrumentation
+from mcp_email.gmail_requests import profile_request
+from mcp_email.gmail_scheduler import execute
+from mcp_email.instrumentation import Histogram, record_value, reset_stats, span, stats_snapshot
+from mcp_email.utils import _build_request
+
+
+@pytest.fixture(autouse=True)
+def stats(monkeypatch):
+    monkeypatch.setattr(instrumentation, "STATS_ENABLED", True)
+    reset_stats()
+    yield
+    reset_stats()
+
+
+def test_spans_record_durations_and_errors():
+    for _ in range(3):
+        with span("stage"):
+            pass
+    with pytest.raises(RuntimeError):
+        with span("stage"):
+            raise RuntimeError("boom")
+
+    stage = stats_snapshot()["spans_ms"]["stage"]
+    assert stage["count"] == 4
+    assert stage["errors"] == 1
+    assert 0 <= stage["min"] <= stage["p50"] <= stage["max"]
+
+
+def test_values_are_summarized():
+    for value in range(1, 101):
+        record_value("bytes", value)
+
+    summary = stats_snapshot()["values"]["bytes"]
+    assert summary["count"] == 100
+    assert summary["mean"] == 50.5
+    assert (summary["min"], summary["max"]) == (1, 100)
+    # buckets hold 4 per power of two: within 20% below the true value
+    assert 0.8 * 50 <= summary["p50"] <= 50
+    assert 0.8 * 90 <= summary["p90"] <= 90
+
+
+@pytest.mark.parametrize("value", [0, 1, 3, 4, 7, 100, 12_345, 10**9])
+def test_histogram_percentile_is_within_a_bucket(value):
+    histogram = Histogram()
+    histogram.record(value)
+    histogram.record(10 * value)
+    assert 0.8 * value <= histogram.percentile(0.5) <= value
+
+
+def test_reset_clears_everything():
+    with span("stage"):
+        record_value("bytes", 1)
+    reset_stats()
+    snapshot = stats_snapshot()
+    assert snapshot["spans_ms"] == {} and snapshot["values"] == {}
+
+
+def test_disabled_stats_record_nothing(monkeypatch):
+    monkeypatch.setattr(instrumentation, "STATS_ENABLED", False)
+    with span("stage"):
+        record_value("bytes", 1)
+    assert stats_snapshot() == {"enabled": False}
+
+    monkeypatch.setattr(instrumentation, "STATS_ENABLED", True)
+    assert stats_snapshot()["spans_ms"] == {}
+
+
+def test_jsonl_export(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(instrumentation, "STATS_JSONL_FILE", str(path))
+    registry = instrumentation._Registry()
+    monkeypatch.setattr(instrumentation, "_registry", registry)
+
+    with span("gmail.batch", calls=3):
+        pass
+    with pytest.raises(ValueError):
+        with span("stage"):
+            raise ValueError
+    registry._jsonl.flush()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(line["span"], line.get("calls"), line.get("error")) for line in lines] == [
+        ("gmail.batch", 3, None),
+        ("stage", None, True),
+    ]
+    registry._jsonl.close()
+
+
+def test_gmail_calls_record_a_span_and_response_bytes():
+    builder = build("gmail", "v1", http=ReplayHttp({"entries": []}), static_discovery=True, cache_discovery=False)
+    request = profile_request(builder)
+    body = {"emailAddress": "me@example.com", "historyId": "100"}
+    http = ReplayHttp({"entries": [{"request": _request_key(request.method, request.uri), "status": 200, "body": body}]})
+    service = build(
+        "gmail", "v1", http=http, requestBuilder=_build_request, static_discovery=True, cache_discovery=False
+    )
+
+    assert execute(profile_request(service)) == body
+    execute(profile_request(service))
+
+    snapshot = stats_snapshot()
+    assert snapshot["spans_ms"]["gmail.users.getProfile"]["count"] == 2
+    response_bytes = snapshot["values"]["gmail.users.getProfile.response_bytes"]
+    assert response_bytes["count"] == 2
+    assert response_bytes["max"] == len(json.dumps(body, separators=(",", ":")))
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import pytest
+
+from mcp_email.gmail_requests import (
+    history_request,
+    message_summary_request,
+    profile_request,
+    thread_request,
+)
+from mcp_email.mailbox_store import MailboxStore
+
+
+def _message(message_id: str, thread_id: str, labels: list[str]) -> dict:
+    return {
+        "id": message_id,
+        "threadId": thread_id,
+        "internalDate": "1700000000000",
+        "labelIds": labels,
+        "payload": {"headers": [{"name": "From", "value": "Alice <alice@example.com>"}]},
+    }
+
+
+def _thread(thread_id: str, message_ids: list[str]) -> dict:
+    return {
+        "id": thread_id,
+        "historyId": "100",
+        "messages": [{"id": m, "threadId": thread_id, "payload": {"headers": []}} for m in message_ids],
+    }
+
+
+def _ref(message_id: str, thread_id: str, labels: list[str] | None = None) -> dict:
+    message = {"id": message_id, "threadId": thread_id}
+    if labels is not None:
+        message["labelIds"] = labels
+    return {"message": message}
+
+
+@pytest.fixture
+def seeded(mailbox, tmp_path):
+    """
+    A store at watermark 100 holding threads t1 (m1, m2) and t2 (m3), the
+    metadata of m1 and m3 and the cleaned body of m2. Returns a function
+    that builds the service and the store once the test added its fixtures.
+    """
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "100"})
+    mailbox.add(thread_request(b, "t1"), _thread("t1", ["m1", "m2"]))
+    mailbox.add(thread_request(b, "t2"), _thread("t2", ["m3"]))
+    mailbox.add(message_summary_request(b, "m1"), _message("m1", "t1", ["INBOX", "UNREAD"]))
+    mailbox.add(message_summary_request(b, "m3"), _message("m3", "t2", ["INBOX", "UNREAD"]))
+
+    def seed():
+        service, traffic = mailbox.service()
+        store = MailboxStore(str(tmp_path / "mailbox.sqlite3"))
+        store.sync(service, force=True)
+        store.get_threads(service, ["t1", "t2"])
+        store.get_messages_metadata(service, ["m1", "m3"])
+        store.put_bodies({"m2": "cleaned body"})
+        assert store.history_id == "100"
+        traffic.reset()
+        return service, traffic, store
+
+    return seed
+
+
+def test_history_records_mark_threads_stale_and_update_labels(mailbox, seeded):
+    b = mailbox.builder
+    records = [
+        {"messagesAdded": [_ref("m4", "t2", ["INBOX", "UNREAD"])]},
+        {"messagesDeleted": [_ref("m2", "t1")]},
+        {"labelsRemoved": [dict(_ref("m1", "t1", ["INBOX"]), labelIds=["UNREAD"])]},
+    ]
+    mailbox.add(history_request(b, "100"), {"history": records, "historyId": "110"})
+    # refetched after going stale
+    mailbox.add(thread_request(b, "t1"), _thread("t1", ["m1"]))
+    service, traffic, store = seeded()
+    store.reply_targets.put("t1", {"message_id": "<m1@example.com>"})
+
+    assert store.sync(service, force=True) == records
+    assert store.history_id == "110"
+    assert traffic.api_calls == 1
+
+    # both threads changed, so neither is served from the store any more
+    assert store._cached_thread("t1", "full") is None
+    assert store._cached_thread("t2", "full") is None
+    assert store.reply_targets.get("t1") is None
+
+    # the deleted message's metadata and body are gone; m1 lost UNREAD
+    assert store.get_bodies(["m2"]) == {}
+    (m1, error), = store.get_messages_metadata(service, ["m1"])
+    assert error is None and m1["labelIds"] == ["INBOX"]
+    assert traffic.api_calls == 1
+
+    thread = store.get_thread(service, "t1")
+    assert [m["id"] for m in thread["messages"]] == ["m1"]
+    assert traffic.api_calls == 2
+
+
+def test_unknown_message_labels_are_ignored(seeded):
+    service, traffic, store = seeded()
+    store.apply_history([{"labelsAdded": [dict(_ref("m9", "t9", ["INBOX"]), labelIds=["INBOX"])]}])
+
+    assert store._cached_thread("t1", "full") is not None
+    assert store.get_messages_metadata(service, ["m1"])[0][0]["labelIds"] == ["INBOX", "UNREAD"]
+    assert traffic.api_calls == 0
+
+
+def test_expired_watermark_marks_everything_stale(mailbox, seeded):
+    b = mailbox.builder
+    mailbox.add(history_request(b, "100"), {"error": {"code": 404, "message": "expired"}}, status=404)
+    mailbox.add(profile_request(b), {"historyId": "500"})
+    service, traffic, store = seeded()
+
+    assert store.sync(service, force=True) == []
+    # one failed history.list, then the profile for the new watermark
+    assert traffic.api_calls == 2
+    assert store.history_id == "500"
+    assert store._cached_thread("t1", "full") is None
+    assert store._cached_thread("t2", "full") is None
+
+    # message metadata and bodies never change, so they stay cached
+    assert store.get_bodies(["m2"]) == {"m2": "cleaned body"}
+    store.get_messages_metadata(service, ["m1", "m3"])
+    assert traffic.api_calls == 2
+
+
+def test_sync_is_rate_limited(mailbox, seeded):
+    mailbox.add(history_request(mailbox.builder, "100"), {"historyId": "100"})
+    service, traffic, store = seeded()
+
+    store.sync(service)
+    assert traffic.api_calls == 0
+    store.sync(service, force=True)
+    assert traffic.api_calls == 1
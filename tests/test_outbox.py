@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from mcp_email.send_thread_reply import outbox, send_thread_reply
+from mcp_email.send_thread_reply.outbox import FAILED, PENDING, SENDING, SENT, KeyConflict, Outbox
+
+
+@pytest.fixture
+def box(tmp_path, monkeypatch) -> Outbox:
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(outbox, "_outbox", box)
+    yield box
+    # lets a lease renewer still running exit without touching the database
+    with box._db_lock:
+        box._held.clear()
+    box._db.close()
+
+
+def _age(box: Outbox, key: str, seconds: float) -> None:
+    # as if the entry's claim was last renewed `seconds` ago
+    with box._db:
+        box._db.execute("UPDATE outbox SET updated = ? WHERE idempotency_key = ?", (time.time() - seconds, key))
+
+
+def test_enqueue_is_idempotent(box):
+    first = box.enqueue("k1", "t1", "Thanks!")
+    again = box.enqueue("k1", "t1", "Thanks!")
+
+    assert again == first
+    assert first["status"] == PENDING
+    assert first["message_id"].startswith("<")
+
+
+def test_key_reused_for_a_different_reply_conflicts(box):
+    box.enqueue("k1", "t1", "Thanks!")
+
+    with pytest.raises(KeyConflict):
+        box.enqueue("k1", "t1", "Thanks a lot!")
+    with pytest.raises(KeyConflict):
+        box.enqueue("k1", "t2", "Thanks!")
+
+
+def test_an_entry_is_claimed_once_and_never_sent_twice(box):
+    box.enqueue("k1", "t1", "Thanks!")
+
+    claimed = box.claim("k1")
+    assert (claimed["status"], claimed["attempts"]) == (SENDING, 1)
+    # another call in this process, however old its claim is
+    assert box.claim("k1") is None
+    _age(box, "k1", outbox.OUTBOX_LEASE_SECONDS + 1)
+    assert box.claim("k1") is None
+
+    box.mark_sent("k1", "gmail-1")
+    assert box.enqueue("k1", "t1", "Thanks!")["status"] == SENT
+    assert box.claim("k1") is None
+    assert box.get(["k1", "missing"])["k1"]["gmail_id"] == "gmail-1"
+
+
+def test_failed_entry_is_queued_again(box):
+    box.enqueue("k1", "t1", "Thanks!")
+    box.claim("k1")
+    box.mark_failed("k1", "HttpError: 502")
+    assert box.get(["k1"])["k1"]["status"] == FAILED
+
+    assert box.enqueue("k1", "t1", "Thanks!")["status"] == PENDING
+    assert box.claim("k1")["attempts"] == 2
+
+
+def test_failure_before_claiming_leaves_a_claimed_entry_alone(box):
+    box.enqueue("k1", "t1", "Thanks!")
+    box.claim("k1")
+    box.mark_failed("k1", "no reply target", only_if_pending=True)
+    assert box.get(["k1"])["k1"]["status"] == SENDING
+
+
+def test_another_process_claim_is_reclaimed_only_after_its_lease(box, monkeypatch):
+    box.enqueue("k1", "t1", "Thanks!")
+    with monkeypatch.context() as m:
+        m.setattr(outbox, "_PROCESS_TOKEN", "other-process")
+        assert box.claim("k1") is not None
+
+    # the other process may still be sending
+    _age(box, "k1", outbox.OUTBOX_LEASE_SECONDS - 5)
+    assert box.claim("k1") is None
+
+    # it stopped renewing its claim: the entry is ours, as a second attempt
+    _age(box, "k1", outbox.OUTBOX_LEASE_SECONDS + 1)
+    claimed = box.claim("k1")
+    assert (claimed["status"], claimed["attempts"]) == (SENDING, 2)
+
+
+def test_claims_are_renewed_while_held(box, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_LEASE_SECONDS", 0.2)
+    box.enqueue("k1", "t1", "Thanks!")
+    box.claim("k1")
+    time.sleep(0.5)
+
+    # without renewals this claim would have expired twice over
+    monkeypatch.setattr(outbox, "_PROCESS_TOKEN", "other-process")
+    assert box.claim("k1") is None
+
+    # once nothing is held the renewer stops
+    box.mark_sent("k1", "gmail-1")
+    time.sleep(0.2)
+    assert box._renewer is None
+
+
+@pytest.fixture
+def sends(box, monkeypatch, serve, mailbox):
+    """Replies sent through send_thread_reply's outbox, without Gmail."""
+    serve(mailbox)
+    sent: list[tuple[str, str]] = []
+
+    def fake_send_reply(service, thread_id, reply_text, message_id, target=None, store=None):
+        sent.append((thread_id, message_id))
+        return {"id": f"gmail-{len(sent)}"}
+
+    monkeypatch.setattr(send_thread_reply, "_send_reply", fake_send_reply)
+    monkeypatch.setattr(
+        send_thread_reply,
+        "_reply_targets",
+        lambda thread_ids: {thread_id: ({"thread_id": thread_id}, None) for thread_id in thread_ids},
+    )
+    return sent
+
+
+def _reply(key: str, thread_id: str = "t1", text: str = "Thanks!") -> dict:
+    return {"idempotencyKey": key, "threadId": thread_id, "replyText": text}
+
+
+def test_same_key_is_sent_once(sends):
+    first = send_thread_reply._send_replies([_reply("k1"), _reply("k2", "t2")])
+    again = send_thread_reply._send_replies([_reply("k1")])
+
+    assert [r["status"] for r in first] == [SENT, SENT]
+    assert again == [
+        {"idempotencyKey": "k1", "threadId": "t1", "status": SENT, "gmailMessageId": "gmail-1", "duplicate": True}
+    ]
+    assert [thread_id for thread_id, _ in sends] == ["t1", "t2"]
+
+
+def test_reused_key_with_a_different_body_is_rejected(sends):
+    send_thread_reply._send_replies([_reply("k1")])
+    [result] = send_thread_reply._send_replies([_reply("k1", text="Something else")])
+
+    assert result["status"] == "rejected"
+    assert "different reply" in result["error"]
+    assert len(sends) == 1
+
+
+def test_retry_of_a_failed_send_looks_it_up_first(sends, box, monkeypatch):
+    lookups: list[str] = []
+    monkeypatch.setattr(
+        send_thread_reply,
+        "_find_sent_message",
+        lambda service, message_id: lookups.append(message_id) or {"id": "gmail-earlier"},
+    )
+    entry = box.enqueue("k1", "t1", "Thanks!")
+    box.claim("k1")
+    box.mark_failed("k1", "HttpError: 502")
+
+    [result] = send_thread_reply._send_replies([_reply("k1")])
+
+    # the first attempt did go through: found in Sent, not sent again
+    assert (result["status"], result["gmailMessageId"]) == (SENT, "gmail-earlier")
+    assert lookups == [entry["message_id"]]
+    assert sends == []
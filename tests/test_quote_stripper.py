@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from benchmarks.quote_stripper import reply_chain
+from mcp_email.create_draft_reply.quote_stripper import QuoteStripper
+
+_FIRST = "\n".join(
+    f"Point {n}: the supplier confirmed delivery of batch {n} for the north warehouse next week."
+    for n in range(6)
+)
+
+
+def _strip_all(bodies: list[str]) -> list[str]:
+    stripper = QuoteStripper()
+    return [stripper.strip(body) for body in bodies]
+
+
+def test_quoted_reply_and_signature_are_removed():
+    reply = (
+        "Sounds good, let's go ahead.\n"
+        "\n"
+        "-- \n"
+        "Bob | Example Corp\n"
+        "\n"
+        "On Mon, 2 Jun 2025 at 10:00, Alice <alice@example.com> wrote:\n"
+        + "\n".join(f"> {line}" for line in _FIRST.splitlines())
+    )
+    assert _strip_all([_FIRST, reply]) == [_FIRST, "Sounds good, let's go ahead."]
+
+
+def test_wrapped_gmail_and_outlook_headers_start_the_quote():
+    gmail = "Fine by me.\n\nOn Mon, 2 Jun 2025 at 10:00, Alice Martin\n<alice@example.com> wrote:\n\nold text"
+    outlook = "Agreed.\n\nFrom: Alice Martin <alice@example.com>\nSent: Monday, June 2, 2025 10:00\nSubject: x"
+    assert _strip_all([gmail, outlook]) == ["Fine by me.", "Agreed."]
+
+
+def test_sent_from_my_phone_is_a_signature():
+    assert _strip_all(["On my way.\n\nSent from my iPhone"]) == ["On my way."]
+
+
+def test_unmarked_quote_of_an_earlier_message_is_removed():
+    # Outlook-style top posting without any quote markers
+    reply = "Thanks, all confirmed on our side.\n\n" + _FIRST
+    assert _strip_all([_FIRST, reply])[1] == "Thanks, all confirmed on our side."
+
+
+def test_repeated_content_inside_one_message_is_kept():
+    body = _FIRST + "\n\nAgain, for the record:\n" + _FIRST
+    assert _strip_all([body]) == [body]
+
+
+def test_short_repeats_across_messages_are_kept():
+    # the same sign-off and status lines in every message are not quotes
+    first = "Build is green.\nDeploy at 5pm.\nThanks!\nAlice"
+    second = "Build is green.\nDeploy at 5pm.\nThanks!\nAlice\n\nOne more thing: the docs are updated."
+    assert _strip_all([first, second]) == [first, second]
+
+
+def test_reply_chain_output_grows_linearly():
+    sizes = [len("".join(_strip_all(reply_chain(n)))) for n in (10, 20, 40)]
+    # each stripped reply is about the same size however long the chain is
+    assert sizes[1] < 2.2 * sizes[0]
+    assert sizes[2] < 2.2 * sizes[1]
+    assert all(body.startswith(f"Reply {n} line 0") for n, body in enumerate(_strip_all(reply_chain(10))))
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from mcp_email.get_unread_emails.unread_index import _HISTORY_TYPES, UnreadIndex, unread_query
+from mcp_email.gmail_requests import history_request, list_messages_request, profile_request
+
+_UNREAD = ["UNREAD", "INBOX", "CATEGORY_PERSONAL"]
+
+
+def _listing(mailbox, *message_ids: str) -> None:
+    # the query embeds today's date, so it is left out of the key
+    mailbox.add(
+        list_messages_request(mailbox.builder, unread_query(datetime.now(timezone.utc)), max_results=500),
+        {"messages": [{"id": m, "threadId": "t" + m[1:]} for m in message_ids]},
+        drop=("q",),
+    )
+
+
+def _history(mailbox, start: str, records: list[dict], latest: str, **extra) -> None:
+    page_token = extra.pop("page_token", None)
+    mailbox.add(
+        history_request(mailbox.builder, start, page_token=page_token, history_types=_HISTORY_TYPES),
+        {"history": records, "historyId": latest, **extra},
+    )
+
+
+def _item(message_id: str, labels: list[str]) -> dict:
+    return {"message": {"id": message_id, "threadId": "t" + message_id[1:], "labelIds": labels}}
+
+
+def _ids(refs: list[dict]) -> list[str]:
+    return [ref["id"] for ref in refs]
+
+
+def test_history_records_update_the_index(mailbox):
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "200"})
+    _listing(mailbox, "m3", "m2", "m1")
+    _history(
+        mailbox,
+        "200",
+        [
+            {"messagesAdded": [_item("m4", _UNREAD)]},
+            # sent mail is not unread
+            {"messagesAdded": [_item("m5", ["SENT"])]},
+            # m2 was read
+            {"labelsRemoved": [dict(_item("m2", ["INBOX", "CATEGORY_PERSONAL"]), labelIds=["UNREAD"])]},
+            # m3 was starred and is still unread
+            {"labelsAdded": [dict(_item("m3", _UNREAD + ["STARRED"]), labelIds=["STARRED"])]},
+            {"messagesDeleted": [_item("m1", [])]},
+        ],
+        "210",
+    )
+    _history(mailbox, "210", [], "210")
+    service, traffic = mailbox.service()
+    index = UnreadIndex()
+
+    refs = index.refresh(service)
+    assert _ids(refs) == ["m3", "m2", "m1"]
+    assert refs[0] == {"id": "m3", "threadId": "t3"}
+    # profile and one list page
+    assert traffic.api_calls == 2
+
+    assert _ids(index.refresh(service)) == ["m4", "m3"]
+    assert traffic.api_calls == 3
+
+    # the watermark moved on to 210
+    assert _ids(index.refresh(service)) == ["m4", "m3"]
+    assert traffic.api_calls == 4
+
+
+def test_history_pages_are_replayed_in_order(mailbox):
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "200"})
+    _listing(mailbox, "m1")
+    _history(mailbox, "200", [{"messagesAdded": [_item("m2", _UNREAD)]}], "205", nextPageToken="p2")
+    _history(mailbox, "200", [{"messagesAdded": [_item("m3", _UNREAD)]}], "210", page_token="p2")
+    service, traffic = mailbox.service()
+    index = UnreadIndex()
+    index.refresh(service)
+
+    assert _ids(index.refresh(service)) == ["m3", "m2", "m1"]
+    assert traffic.api_calls == 4
+    assert index._history_id == "210"
+
+
+def test_message_marked_unread_again_relists(mailbox):
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "200"})
+    mailbox.add(profile_request(b), {"historyId": "220"})
+    _listing(mailbox, "m2")
+    # its place in the date order is only known to Gmail
+    _listing(mailbox, "m2", "m1")
+    _history(mailbox, "200", [{"labelsAdded": [dict(_item("m1", _UNREAD), labelIds=["UNREAD"])]}], "210")
+    service, traffic = mailbox.service()
+    index = UnreadIndex()
+    index.refresh(service)
+
+    assert _ids(index.refresh(service)) == ["m2", "m1"]
+    # history, then profile and list again
+    assert traffic.api_calls == 2 + 3
+    assert index._history_id == "220"
+
+
+def test_expired_watermark_relists(mailbox):
+    b = mailbox.builder
+    mailbox.add(profile_request(b), {"historyId": "200"})
+    mailbox.add(profile_request(b), {"historyId": "900"})
+    _listing(mailbox, "m2", "m1")
+    _listing(mailbox, "m3")
+    mailbox.add(
+        history_request(b, "200", history_types=_HISTORY_TYPES),
+        {"error": {"code": 404, "message": "Requested entity was not found."}},
+        status=404,
+    )
+    service, traffic = mailbox.service()
+    index = UnreadIndex()
+    index.refresh(service)
+
+    assert _ids(index.refresh(service)) == ["m3"]
+    assert traffic.api_calls == 2 + 3
+    assert index._history_id == "900"
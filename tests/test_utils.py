@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from mcp_email import utils
+from mcp_email.utils import _GmailServiceHolder, _write_token_file
+
+
+def _now() -> datetime:
+    # naive UTC, as google-auth keeps expiries
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _credentials(token: str, expires_in: timedelta) -> Credentials:
+    return Credentials(
+        token=token,
+        refresh_token="refresh",
+        token_uri="https://oauth2.googleapis.com/token",
+        client_id="client",
+        client_secret="secret",
+        scopes=utils.SCOPES,
+        expiry=_now() + expires_in,
+    )
+
+
+@pytest.fixture
+def token_file(tmp_path) -> str:
+    """A saved token that is valid for another hour."""
+    path = tmp_path / "token.json"
+    path.write_text(_credentials("old", timedelta(hours=1)).to_json())
+    return str(path)
+
+
+@pytest.fixture
+def refreshes(monkeypatch) -> list[str]:
+    """Stands in for the OAuth token endpoint; returns the tokens handed out."""
+    issued: list[str] = []
+
+    def refresh(self, request) -> None:
+        issued.append(f"new{len(issued) + 1}")
+        self.token = issued[-1]
+        self.expiry = _now() + timedelta(hours=3)
+
+    monkeypatch.setattr(Credentials, "refresh", refresh)
+    return issued
+
+
+def _saved_token(token_file: str) -> str:
+    with open(token_file) as f:
+        return json.load(f)["token"]
+
+
+def test_token_expiring_within_the_margin_is_refreshed_once(token_file, refreshes, monkeypatch):
+    # the saved token is still valid, but inside the margin
+    monkeypatch.setattr(utils, "TOKEN_REFRESH_MARGIN", timedelta(hours=2))
+    holder = _GmailServiceHolder(token_file=token_file)
+
+    service = holder.get()
+    assert refreshes == []
+
+    assert holder.get() is service
+    assert refreshes == ["new1"]
+    assert _saved_token(token_file) == "new1"
+
+    # the new token runs for another three hours
+    holder.get()
+    assert refreshes == ["new1"]
+
+
+def test_token_not_expiring_soon_is_not_refreshed(token_file, refreshes):
+    holder = _GmailServiceHolder(token_file=token_file)
+
+    for _ in range(3):
+        holder.get()
+
+    assert refreshes == []
+    assert _saved_token(token_file) == "old"
+
+
+def test_failed_token_write_leaves_the_saved_token_alone(token_file, monkeypatch):
+    def replace_fails(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(utils.os, "replace", replace_fails)
+
+    with pytest.raises(OSError, match="disk full"):
+        _write_token_file(_credentials("new", timedelta(hours=1)), token_file)
+
+    assert _saved_token(token_file) == "old"
+    # the temp file was removed
+    assert os.listdir(os.path.dirname(token_file)) == ["token.json"]